@@ -1,9 +1,18 @@
-"""API для авторизации пользователей (логин и проверка токена)"""
+"""API для авторизации пользователей (логин, проверка и переключение токена)"""
 import json
 import os
-import psycopg2
 from psycopg2.extras import RealDictCursor
-import bcrypt
+import config_cache
+import login_throttle
+import passwords
+import queries
+import session_tokens
+
+LOGIN_LOOKUP = queries.statement('login_lookup', """
+    SELECT id, name, login, password_hash, role, is_active, token_version
+    FROM {schema}.companies
+    WHERE login = $1
+""")
 
 def handler(event: dict, context) -> dict:
     method = event.get('httpMethod', 'GET')
@@ -22,119 +31,141 @@ def handler(event: dict, context) -> dict:
             'isBase64Encoded': False
         }
     
+    # Подключение открывается только там, где без БД не обойтись:
+    # проверка токена читает список отозванных из кэша
+    lazy_conn = config_cache.LazyConnection()
     try:
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
         schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
         
         # POST ?action=login - авторизация
         if method == 'POST' and action == 'login':
             data = json.loads(event.get('body', '{}'))
-            result = login(conn, schema, data)
+            result = login(lazy_conn.get(), schema, data, login_throttle.client_ip(event))
         # GET ?action=me - проверка токена и получение данных пользователя
         elif method == 'GET' and action == 'me':
-            auth_header = event.get('headers', {}).get('X-Authorization', '')
-            result = get_current_user(conn, schema, auth_header)
+            result = get_current_user(lazy_conn, event)
         # GET ?action=available_companies - получение списка доступных компаний для переключения
         elif method == 'GET' and action == 'available_companies':
-            auth_header = event.get('headers', {}).get('X-Authorization', '')
-            result = get_available_companies(conn, schema, auth_header)
+            result = get_available_companies(lazy_conn, schema, event)
+        # POST ?action=switch - токен для работы от имени другой компании
+        elif method == 'POST' and action == 'switch':
+            data = json.loads(event.get('body', '{}'))
+            result = switch_company(lazy_conn, schema, event, data)
         else:
             result = error_response('Метод не поддерживается', 405)
         
-        conn.close()
         return result
+    except passwords.PasswordBusy as e:
+        return error_response(f'Сервис перегружен, повторите попытку: {e}', 503)
     except Exception as e:
         return error_response(str(e), 500)
+    finally:
+        lazy_conn.close()
 
-def login(conn, schema, data):
+def login(conn, schema, data, ip=None):
     login_str = data.get('login')
     password = data.get('password')
     
     if not all([login_str, password]):
         return error_response('Требуются поля: login, password', 400)
+    if not isinstance(login_str, str) or not isinstance(password, str):
+        return error_response('Поля login и password должны быть строками', 400)
+    
+    if login_throttle.is_blocked(conn, login_str, ip):
+        return error_response('Слишком много неудачных попыток входа, попробуйте позже', 429)
     
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute(f"""
-            SELECT id, name, login, password_hash, role, is_active
-            FROM {schema}.companies 
-            WHERE login = %s
-        """, (login_str,))
+        queries.execute(cur, LOGIN_LOOKUP, (login_str,))
         user = cur.fetchone()
-        
-        if not user:
-            return error_response('Неверный логин или пароль', 401)
-        
-        if not user['is_active']:
-            return error_response('Аккаунт деактивирован', 403)
-        
-        # Проверка пароля
-        if not bcrypt.checkpw(password.encode('utf-8'), user['password_hash'].encode('utf-8')):
-            return error_response('Неверный логин или пароль', 401)
-        
-        # Возвращаем ID компании как токен (упрощенная авторизация)
-        return {
-            'statusCode': 200,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({
-                'token': str(user['id']),
-                'user': {
-                    'id': user['id'],
-                    'name': user['name'],
-                    'login': user['login'],
-                    'role': user['role']
-                }
-            }),
-            'isBase64Encoded': False
-        }
+    
+    # Соединение не держим открытой транзакцией, пока bcrypt считает в пуле
+    conn.commit()
+    
+    # Пароль проверяется и для несуществующего логина (по фиктивному хешу),
+    # а о деактивации сообщаем только после верного пароля: по времени и
+    # ответу нельзя понять, есть ли такой аккаунт
+    valid, new_hash = passwords.verify_and_update(password, user['password_hash'] if user else None)
+    if not valid:
+        login_throttle.record_failure(conn, login_str, ip)
+        return error_response('Неверный логин или пароль', 401)
+    
+    login_throttle.record_success(conn, login_str)
+    
+    if not user['is_active']:
+        return error_response('Аккаунт деактивирован', 403)
+    
+    if new_hash:
+        # Хеш с устаревшей стоимостью пересчитан под BCRYPT_ROUNDS. Смена хеша
+        # поднимает token_version (V0048), поэтому токен выдаём с новой версией
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(f"""
+                UPDATE {schema}.companies 
+                SET password_hash = %s
+                WHERE id = %s AND password_hash = %s
+                RETURNING token_version
+            """, (new_hash, user['id'], user['password_hash']))
+            updated = cur.fetchone()
+        conn.commit()
+        if updated:
+            user = dict(user, token_version=updated['token_version'])
+    
+    return token_response(user, user)
+
+def token_response(account, company):
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({
+            'token': session_tokens.issue(account, company),
+            'user': {
+                'id': company['id'],
+                'name': company['name'],
+                'login': company['login'],
+                'role': company['role']
+            }
+        }),
+        'isBase64Encoded': False
+    }
+
+def current_session(lazy_conn, event):
+    token = session_tokens.bearer_token(event)
+    return session_tokens.verify(lazy_conn, token) if token else None
 
-def get_current_user(conn, schema, auth_header):
-    if not auth_header.startswith('Bearer '):
+def get_current_user(lazy_conn, event):
+    """Данные пользователя из токена: подпись и отзыв проверяются без запроса к companies"""
+    if not session_tokens.bearer_token(event):
         return error_response('Требуется авторизация', 401)
     
-    token = auth_header.replace('Bearer ', '')
+    session = current_session(lazy_conn, event)
+    if not session:
+        return error_response('Сессия недействительна', 401)
     
-    with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute(f"""
-            SELECT id, name, login, role, is_active
-            FROM {schema}.companies 
-            WHERE id = %s
-        """, (token,))
-        user = cur.fetchone()
-        
-        if not user:
-            return error_response('Пользователь не найден', 404)
-        
-        if not user['is_active']:
-            return error_response('Аккаунт деактивирован', 403)
-        
-        return {
-            'statusCode': 200,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps(dict(user)),
-            'isBase64Encoded': False
-        }
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({
+            'id': session['company'],
+            'name': session['name'],
+            'login': session['login'],
+            'role': session['role'],
+            'is_active': True
+        }),
+        'isBase64Encoded': False
+    }
 
-def get_available_companies(conn, schema, auth_header):
+def get_available_companies(lazy_conn, schema, event):
     """Возвращает список компаний для переключения (для админа - все активные, для других - только их компанию)"""
-    if not auth_header.startswith('Bearer '):
+    if not session_tokens.bearer_token(event):
         return error_response('Требуется авторизация', 401)
     
-    token = auth_header.replace('Bearer ', '')
+    session = current_session(lazy_conn, event)
+    if not session:
+        return error_response('Пользователь не найден или деактивирован', 403)
     
+    conn = lazy_conn.get()
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        # Получаем текущего пользователя
-        cur.execute(f"""
-            SELECT id, name, login, role, is_active
-            FROM {schema}.companies 
-            WHERE id = %s
-        """, (token,))
-        current_user = cur.fetchone()
-        
-        if not current_user or not current_user['is_active']:
-            return error_response('Пользователь не найден или деактивирован', 403)
-        
-        # Если админ - возвращаем все активные компании
-        if current_user['role'] == 'admin':
+        # Если вошёл админ - возвращаем все активные компании
+        if is_admin_account(session):
             cur.execute(f"""
                 SELECT id, name, login, role
                 FROM {schema}.companies 
@@ -147,7 +178,7 @@ def get_available_companies(conn, schema, auth_header):
                 SELECT id, name, login, role
                 FROM {schema}.companies 
                 WHERE id = %s AND is_active = true
-            """, (current_user['id'],))
+            """, (session['id'],))
         
         companies = cur.fetchall()
         
@@ -158,6 +189,43 @@ def get_available_companies(conn, schema, auth_header):
             'isBase64Encoded': False
         }
 
+def is_admin_account(session):
+    """Админ ли вошедший аккаунт: после переключения роль в токене - роль выбранной компании"""
+    return session.get('account_role', session['role']) == 'admin'
+
+def switch_company(lazy_conn, schema, event, data):
+    """Новый токен от имени выбранной компании; вошедший аккаунт в токене сохраняется"""
+    if not session_tokens.bearer_token(event):
+        return error_response('Требуется авторизация', 401)
+    
+    session = current_session(lazy_conn, event)
+    if not session:
+        return error_response('Сессия недействительна', 401)
+    
+    try:
+        company_id = int(data.get('company_id'))
+    except (TypeError, ValueError):
+        return error_response('Требуется поле company_id', 400)
+    
+    if company_id != session['id'] and not is_admin_account(session):
+        return error_response('Доступ запрещен', 403)
+    
+    conn = lazy_conn.get()
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(f"""
+            SELECT id, name, login, role, token_version
+            FROM {schema}.companies 
+            WHERE id IN (%s, %s) AND is_active = true
+        """, (session['id'], company_id))
+        rows = {row['id']: row for row in cur.fetchall()}
+    
+    if session['id'] not in rows:
+        return error_response('Аккаунт деактивирован', 403)
+    if company_id not in rows:
+        return error_response('Компания не найдена', 404)
+    
+    return token_response(rows[session['id']], rows[company_id])
+
 def error_response(message: str, status_code: int):
     return {
         'statusCode': status_code,
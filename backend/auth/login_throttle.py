@@ -0,0 +1,137 @@
+"""Ограничение неудачных попыток входа по логину и IP
+
+Окно скользящее, приближённое двумя соседними фиксированными окнами:
+оценка = предыдущее · (1 − доля прошедшего текущего окна) + текущее. Для
+ключа хватает трёх чисел, поэтому память O(1) на ключ, а число ключей в
+процессе ограничено LRU на THROTTLE_MAX_KEYS.
+
+Счётчики процесса отсекают перебор без обращения к БД; общие для всех
+инстансов счётчики хранятся в login_attempts (V0050) в тех же окнах и
+проверяются одним запросом. Пишутся только неудачные попытки, успешный
+вход сбрасывает счётчик логина.
+"""
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
+THROTTLE_WINDOW = int(os.environ.get('LOGIN_THROTTLE_WINDOW', '900'))
+MAX_FAILURES_PER_LOGIN = int(os.environ.get('LOGIN_MAX_FAILURES', '5'))
+MAX_FAILURES_PER_IP = int(os.environ.get('LOGIN_MAX_FAILURES_PER_IP', '30'))
+THROTTLE_MAX_KEYS = 10000
+
+_counters = OrderedDict()
+_lock = threading.Lock()
+
+
+def keys_for(login, ip):
+    '''Ключи счётчиков и их пределы'''
+    keys = [(f'login:{login.strip().lower()}', MAX_FAILURES_PER_LOGIN)]
+    if ip:
+        keys.append((f'ip:{ip}', MAX_FAILURES_PER_IP))
+    return keys
+
+
+def client_ip(event):
+    identity = (event.get('requestContext') or {}).get('identity') or {}
+    if identity.get('sourceIp'):
+        return identity['sourceIp']
+    headers = event.get('headers') or {}
+    forwarded = headers.get('X-Forwarded-For') or headers.get('x-forwarded-for') or ''
+    return forwarded.split(',')[0].strip() or None
+
+
+def _window(now):
+    start = int(now // THROTTLE_WINDOW) * THROTTLE_WINDOW
+    return start, (now - start) / THROTTLE_WINDOW
+
+
+def estimate(previous, current, elapsed):
+    return previous * (1 - elapsed) + current
+
+
+def local_estimate(key, now=None):
+    now = time.time() if now is None else now
+    start, elapsed = _window(now)
+    with _lock:
+        entry = _counters.get(key)
+    if entry is None:
+        return 0.0
+    window, previous, current = entry
+    if window == start:
+        return estimate(previous, current, elapsed)
+    if window == start - THROTTLE_WINDOW:
+        return estimate(current, 0, elapsed)
+    return 0.0
+
+
+def local_record(key, now=None):
+    now = time.time() if now is None else now
+    start, _ = _window(now)
+    with _lock:
+        window, previous, current = _counters.pop(key, (start, 0, 0))
+        if window != start:
+            # Окно сдвинулось: текущее стало предыдущим или оба устарели
+            previous = current if window == start - THROTTLE_WINDOW else 0
+            current = 0
+        _counters[key] = (start, previous, current + 1)
+        while len(_counters) > THROTTLE_MAX_KEYS:
+            _counters.popitem(last=False)
+
+
+def local_reset(key):
+    with _lock:
+        _counters.pop(key, None)
+
+
+def shared_estimates(conn, keys, now=None):
+    '''Оценки по login_attempts для всех ключей одним запросом'''
+    now = time.time() if now is None else now
+    start, elapsed = _window(now)
+    with conn.cursor() as cur:
+        cur.execute('''
+            SELECT key,
+                   COALESCE(SUM(failures) FILTER (WHERE window_start = to_timestamp(%s)), 0),
+                   COALESCE(SUM(failures) FILTER (WHERE window_start = to_timestamp(%s)), 0)
+            FROM login_attempts
+            WHERE key = ANY(%s) AND window_start >= to_timestamp(%s)
+            GROUP BY key
+        ''', (start - THROTTLE_WINDOW, start, [k for k, _ in keys], start - THROTTLE_WINDOW))
+        rows = cur.fetchall()
+    conn.commit()
+    return {key: estimate(previous, current, elapsed) for key, previous, current in rows}
+
+
+def is_blocked(conn, login, ip):
+    '''Превышен ли предел хотя бы по одному ключу; сначала без БД'''
+    keys = keys_for(login, ip)
+    if any(local_estimate(key) >= limit for key, limit in keys):
+        return True
+    shared = shared_estimates(conn, keys)
+    return any(shared.get(key, 0) >= limit for key, limit in keys)
+
+
+def record_failure(conn, login, ip):
+    keys = keys_for(login, ip)
+    for key, _ in keys:
+        local_record(key)
+    start, _ = _window(time.time())
+    with conn.cursor() as cur:
+        cur.execute('''
+            INSERT INTO login_attempts (key, window_start, failures)
+            SELECT k, to_timestamp(%s), 1 FROM unnest(%s::text[]) AS k
+            ON CONFLICT (key, window_start) DO UPDATE SET failures = login_attempts.failures + 1
+        ''', (start, [k for k, _ in keys]))
+        if random.random() < 0.01:
+            cur.execute('DELETE FROM login_attempts WHERE window_start < to_timestamp(%s)',
+                        (start - THROTTLE_WINDOW,))
+    conn.commit()
+
+
+def record_success(conn, login):
+    key, _ = keys_for(login, None)[0]
+    local_reset(key)
+    with conn.cursor() as cur:
+        cur.execute('DELETE FROM login_attempts WHERE key = %s', (key,))
+    conn.commit()
@@ -0,0 +1,150 @@
+"""Хеширование паролей bcrypt в ограниченном пуле потоков
+
+bcrypt отпускает GIL на время вычисления, поэтому хеши считаются в
+PASSWORD_WORKERS потоках параллельно, а поток запроса только ждёт результат.
+Очередь ограничена PASSWORD_QUEUE_SIZE задачами: при всплеске логинов лишние
+запросы сразу получают PasswordBusy (503), а не копятся до таймаута функции.
+
+Стоимость берётся из BCRYPT_ROUNDS; подобрать её под целевую задержку на
+текущем железе можно калибровкой: python passwords.py [целевые мс]. Хеши с
+другой стоимостью пересчитываются при успешном входе (verify_and_update).
+"""
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import bcrypt
+
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))
+MIN_ROUNDS = 10
+MAX_ROUNDS = 16
+PASSWORD_WORKERS = int(os.environ.get('PASSWORD_WORKERS', str(min(4, os.cpu_count() or 1))))
+PASSWORD_QUEUE_SIZE = int(os.environ.get('PASSWORD_QUEUE_SIZE', '32'))
+PASSWORD_TIMEOUT = float(os.environ.get('PASSWORD_TIMEOUT', '10'))
+CALIBRATION_TARGET_MS = 250
+
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_WORKERS, thread_name_prefix='bcrypt')
+_slots = threading.BoundedSemaphore(PASSWORD_WORKERS + PASSWORD_QUEUE_SIZE)
+_cost_pattern = re.compile(r'^\$2[abxy]?\$(\d{2})\$')
+_dummy_hash = None
+
+
+class PasswordBusy(Exception):
+    '''Очередь хеширования переполнена или задача не уложилась в таймаут'''
+
+
+def _run(fn, *args):
+    if not _slots.acquire(blocking=False):
+        raise PasswordBusy('password queue is full')
+    try:
+        future = _executor.submit(fn, *args)
+    except BaseException:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    try:
+        return future.result(timeout=PASSWORD_TIMEOUT)
+    except FutureTimeout:
+        raise PasswordBusy('password hashing timed out')
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check(password, password_hash):
+    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+
+
+def hash_password(password, rounds=None):
+    return _run(_hash, password, rounds or BCRYPT_ROUNDS)
+
+
+def hash_passwords(passwords, rounds=None):
+    '''Хеши списка паролей: задачи ставятся в пул разом и считаются параллельно'''
+    rounds = rounds or BCRYPT_ROUNDS
+    futures = []
+    try:
+        for password in passwords:
+            if not _slots.acquire(timeout=PASSWORD_TIMEOUT):
+                raise PasswordBusy('password queue is full')
+            future = _executor.submit(_hash, password, rounds)
+            future.add_done_callback(lambda _: _slots.release())
+            futures.append(future)
+        batches = -(-len(futures) // PASSWORD_WORKERS)
+        deadline = time.monotonic() + PASSWORD_TIMEOUT * max(1, batches)
+        return [f.result(timeout=max(0, deadline - time.monotonic())) for f in futures]
+    except FutureTimeout:
+        raise PasswordBusy('password hashing timed out')
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def check_password(password, password_hash):
+    if not password_hash:
+        return False
+    try:
+        return _run(_check, password, password_hash)
+    except ValueError:
+        # Испорченный или не-bcrypt хеш — как неверный пароль
+        return False
+
+
+def hash_cost(password_hash):
+    match = _cost_pattern.match(password_hash or '')
+    return int(match.group(1)) if match else None
+
+
+def needs_rehash(password_hash):
+    return hash_cost(password_hash) != BCRYPT_ROUNDS
+
+
+def dummy_hash():
+    '''Хеш с текущей стоимостью для проверки паролей несуществующих аккаунтов'''
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = hash_password(os.urandom(16).hex())
+    return _dummy_hash
+
+
+def verify_and_update(password, password_hash):
+    '''(пароль верен, новый хеш или None): хеш пересчитывается, если стоимость устарела
+
+    Без хеша (аккаунта нет) пароль всё равно проверяется по фиктивному хешу,
+    чтобы неудачный вход занимал одинаковое время.
+    '''
+    if not password_hash:
+        check_password(password, dummy_hash())
+        return False, None
+    if not check_password(password, password_hash):
+        return False, None
+    if needs_rehash(password_hash):
+        return True, hash_password(password)
+    return True, None
+
+
+def calibrate(target_ms=CALIBRATION_TARGET_MS, samples=3):
+    '''Наибольшая стоимость, при которой хеш считается не дольше target_ms'''
+    best = MIN_ROUNDS
+    timings = {}
+    for rounds in range(MIN_ROUNDS, MAX_ROUNDS + 1):
+        started = time.perf_counter()
+        for _ in range(samples):
+            _hash('calibration', rounds)
+        timings[rounds] = (time.perf_counter() - started) / samples * 1000
+        if timings[rounds] > target_ms:
+            break
+        best = rounds
+    return best, timings
+
+
+if __name__ == '__main__':
+    target = float(sys.argv[1]) if len(sys.argv) > 1 else CALIBRATION_TARGET_MS
+    rounds, timings = calibrate(target)
+    for r, ms in timings.items():
+        print(f'rounds={r}: {ms:.1f} ms')
+    print(f'BCRYPT_ROUNDS={rounds}')
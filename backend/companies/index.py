@@ -1,9 +1,23 @@
 """API для управления компаниями (CRUD операции для администратора)"""
 import json
 import os
-import psycopg2
-from psycopg2.extras import RealDictCursor
-import bcrypt
+from psycopg2.extras import RealDictCursor, execute_values
+import config_cache
+import listing
+import passwords
+import session_tokens
+
+BATCH_LIMIT = 500
+BATCH_FIELDS = ('name', 'role', 'inn', 'kpp', 'legal_address', 'contact_email', 'contact_phone', 'is_active')
+LIST_COLUMNS = {
+    'id': 'id', 'name': 'name', 'login': 'login', 'role': 'role', 'inn': 'inn', 'kpp': 'kpp',
+    'legal_address': 'legal_address', 'contact_email': 'contact_email',
+    'contact_phone': 'contact_phone', 'is_active': 'is_active', 'password': 'plain_password',
+    'created_at': 'created_at', 'updated_at': 'updated_at',
+}
+# Совпадает с выражением индекса idx_companies_search_trgm (V0049)
+SEARCH_EXPRESSION = "lower(coalesce(name, '') || ' ' || coalesce(login, '') || ' ' || coalesce(contact_email, '') || ' ' || coalesce(inn, ''))"
+PAGE_PARAMS = ('limit', 'cursor', 'fields', 'q', 'role', 'active')
 
 def handler(event: dict, context) -> dict:
     method = event.get('httpMethod', 'GET')
@@ -20,35 +34,27 @@ def handler(event: dict, context) -> dict:
             'isBase64Encoded': False
         }
     
-    # Проверка авторизации администратора
-    auth_header = event.get('headers', {}).get('X-Authorization', '')
-    if not auth_header.startswith('Bearer '):
+    # Проверка авторизации администратора по подписанному токену
+    if not session_tokens.bearer_token(event):
         return error_response('Требуется авторизация', 401)
     
-    token = auth_header.replace('Bearer ', '')
-    
+    lazy_conn = config_cache.LazyConnection()
     try:
-        user_id = int(token)
-    except (ValueError, TypeError):
-        return error_response('Неверный токен', 401)
-    
-    try:
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
         schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
         
-        # Проверка прав администратора
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(f"SELECT role FROM {schema}.companies WHERE id = %s AND is_active = true", (user_id,))
-            user = cur.fetchone()
-            
-            print(f"🔍 Auth check: user_id={user_id}, found={user is not None}, role={user['role'] if user else None}")
-            
-            if not user or user['role'] not in ('admin', 'vip'):
-                conn.close()
-                return error_response('Доступ запрещен', 403)
+        caller = session_tokens.resolve_caller(lazy_conn, event)
+        if not caller:
+            return error_response('Неверный токен', 401)
+        if caller['role'] not in ('admin', 'vip'):
+            return error_response('Доступ запрещен', 403)
         
+        conn = lazy_conn.get()
+        query_params = event.get('queryStringParameters') or {}
         if method == 'GET':
-            result = get_all_companies(conn, schema)
+            result = get_all_companies(conn, schema, query_params)
+        elif method == 'POST' and query_params.get('action') == 'batch':
+            data = json.loads(event.get('body', '{}'))
+            result = batch_upsert_companies(conn, schema, data)
         elif method == 'POST':
             data = json.loads(event.get('body', '{}'))
             result = create_company(conn, schema, data)
@@ -56,17 +62,31 @@ def handler(event: dict, context) -> dict:
             data = json.loads(event.get('body', '{}'))
             result = update_company(conn, schema, data)
         elif method == 'DELETE':
-            query_params = event.get('queryStringParameters', {})
             result = delete_company(conn, schema, query_params.get('id'))
         else:
             result = error_response('Метод не поддерживается', 405)
         
-        conn.close()
+        if method != 'GET':
+            config_cache.invalidate('companies')
         return result
+    except passwords.PasswordBusy as e:
+        return error_response(f'Сервис перегружен, повторите попытку: {e}', 503)
     except Exception as e:
         return error_response(str(e), 500)
+    finally:
+        lazy_conn.close()
+
+def get_all_companies(conn, schema, params=None):
+    """Список компаний
 
-def get_all_companies(conn, schema):
+    Без параметров — весь список, как раньше. С любым из limit, cursor,
+    fields, q, role, active — страница {items, next_cursor} от новых к старым:
+    fields задаёт колонки, q ищет по названию, логину, email и ИНН.
+    """
+    params = params or {}
+    if any(params.get(p) for p in PAGE_PARAMS):
+        return get_companies_page(conn, schema, params)
+    
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
         cur.execute(f"""
             SELECT id, name, login, role, inn, kpp, legal_address, 
@@ -83,6 +103,34 @@ def get_all_companies(conn, schema):
             'isBase64Encoded': False
         }
 
+def get_companies_page(conn, schema, params):
+    try:
+        fields = listing.parse_fields(params.get('fields'), LIST_COLUMNS, LIST_COLUMNS)
+        limit = listing.parse_limit(params.get('limit'))
+        after = listing.decode_cursor(params['cursor'], 1) if params.get('cursor') else None
+        active = listing.parse_active(params.get('active'))
+    except ValueError as e:
+        return error_response(f'Неверные параметры: {e}', 400)
+    
+    where, args = 'TRUE', []
+    if params.get('q', '').strip():
+        where, args = f'{where} AND {SEARCH_EXPRESSION} LIKE %s', args + [listing.search_pattern(params['q'])]
+    if params.get('role'):
+        where, args = f'{where} AND role = %s', args + [params['role']]
+    if active is not None:
+        where, args = f'{where} AND is_active = %s', args + [active]
+    
+    # Ключ — id по убыванию: новые компании первыми, как в полном списке
+    items, next_cursor = listing.fetch_page(
+        conn, f'{schema}.companies', LIST_COLUMNS, fields, where, args, ['id'], limit, after, descending=True
+    )
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({'items': items, 'next_cursor': next_cursor}, default=str),
+        'isBase64Encoded': False
+    }
+
 def create_company(conn, schema, data):
     name = data.get('name')
     login = data.get('login')
@@ -93,7 +141,7 @@ def create_company(conn, schema, data):
         return error_response('Требуются поля: name, login, password', 400)
     
     # Хеширование пароля
-    password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    password_hash = passwords.hash_password(password)
     
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
         cur.execute(f"""
@@ -116,6 +164,108 @@ def create_company(conn, schema, data):
             'isBase64Encoded': False
         }
 
+def validate_batch(rows, existing):
+    """Ошибки по строкам пакета: всё проверяется до хеширования и записи"""
+    errors = {}
+    seen = set()
+    for i, row in enumerate(rows):
+        if not isinstance(row, dict):
+            errors[i] = 'Строка должна быть объектом'
+            continue
+        login = row.get('login')
+        if not isinstance(login, str) or not login.strip():
+            errors[i] = 'Требуется поле login'
+        elif login in seen:
+            errors[i] = 'Логин повторяется в пакете'
+        elif login not in existing and not all([row.get('name'), row.get('password')]):
+            errors[i] = 'Для новой компании требуются поля: name, password'
+        elif 'password' in row and (not isinstance(row['password'], str) or not row['password']):
+            errors[i] = 'Пароль должен быть непустой строкой'
+        elif 'is_active' in row and existing.get(login) == 'admin':
+            errors[i] = 'Нельзя деактивировать аккаунт администратора'
+        seen.add(login)
+    return errors
+
+def batch_upsert_companies(conn, schema, data):
+    """Пакетное создание и обновление компаний одним upsert по login
+
+    Пакет проверяется целиком: при любой ошибке ничего не записывается и
+    возвращаются ошибки по строкам. Пароли хешируются параллельно в пуле
+    passwords. Для существующих логинов меняются только переданные поля.
+    """
+    rows = data.get('companies')
+    if not isinstance(rows, list) or not rows:
+        return error_response('Требуется непустой список companies', 400)
+    if len(rows) > BATCH_LIMIT:
+        return error_response(f'Не более {BATCH_LIMIT} компаний за запрос', 400)
+    
+    logins = [row['login'] for row in rows if isinstance(row, dict) and isinstance(row.get('login'), str)]
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT login, role FROM {schema}.companies WHERE login = ANY(%s)", (logins,))
+        existing = dict(cur.fetchall())
+    conn.commit()
+    
+    errors = validate_batch(rows, existing)
+    if errors:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({
+                'error': 'Пакет не прошёл проверку',
+                'results': [
+                    {'index': i, 'login': row.get('login') if isinstance(row, dict) else None,
+                     'status': 'error' if i in errors else 'valid', 'error': errors.get(i)}
+                    for i, row in enumerate(rows)
+                ]
+            }),
+            'isBase64Encoded': False
+        }
+    
+    with_password = [row for row in rows if row.get('password')]
+    hashes = dict(zip(
+        (row['login'] for row in with_password),
+        passwords.hash_passwords([row['password'] for row in with_password])
+    ))
+    
+    values = []
+    for row in rows:
+        fields = {f: row.get(f) for f in BATCH_FIELDS}
+        if row['login'] not in existing:
+            # Значения по умолчанию нужны только новым строкам: у существующих NULL
+            # означает «не менять»
+            fields['role'] = fields['role'] or 'user'
+            fields['is_active'] = True if fields['is_active'] is None else fields['is_active']
+        values.append((row['login'], hashes.get(row['login']), row.get('password')) + tuple(fields.values()))
+    
+    columns = ('login', 'password_hash', 'plain_password') + BATCH_FIELDS
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        returned = execute_values(cur, f"""
+            INSERT INTO {schema}.companies AS c ({', '.join(columns)})
+            VALUES %s
+            ON CONFLICT (login) DO UPDATE SET
+                {', '.join(f'{col} = COALESCE(EXCLUDED.{col}, c.{col})' for col in columns[1:])},
+                updated_at = CURRENT_TIMESTAMP
+            RETURNING id, login, (xmax = 0) AS created
+        """, values, page_size=len(values), fetch=True)
+    conn.commit()
+    
+    by_login = {row['login']: row for row in returned}
+    results = [
+        {'index': i, 'login': row['login'], 'id': by_login[row['login']]['id'],
+         'status': 'created' if by_login[row['login']]['created'] else 'updated'}
+        for i, row in enumerate(rows)
+    ]
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({
+            'created': sum(1 for r in results if r['status'] == 'created'),
+            'updated': sum(1 for r in results if r['status'] == 'updated'),
+            'results': results
+        }),
+        'isBase64Encoded': False
+    }
+
 def update_company(conn, schema, data):
     company_id = data.get('id')
     
@@ -142,7 +292,7 @@ def update_company(conn, schema, data):
         updates.append('login = %s')
         params.append(data['login'])
     if 'password' in data:
-        password_hash = bcrypt.hashpw(data['password'].encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        password_hash = passwords.hash_password(data['password'])
         updates.append('password_hash = %s')
         params.append(password_hash)
         updates.append('plain_password = %s')
@@ -168,6 +318,9 @@ def update_company(conn, schema, data):
     if 'is_active' in data:
         updates.append('is_active = %s')
         params.append(data['is_active'])
+    if data.get('revoke_sessions'):
+        # Выйти на всех устройствах: уже выданные токены перестают действовать
+        updates.append('token_version = token_version + 1')
     
     if not updates:
         return error_response('Нет полей для обновления', 400)
@@ -0,0 +1,92 @@
+"""Постраничная выдача списков учётных записей (companies, users)
+
+Страница выбирается по ключу сортировки последней строки (keyset), а не
+OFFSET: каждая следующая страница — тот же поиск по индексу, и время ответа
+не зависит от числа записей. Поиск по подстроке идёт по выражению, для
+которого есть триграммный индекс (V0049), поэтому SQL-выражение поиска
+должно совпадать с индексом символ в символ.
+"""
+import base64
+import json
+
+from psycopg2.extras import RealDictCursor
+
+LIST_DEFAULT_LIMIT = 50
+LIST_MAX_LIMIT = 500
+
+
+def parse_fields(raw, columns, default):
+    '''Запрошенные колонки из параметра fields; ValueError для неизвестных'''
+    if not raw:
+        return list(default)
+    fields = [f.strip() for f in raw.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in columns]
+    if unknown or not fields:
+        raise ValueError(f'unknown fields: {", ".join(unknown)}')
+    return fields
+
+
+def parse_limit(raw):
+    return max(1, min(int(raw), LIST_MAX_LIMIT)) if raw else LIST_DEFAULT_LIMIT
+
+
+def parse_active(raw):
+    if raw is None or raw == '':
+        return None
+    if raw not in ('true', 'false'):
+        raise ValueError('invalid active')
+    return raw == 'true'
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor, size):
+    '''Значения ключа последней строки; ValueError для повреждённого курсора'''
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (TypeError, ValueError, UnicodeError):
+        raise ValueError('invalid cursor')
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError('invalid cursor')
+    return values
+
+
+def search_pattern(text):
+    '''Шаблон LIKE для подстроки: спецсимволы экранируются'''
+    text = text.strip().lower()
+    for ch in ('\\', '%', '_'):
+        text = text.replace(ch, '\\' + ch)
+    return f'%{text}%'
+
+
+def fetch_page(conn, source, columns, fields, where, args, order, limit, after=None, descending=False):
+    '''Страница строк и курсор следующей (None, если страниц больше нет)
+
+    columns — {имя: SQL-выражение}, order — имена колонок ключа; последняя
+    должна быть уникальной (id), чтобы порядок был полным.
+    '''
+    selected = list(dict.fromkeys(fields + list(order)))
+    key = ', '.join(columns[c] for c in order)
+    if after is not None:
+        where = f"{where} AND ({key}) {'<' if descending else '>'} ({', '.join(['%s'] * len(order))})"
+        args = args + list(after)
+    direction = 'DESC' if descending else 'ASC'
+
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(f'''
+            SELECT {', '.join(f'{columns[c]} AS {c}' for c in selected)}
+            FROM {source}
+            WHERE {where}
+            ORDER BY {', '.join(f'{columns[c]} {direction}' for c in order)}
+            LIMIT %s
+        ''', args + [limit + 1])
+        rows = cur.fetchall()
+    conn.commit()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1][c] for c in order])
+    return [{f: row[f] for f in fields} for row in rows], next_cursor
@@ -3,6 +3,9 @@ import json
 import os
 import psycopg2
 from psycopg2.extras import RealDictCursor
+import config_cache
+import session_tokens
+import visibility
 
 
 def handler(event: dict, context) -> dict:
@@ -14,7 +17,7 @@ def handler(event: dict, context) -> dict:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Authorization, X-DB-Version',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
@@ -24,36 +27,14 @@ def handler(event: dict, context) -> dict:
     params = event.get('queryStringParameters') or {}
     config_type = params.get('type', 'filters')
 
-    conn = psycopg2.connect(os.environ['DATABASE_URL'])
-
     if method == 'GET':
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(
-                "SELECT config FROM filter_config WHERE config_type = %s ORDER BY id LIMIT 1",
-                (config_type,)
-            )
-            row = cur.fetchone()
-
-        conn.close()
+        lazy_conn = config_cache.reader(event)
+        try:
+            return get_config(lazy_conn, event, config_type)
+        finally:
+            lazy_conn.close()
 
-        if config_type == 'filter_visibility':
-            data = row['config'] if row else {'rules': [], 'updatedAt': ''}
-            if isinstance(data, str):
-                data = json.loads(data)
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps(data),
-                'isBase64Encoded': False
-            }
-
-        config = row['config'] if row else []
-        return {
-            'statusCode': 200,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'config': config}),
-            'isBase64Encoded': False
-        }
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
 
     if method == 'POST':
         body = json.loads(event.get('body', '{}'))
@@ -85,12 +66,13 @@ def handler(event: dict, context) -> dict:
             conn.commit()
 
         conn.close()
-        return {
+        config_cache.invalidate('filter_config')
+        return config_cache.mark_write({
             'statusCode': 200,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'body': json.dumps({'success': True}),
             'isBase64Encoded': False
-        }
+        })
 
     conn.close()
     return {
@@ -99,3 +81,46 @@ def handler(event: dict, context) -> dict:
         'body': json.dumps({'error': 'Method not allowed'}),
         'isBase64Encoded': False
     }
+
+
+def get_config(lazy_conn, event, config_type):
+    row = config_cache.get_or_load(
+        ('filter_config', config_type), ['filter_config'], lazy_conn,
+        lambda conn: load_config_row(conn, config_type)
+    )
+
+    if config_type == 'filter_visibility':
+        data = row['config'] if row else {'rules': [], 'updatedAt': ''}
+        if isinstance(data, str):
+            data = json.loads(data)
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps(data),
+            'isBase64Encoded': False
+        }
+
+    config = row['config'] if row else []
+
+    # Для известного пользователя без полного доступа убираем скрытые ему фильтры;
+    # их значения по умолчанию применяет функция properties
+    caller = session_tokens.resolve_caller(lazy_conn, event)
+    if caller:
+        projection = visibility.get_projection(lazy_conn, caller)
+        config = [f for f in config if f.get('id') not in projection.hidden_filter_ids]
+
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({'config': config}),
+        'isBase64Encoded': False
+    }
+
+
+def load_config_row(conn, config_type):
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(
+            "SELECT config FROM filter_config WHERE config_type = %s ORDER BY id LIMIT 1",
+            (config_type,)
+        )
+        return cur.fetchone()
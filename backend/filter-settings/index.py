@@ -1,8 +1,7 @@
 """API для управления настройками фильтров"""
 import json
-import os
-import psycopg2
 from psycopg2.extras import RealDictCursor
+import config_cache
 
 def handler(event: dict, context) -> dict:
     method = event.get('httpMethod', 'GET')
@@ -22,29 +21,30 @@ def handler(event: dict, context) -> dict:
         }
 
     try:
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        lazy_conn = config_cache.LazyConnection()
         
         if mode == 'attrs':
             if method == 'GET':
-                result = get_attrs(conn)
+                result = config_cache.get_or_load(('display_configs',), ['display_configs'], lazy_conn, get_attrs)
             elif method == 'POST':
                 data = json.loads(event.get('body', '{}'))
-                result = save_attrs(conn, data)
+                result = save_attrs(lazy_conn.get(), data)
+                config_cache.invalidate('display_configs')
             else:
                 return error_response('Method not allowed', 405)
         else:
             if method == 'GET':
-                result = get_all_filters(conn)
+                result = get_all_filters(lazy_conn.get())
             elif method == 'POST':
                 data = json.loads(event.get('body', '{}'))
-                result = upsert_filter(conn, data)
+                result = upsert_filter(lazy_conn.get(), data)
             elif method == 'PUT':
                 data = json.loads(event.get('body', '{}'))
-                result = upsert_filter(conn, data)
+                result = upsert_filter(lazy_conn.get(), data)
             else:
                 return error_response('Method not allowed', 405)
         
-        conn.close()
+        lazy_conn.close()
         return result
     except Exception as e:
         return error_response(str(e), 500)
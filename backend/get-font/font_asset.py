@@ -0,0 +1,85 @@
+"""Шрифт PT Sans для PDF: загрузка один раз на инстанс и подмножество глифов
+
+Шрифт берётся из файла рядом с функцией (PTSans-Regular.ttf или его base64 в
+PTSans-Regular.txt). Только если их нет, он один раз скачивается из
+FONT_SOURCE_URL. Подмножество (fontTools) оставляет латиницу, кириллицу и
+типографские знаки, которые встречаются в карточках участков, — этого
+достаточно jsPDF и генератору отчётов, а файл становится в разы меньше.
+"""
+import base64
+import hashlib
+import os
+import threading
+import urllib.request
+from io import BytesIO
+
+FONT_DIR = os.path.dirname(os.path.abspath(__file__))
+FONT_FILES = ('PTSans-Regular.ttf', 'PTSans-Regular.txt')
+FONT_SOURCE_URL = os.environ.get(
+    'FONT_SOURCE_URL', 'https://raw.githubusercontent.com/google/fonts/main/ofl/ptsans/PT_Sans-Web-Regular.ttf'
+)
+SUBSETS = {
+    'cyrillic-latin': (
+        list(range(0x20, 0x7F)) + list(range(0xA0, 0x100))      # латиница и Latin-1
+        + list(range(0x400, 0x460))                             # кириллица
+        + list(range(0x2010, 0x2027)) + [0x2030, 0x2039, 0x203A]  # тире, кавычки, многоточие
+        + [0x20AC, 0x20BD, 0x2116, 0x2122, 0x2212]              # €, ₽, №, ™, минус
+    ),
+}
+
+_variants = {}
+_lock = threading.Lock()
+
+
+def _read_bundled():
+    for name in FONT_FILES:
+        path = os.path.join(FONT_DIR, name)
+        if not os.path.exists(path):
+            continue
+        with open(path, 'rb') as f:
+            data = f.read()
+        if name.endswith('.txt'):
+            data = base64.b64decode(data)
+        return data
+    return None
+
+
+def _download():
+    with urllib.request.urlopen(FONT_SOURCE_URL, timeout=10) as response:
+        return response.read()
+
+
+def subset_font(data, codepoints):
+    '''TTF только с глифами для codepoints; хинтинг и OpenType-фичи не нужны jsPDF'''
+    from fontTools import subset
+    from fontTools.ttLib import TTFont
+
+    options = subset.Options()
+    options.hinting = False
+    options.layout_features = []
+    options.drop_tables += ['GSUB', 'GPOS', 'GDEF', 'MATH']
+    options.name_IDs = ['*']
+    options.notdef_outline = True
+    font = TTFont(BytesIO(data))
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(unicodes=codepoints)
+    subsetter.subset(font)
+    out = BytesIO()
+    font.save(out)
+    return out.getvalue()
+
+
+def get_font(subset=None):
+    '''(байты TTF, ETag) полного шрифта или подмножества; считается один раз'''
+    if subset is not None and subset not in SUBSETS:
+        raise ValueError(f'unknown subset: {subset}')
+    with _lock:
+        if subset in _variants:
+            return _variants[subset]
+        if None not in _variants:
+            data = _read_bundled() or _download()
+            _variants[None] = (data, hashlib.sha256(data).hexdigest()[:32])
+        if subset is not None:
+            data = subset_font(_variants[None][0], SUBSETS[subset])
+            _variants[subset] = (data, hashlib.sha256(data).hexdigest()[:32])
+        return _variants[subset]
@@ -1,32 +1,91 @@
-import urllib.request
 import base64
+import gzip
+
+import font_asset
+
+CACHE_CONTROL = 'public, max-age=2592000'
+# Сжатие окупается только на заметных ответах
+GZIP_MIN_SIZE = 1024
+
+_encoded = {}
+
 
 def handler(event, context):
-    """Download PT Sans Regular font and return as base64"""
-    
-    url = 'https://raw.githubusercontent.com/google/fonts/main/ofl/ptsans/PT_Sans-Web-Regular.ttf'
-    
-    try:
-        response = urllib.request.urlopen(url)
-        font_data = response.read()
-        base64_string = base64.b64encode(font_data).decode('utf-8')
-        
+    """PT Sans Regular для PDF: base64 (по умолчанию) или TTF
+
+    Шрифт загружается один раз на инстанс. subset=cyrillic-latin отдаёт только
+    нужные jsPDF глифы, format=ttf — сам файл. Ответ кэшируется браузером
+    (Cache-Control, ETag/If-None-Match) и сжимается gzip, если клиент умеет.
+    """
+    method = event.get('httpMethod', 'GET')
+    if method == 'OPTIONS':
         return {
             'statusCode': 200,
             'headers': {
-                'Content-Type': 'text/plain',
-                'Access-Control-Allow-Origin': '*'
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, If-None-Match'
             },
-            'body': base64_string,
+            'body': '',
             'isBase64Encoded': False
         }
+
+    params = event.get('queryStringParameters') or {}
+    headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+    fmt = params.get('format') or 'base64'
+    if fmt not in ('base64', 'ttf'):
+        return error_response('format must be base64 or ttf', 400)
+
+    try:
+        data, etag = font_asset.get_font(params.get('subset') or None)
+    except ValueError as e:
+        return error_response(str(e), 400)
     except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'text/plain',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': f'Error: {str(e)}',
-            'isBase64Encoded': False
-        }
\ No newline at end of file
+        return error_response(f'Error: {str(e)}', 500)
+
+    # Слабый ETag: одно содержимое и в gzip, и без сжатия
+    etag = f'W/"{etag}-{fmt}"'
+    response_headers = {
+        'Content-Type': 'text/plain' if fmt == 'base64' else 'font/ttf',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Expose-Headers': 'ETag',
+        'Cache-Control': CACHE_CONTROL,
+        'ETag': etag,
+        'Vary': 'Accept-Encoding',
+    }
+    if etag in [t.strip() for t in headers.get('if-none-match', '').split(',')]:
+        return {'statusCode': 304, 'headers': response_headers, 'body': '', 'isBase64Encoded': False}
+
+    gzipped = 'gzip' in headers.get('accept-encoding', '')
+    body = encoded_body(etag, data, fmt, gzipped)
+    if gzipped and body[1]:
+        response_headers['Content-Encoding'] = 'gzip'
+    return {
+        'statusCode': 200,
+        'headers': response_headers,
+        'body': body[0],
+        'isBase64Encoded': body[2]
+    }
+
+
+def encoded_body(etag, data, fmt, gzipped):
+    '''(тело, сжато ли, isBase64Encoded) — готовые тела тоже кэшируются на инстанс'''
+    key = (etag, gzipped)
+    if key not in _encoded:
+        raw = base64.b64encode(data) if fmt == 'base64' else data
+        if gzipped and len(raw) >= GZIP_MIN_SIZE:
+            _encoded[key] = (base64.b64encode(gzip.compress(raw, 9)).decode('ascii'), True, True)
+        elif fmt == 'base64':
+            _encoded[key] = (raw.decode('ascii'), False, False)
+        else:
+            _encoded[key] = (base64.b64encode(raw).decode('ascii'), False, True)
+    return _encoded[key]
+
+
+def error_response(message, status_code):
+    return {
+        'statusCode': status_code,
+        'headers': {'Content-Type': 'text/plain', 'Access-Control-Allow-Origin': '*'},
+        'body': message,
+        'isBase64Encoded': False
+    }
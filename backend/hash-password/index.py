@@ -1,6 +1,6 @@
 """Вспомогательная функция для генерации bcrypt хешей паролей"""
 import json
-import bcrypt
+import passwords
 
 def handler(event: dict, context) -> dict:
     """Генерирует bcrypt хеш для указанного пароля"""
@@ -37,7 +37,15 @@ def handler(event: dict, context) -> dict:
             'isBase64Encoded': False
         }
     
-    password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    try:
+        password_hash = passwords.hash_password(password)
+    except passwords.PasswordBusy as e:
+        return {
+            'statusCode': 503,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': f'Сервис перегружен, повторите попытку: {e}'}),
+            'isBase64Encoded': False
+        }
     
     return {
         'statusCode': 200,
@@ -0,0 +1,269 @@
+"""Кэш редко меняющихся конфигурационных таблиц в памяти тёплого инстанса функции
+
+Значения хранятся в LRU-словаре и помечаются версиями таблиц из config_versions.
+Версии увеличиваются триггерами при любой записи (см. V0041), а сама проверка
+версий выполняется не чаще одного раза в CONFIG_CACHE_TTL секунд, поэтому
+повторные GET внутри этого окна обслуживаются без обращения к БД.
+
+Соединения LazyConnection после close() возвращаются в небольшой пул
+инстанса: следующий вызов не тратит время на подключение, а подготовленные
+на соединении запросы (queries.py) остаются в силе.
+
+Если задан DATABASE_URL_READ, GET-запросы читают с реплики (reader()).
+Реплика не используется, пока её отставание больше DB_REPLICA_MAX_LAG или
+она недоступна, а также в течение окна после записи клиента: ответ на
+запись несёт заголовок X-DB-Version (mark_write()), клиент возвращает его в
+следующих запросах. Окно не короче допустимого отставания плюс период его
+проверки, поэтому клиент всегда видит свою запись. Версии конфигурационных
+таблиц кэшируются отдельно для основной БД и реплики, чтобы данные реплики
+не попали в кэш под более новой версией основной.
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+
+import psycopg2
+
+CACHE_MAX_ENTRIES = int(os.environ.get('CONFIG_CACHE_MAX_ENTRIES', '128'))
+VERSION_CHECK_TTL = float(os.environ.get('CONFIG_CACHE_TTL', '5'))
+POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '2'))
+# Простоявшее дольше соединение могли закрыть сервер или балансировщик
+POOL_MAX_IDLE = float(os.environ.get('DB_POOL_MAX_IDLE', '300'))
+READ_DSN = os.environ.get('DATABASE_URL_READ')
+REPLICA_MAX_LAG = float(os.environ.get('DB_REPLICA_MAX_LAG', '5'))
+REPLICA_CHECK_TTL = float(os.environ.get('DB_REPLICA_CHECK_TTL', '5'))
+REPLICA_CONNECT_TIMEOUT = int(os.environ.get('DB_REPLICA_CONNECT_TIMEOUT', '2'))
+READ_YOUR_WRITES_WINDOW = max(
+    float(os.environ.get('DB_READ_YOUR_WRITES_WINDOW', '0')), REPLICA_MAX_LAG + REPLICA_CHECK_TTL
+)
+VERSION_HEADER = 'X-DB-Version'
+
+_entries = OrderedDict()
+_versions = {}
+_idle = {}
+_replica = {}
+_lock = threading.Lock()
+
+
+class LazyConnection:
+    """Подключение к БД, которое открывается только при первом обращении
+
+    С read_dsn соединение берётся с реплики, если она сейчас пригодна для
+    чтения (route == 'replica'), иначе с основной БД.
+    """
+
+    def __init__(self, dsn=None, read_dsn=None):
+        self.dsn = dsn or os.environ['DATABASE_URL']
+        self.read_dsn = read_dsn
+        self._route = None if read_dsn else 'primary'
+        self._conn = None
+        self._conn_dsn = None
+
+    @property
+    def route(self):
+        '''primary или replica; при устаревшей оценке отставания реплика проверяется'''
+        if self._route is None:
+            healthy = replica_healthy(self.read_dsn)
+            if healthy is None:
+                self._conn = replica_connection(self.read_dsn)
+                healthy = self._conn is not None
+                self._conn_dsn = self.read_dsn if healthy else None
+            self._route = 'replica' if healthy else 'primary'
+        return self._route
+
+    def get(self):
+        if self._conn is None:
+            if self.route == 'replica':
+                try:
+                    self._conn = acquire(self.read_dsn, connect_timeout=REPLICA_CONNECT_TIMEOUT)
+                    self._conn.readonly = True
+                    self._conn_dsn = self.read_dsn
+                except psycopg2.Error as e:
+                    note_replica(self.read_dsn, None, e)
+                    self._route = 'primary'
+            if self._conn is None:
+                self._conn = acquire(self.dsn)
+                self._conn_dsn = self.dsn
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            release(self._conn_dsn, self._conn)
+            self._conn = None
+
+
+def acquire(dsn, **connect_args):
+    '''Соединение из пула инстанса или новое'''
+    now = time.monotonic()
+    stale = []
+    conn = None
+    with _lock:
+        idle = _idle.get(dsn, [])
+        while idle:
+            candidate, released_at = idle.pop()
+            if candidate.closed or now - released_at > POOL_MAX_IDLE:
+                stale.append(candidate)
+                continue
+            conn = candidate
+            break
+    for candidate in stale:
+        candidate.close()
+    return conn or psycopg2.connect(dsn, **connect_args)
+
+
+def release(dsn, conn):
+    '''Вернуть соединение в пул; незавершённая транзакция откатывается'''
+    if conn.closed:
+        return
+    try:
+        conn.rollback()
+    except psycopg2.Error:
+        conn.close()
+        return
+    with _lock:
+        idle = _idle.setdefault(dsn, [])
+        if len(idle) < POOL_SIZE:
+            idle.append((conn, time.monotonic()))
+            return
+    conn.close()
+
+
+def replica_healthy(dsn):
+    '''True/False по последней проверке реплики или None, если пора проверить'''
+    with _lock:
+        state = _replica.get(dsn)
+    if state is None or time.monotonic() - state[0] > REPLICA_CHECK_TTL:
+        return None
+    return state[1]
+
+
+def note_replica(dsn, lag, error=None):
+    if error is not None:
+        print(f'⚠️ read replica unavailable, using primary: {error}')
+    elif lag > REPLICA_MAX_LAG:
+        print(f'⚠️ read replica lags {lag:.1f}s, using primary')
+    with _lock:
+        _replica[dsn] = (time.monotonic(), error is None and lag <= REPLICA_MAX_LAG)
+
+
+def replica_connection(dsn):
+    '''Соединение с репликой после проверки отставания или None'''
+    try:
+        conn = acquire(dsn, connect_timeout=REPLICA_CONNECT_TIMEOUT)
+        conn.readonly = True
+        with conn.cursor() as cur:
+            # Всё полученное уже применено — реплика не отстаёт, даже если
+            # на основной давно не было записей и replay_timestamp старый
+            cur.execute('''
+                SELECT CASE
+                    WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 'Infinity')
+                END
+            ''')
+            lag = float(cur.fetchone()[0])
+        conn.rollback()
+    except psycopg2.Error as e:
+        note_replica(dsn, None, e)
+        return None
+    note_replica(dsn, lag)
+    if lag > REPLICA_MAX_LAG:
+        release(dsn, conn)
+        return None
+    return conn
+
+
+def recent_write(event):
+    '''Писал ли клиент недавно: метка X-DB-Version моложе окна read-your-writes'''
+    headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+    try:
+        written_at = int(headers.get(VERSION_HEADER.lower(), '')) / 1000
+    except ValueError:
+        return False
+    return time.time() - written_at < READ_YOUR_WRITES_WINDOW
+
+
+def reader(event, dsn=None):
+    '''LazyConnection для чтения: реплика, если она задана и клиент недавно не писал'''
+    if READ_DSN and not recent_write(event):
+        return LazyConnection(dsn, READ_DSN)
+    return LazyConnection(dsn)
+
+
+def mark_write(response):
+    '''Добавить к ответу на запись метку X-DB-Version для read-your-writes'''
+    if READ_DSN:
+        headers = response.setdefault('headers', {})
+        headers[VERSION_HEADER] = str(int(time.time() * 1000))
+        exposed = headers.get('Access-Control-Expose-Headers')
+        headers['Access-Control-Expose-Headers'] = f'{exposed}, {VERSION_HEADER}' if exposed else VERSION_HEADER
+    return response
+
+
+def table_versions(lazy_conn, tables):
+    '''Версии таблиц; запрос к config_versions только если истёк TTL проверки'''
+    now = time.monotonic()
+    route = lazy_conn.route
+    with _lock:
+        known = {t: _versions.get((route, t)) for t in tables}
+    stale = [t for t, v in known.items() if v is None or now - v[1] > VERSION_CHECK_TTL]
+
+    if stale:
+        conn = lazy_conn.get()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    'SELECT table_name, version FROM config_versions WHERE table_name = ANY(%s)',
+                    (list(stale),)
+                )
+                fresh = dict(cur.fetchall())
+        except psycopg2.Error as e:
+            # Без таблицы версий кэш работать не может — читаем напрямую
+            print(f'⚠️ config_versions unavailable: {e}')
+            conn.rollback()
+            return None
+        # Недоступная реплика заменяется основной БД уже в get()
+        route = lazy_conn.route
+        with _lock:
+            for t in stale:
+                _versions[(route, t)] = (fresh.get(t, 0), now)
+                known[t] = _versions[(route, t)]
+
+    return tuple(known[t][0] for t in tables)
+
+
+def get_or_load(key, tables, lazy_conn, loader):
+    '''Вернуть значение из кэша или загрузить его через loader(conn)'''
+    versions = table_versions(lazy_conn, tables)
+    if versions is None:
+        return loader(lazy_conn.get())
+
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None and entry[0] == versions:
+            _entries.move_to_end(key)
+            return entry[1]
+
+    value = loader(lazy_conn.get())
+
+    with _lock:
+        _entries[key] = (versions, value)
+        _entries.move_to_end(key)
+        while len(_entries) > CACHE_MAX_ENTRIES:
+            _entries.popitem(last=False)
+
+    return value
+
+
+def invalidate(*tables):
+    '''Сбросить проверенные версии после записи, чтобы следующий GET перечитал их'''
+    with _lock:
+        for t in tables:
+            _versions.pop(('primary', t), None)
+            _versions.pop(('replica', t), None)
+
+
+def note_version(table, version):
+    '''Принять версию таблицы из уведомления LISTEN/NOTIFY без запроса к БД'''
+    with _lock:
+        _versions[('primary', table)] = (version, time.monotonic())
@@ -1,8 +1,16 @@
 """API для управления настройками карты"""
 import json
-import os
-import psycopg2
 from psycopg2.extras import RealDictCursor
+import config_cache
+import queries
+
+MAP_SETTINGS = queries.statement('map_settings', 'SELECT * FROM {schema}.map_settings ORDER BY setting_key')
+DISPLAY_CONFIGS = queries.statement('display_configs', '''
+    SELECT id, config_type, config_key, display_name, display_order,
+           visible_roles, enabled, settings, format_type, format_options
+    FROM {schema}.display_configs
+    ORDER BY display_order
+''')
 
 def handler(event: dict, context) -> dict:
     method = event.get('httpMethod', 'GET')
@@ -15,43 +23,50 @@ def handler(event: dict, context) -> dict:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
+                'Access-Control-Allow-Headers': 'Content-Type, X-DB-Version'
             },
             'body': '',
             'isBase64Encoded': False
         }
 
     try:
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        lazy_conn = config_cache.reader(event) if method == 'GET' else config_cache.LazyConnection()
         
         if resource == 'display-configs':
             if method == 'GET':
-                result = get_display_configs(conn)
+                result = config_cache.get_or_load(
+                    ('display_configs',), ['display_configs'], lazy_conn, get_display_configs
+                )
             elif method == 'POST':
                 data = json.loads(event.get('body', '{}'))
-                result = save_display_configs(conn, data)
+                result = config_cache.mark_write(save_display_configs(lazy_conn.get(), data))
+                config_cache.invalidate('display_configs')
             else:
                 return error_response('Method not allowed', 405)
         else:
             if method == 'GET':
-                result = get_all_settings(conn)
+                result = config_cache.get_or_load(
+                    ('map_settings',), ['map_settings'], lazy_conn, get_all_settings
+                )
             elif method == 'POST':
                 data = json.loads(event.get('body', '{}'))
-                result = upsert_setting(conn, data)
+                result = config_cache.mark_write(upsert_setting(lazy_conn.get(), data))
+                config_cache.invalidate('map_settings')
             elif method == 'PUT':
                 data = json.loads(event.get('body', '{}'))
-                result = upsert_setting(conn, data)
+                result = config_cache.mark_write(upsert_setting(lazy_conn.get(), data))
+                config_cache.invalidate('map_settings')
             else:
                 return error_response('Method not allowed', 405)
         
-        conn.close()
+        lazy_conn.close()
         return result
     except Exception as e:
         return error_response(str(e), 500)
 
 def get_all_settings(conn):
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute('SELECT * FROM t_p78972315_landgis_creator.map_settings ORDER BY setting_key')
+        queries.execute(cur, MAP_SETTINGS)
         settings = cur.fetchall()
         return {
             'statusCode': 200,
@@ -86,12 +101,7 @@ def upsert_setting(conn, data):
 
 def get_display_configs(conn):
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute('''
-            SELECT id, config_type, config_key, display_name, display_order,
-                   visible_roles, enabled, settings, format_type, format_options
-            FROM t_p78972315_landgis_creator.display_configs
-            ORDER BY display_order
-        ''')
+        queries.execute(cur, DISPLAY_CONFIGS)
         configs = cur.fetchall()
         
         result = []
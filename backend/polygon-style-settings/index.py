@@ -1,8 +1,8 @@
 """API для получения активного атрибута стилизации"""
 import json
 import os
-import psycopg2
 from psycopg2.extras import RealDictCursor
+import config_cache
 
 def handler(event: dict, context) -> dict:
     method = event.get('httpMethod', 'GET')
@@ -26,17 +26,10 @@ def handler(event: dict, context) -> dict:
         }
     
     try:
-        dsn = os.environ.get('DATABASE_URL')
-        conn = psycopg2.connect(dsn)
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        
-        cursor.execute("""
-            SELECT active_attribute
-            FROM t_p78972315_landgis_creator.polygon_style_settings
-            WHERE id = 1
-        """)
-        
-        result = cursor.fetchone()
+        lazy_conn = config_cache.LazyConnection(os.environ.get('DATABASE_URL'))
+        result = config_cache.get_or_load(
+            ('polygon_style_settings',), ['polygon_style_settings'], lazy_conn, load_active_attribute
+        )
         
         return {
             'statusCode': 200,
@@ -57,7 +50,15 @@ def handler(event: dict, context) -> dict:
             'body': json.dumps({'error': str(e)})
         }
     finally:
-        if 'cursor' in locals():
-            cursor.close()
-        if 'conn' in locals():
-            conn.close()
+        if 'lazy_conn' in locals():
+            lazy_conn.close()
+
+
+def load_active_attribute(conn):
+    with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+        cursor.execute("""
+            SELECT active_attribute
+            FROM t_p78972315_landgis_creator.polygon_style_settings
+            WHERE id = 1
+        """)
+        return cursor.fetchone()
@@ -3,6 +3,7 @@ import json
 import os
 import psycopg2
 from psycopg2.extras import RealDictCursor
+import config_cache
 
 def handler(event: dict, context) -> dict:
     method = event.get('httpMethod', 'GET')
@@ -13,28 +14,25 @@ def handler(event: dict, context) -> dict:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
+                'Access-Control-Allow-Headers': 'Content-Type, X-DB-Version'
             },
             'body': ''
         }
     
     try:
         dsn = os.environ.get('DATABASE_URL')
-        conn = psycopg2.connect(dsn)
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
         
         if method == 'GET':
             attribute_key = event.get('queryStringParameters', {}).get('attribute_key', 'segment')
             
-            cursor.execute("""
-                SELECT attribute_key, attribute_value, fill_color, fill_opacity, 
-                       stroke_color, stroke_width
-                FROM t_p78972315_landgis_creator.polygon_style_config
-                WHERE attribute_key = %s
-                ORDER BY attribute_value
-            """, (attribute_key,))
-            
-            styles = cursor.fetchall()
+            lazy_conn = config_cache.reader(event, dsn)
+            try:
+                styles = config_cache.get_or_load(
+                    ('polygon_style_config', attribute_key), ['polygon_style_config'], lazy_conn,
+                    lambda conn: load_styles(conn, attribute_key)
+                )
+            finally:
+                lazy_conn.close()
             
             return {
                 'statusCode': 200,
@@ -42,10 +40,13 @@ def handler(event: dict, context) -> dict:
                     'Content-Type': 'application/json',
                     'Access-Control-Allow-Origin': '*'
                 },
-                'body': json.dumps([dict(s) for s in styles], default=str)
+                'body': json.dumps(styles, default=str)
             }
         
-        elif method == 'POST':
+        conn = psycopg2.connect(dsn)
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        
+        if method == 'POST':
             body = json.loads(event.get('body', '{}'))
             active_attribute = body.get('active_attribute', 'segment')
             styles = body.get('styles', [])
@@ -78,15 +79,16 @@ def handler(event: dict, context) -> dict:
                 ))
             
             conn.commit()
+            config_cache.invalidate('polygon_style_config', 'polygon_style_settings')
             
-            return {
+            return config_cache.mark_write({
                 'statusCode': 200,
                 'headers': {
                     'Content-Type': 'application/json',
                     'Access-Control-Allow-Origin': '*'
                 },
                 'body': json.dumps({'success': True})
-            }
+            })
         
         return {
             'statusCode': 405,
@@ -108,3 +110,15 @@ def handler(event: dict, context) -> dict:
             cursor.close()
         if 'conn' in locals():
             conn.close()
+
+
+def load_styles(conn, attribute_key):
+    with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+        cursor.execute("""
+            SELECT attribute_key, attribute_value, fill_color, fill_opacity, 
+                   stroke_color, stroke_width
+            FROM t_p78972315_landgis_creator.polygon_style_config
+            WHERE attribute_key = %s
+            ORDER BY attribute_value
+        """, (attribute_key,))
+        return [dict(s) for s in cursor.fetchall()]
@@ -0,0 +1,86 @@
+"""Потребитель уведомлений landgis_changes для тёплого инстанса функции
+
+Держит отдельное соединение с LISTEN, переносит версии конфигурационных таблиц
+в config_cache и ведёт номер последнего изменения landplots (change_feed.id),
+который служит версией данных для кэшей, зависящих от участков.
+"""
+import json
+import os
+import select
+
+import psycopg2
+
+import config_cache
+
+CHANNEL = 'landgis_changes'
+
+_listener = None
+_landplots_seq = 0
+_callbacks = []
+
+
+def on_landplots_change(callback):
+    '''Подписать обработчик callback(seq, row_id, op) на изменения участков'''
+    _callbacks.append(callback)
+
+
+def landplots_version():
+    '''Номер последнего известного изменения участков'''
+    return _landplots_seq
+
+
+def listening():
+    '''Есть ли живое LISTEN-соединение, т.е. можно ли доверять landplots_version()'''
+    return _listener is not None and not _listener.closed
+
+
+def _connect(dsn):
+    global _listener, _landplots_seq
+    conn = psycopg2.connect(dsn)
+    conn.set_session(autocommit=True)
+    with conn.cursor() as cur:
+        cur.execute(f'LISTEN {CHANNEL}')
+        # Пока соединения не было, уведомления терялись — берём текущую позицию ленты
+        cur.execute('SELECT COALESCE(MAX(id), 0) FROM change_feed')
+        _landplots_seq = cur.fetchone()[0]
+    _listener = conn
+    for callback in _callbacks:
+        callback(_landplots_seq, None, 'R')
+
+
+def _dispatch(payload):
+    global _landplots_seq
+    try:
+        data = json.loads(payload)
+    except ValueError:
+        return
+    table = data.get('t')
+    if 'v' in data:
+        config_cache.note_version(table, data['v'])
+    elif table == 'landplots':
+        _landplots_seq = max(_landplots_seq, data.get('s', 0))
+        for callback in _callbacks:
+            callback(data.get('s'), data.get('i'), data.get('o'))
+
+
+def drain(timeout=0.0, dsn=None):
+    '''Обработать накопившиеся уведомления, ожидая до timeout секунд первое из них'''
+    global _listener
+    try:
+        if _listener is None or _listener.closed:
+            _connect(dsn or os.environ['DATABASE_URL'])
+        if timeout > 0 and not _listener.notifies:
+            select.select([_listener], [], [], timeout)
+        _listener.poll()
+    except (psycopg2.Error, OSError) as e:
+        print(f'⚠️ change feed listener dropped: {e}')
+        if _listener is not None:
+            _listener.close()
+        _listener = None
+        return 0
+
+    handled = 0
+    while _listener.notifies:
+        _dispatch(_listener.notifies.pop(0).payload)
+        handled += 1
+    return handled
@@ -0,0 +1,116 @@
+"""Компилятор правил conditionalDisplay в предикаты
+
+Повторяет shouldShowField из src/components/attributes/AttributeViewMode.tsx,
+включая приведение значений к строке по правилам JavaScript (String(value)).
+"""
+import json
+from decimal import Decimal
+
+MISSING = object()
+
+
+def js_number(value):
+    '''Аналог String(number) из JavaScript: кратчайшие цифры, экспонента вне [1e-7, 1e21)'''
+    value = float(value)
+    if value != value:
+        return 'NaN'
+    if value in (float('inf'), float('-inf')):
+        return 'Infinity' if value > 0 else '-Infinity'
+    if value == 0:
+        return '0'
+    sign = '-' if value < 0 else ''
+    # repr даёт те же кратчайшие цифры, что и JavaScript, отличается только запись
+    _, digit_tuple, exponent = Decimal(repr(abs(value))).as_tuple()
+    point = exponent + len(digit_tuple)  # число цифр до десятичной точки
+    digits = ''.join(map(str, digit_tuple)).rstrip('0')
+    k = len(digits)
+    if k <= point <= 21:
+        text = digits + '0' * (point - k)
+    elif 0 < point <= 21:
+        text = f'{digits[:point]}.{digits[point:]}'
+    elif -6 < point <= 0:
+        text = '0.' + '0' * -point + digits
+    else:
+        mantissa = digits[0] + (f'.{digits[1:]}' if k > 1 else '')
+        text = f'{mantissa}e{"+" if point - 1 >= 0 else "-"}{abs(point - 1)}'
+    return sign + text
+
+
+def js_string(value):
+    '''Аналог String(value) из JavaScript для значений из JSON'''
+    if value is MISSING:
+        return 'undefined'
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (int, float)):
+        return js_number(value)
+    if isinstance(value, list):
+        return ','.join('' if v is None else js_string(v) for v in value)
+    if isinstance(value, dict):
+        return '[object Object]'
+    return str(value)
+
+
+def normalize_value(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, str):
+        lower = value.lower().strip()
+        if lower in ('да', 'yes'):
+            return 'true'
+        if lower in ('нет', 'no'):
+            return 'false'
+        return lower
+    return js_string(value).lower().strip()
+
+
+def compile_rule(rule):
+    '''Предикат attrs -> bool для одного conditionalDisplay или None, если правила нет'''
+    if not rule or not isinstance(rule, dict):
+        return None
+    depends_on = rule.get('dependsOn')
+    if not depends_on:
+        return None
+
+    # Правило без showWhen сравнивается с undefined, как на клиенте
+    show_when = rule.get('showWhen', MISSING)
+    expected = frozenset(
+        normalize_value(v) for v in (show_when if isinstance(show_when, list) else [show_when])
+    )
+
+    def predicate(attrs):
+        parent = attrs.get(depends_on, MISSING)
+        if isinstance(parent, list):
+            return any(normalize_value(v) in expected for v in parent)
+        return normalize_value(parent) in expected
+
+    return predicate
+
+
+def rule_from_format_options(format_options):
+    '''conditionalDisplay из format_options (sync_attribute_configs кладёт его туда)'''
+    if isinstance(format_options, str):
+        try:
+            format_options = json.loads(format_options)
+        except ValueError:
+            return None
+    if not isinstance(format_options, dict):
+        return None
+    return format_options.get('conditionalDisplay')
+
+
+def compile_rules(rules_by_key):
+    '''{ключ атрибута: conditionalDisplay} -> кортеж (ключ, предикат)'''
+    compiled = []
+    for key, rule in rules_by_key.items():
+        predicate = compile_rule(rule)
+        if predicate is not None:
+            compiled.append((key, predicate))
+    return tuple(compiled)
+
+
+def hidden_by_rules(attrs, compiled_rules):
+    '''Ключи атрибутов, которые правила скрывают для данного участка'''
+    return {key for key, predicate in compiled_rules if key in attrs and not predicate(attrs)}
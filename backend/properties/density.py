@@ -0,0 +1,103 @@
+"""Сетка плотности участков для обзорного слоя карты
+
+Клетки совпадают с клетками geohash заданной точности: 5·p бит делятся между
+долготой (ceil) и широтой (floor), поэтому клетка — прямоугольник 360/2^lng_bits
+на 180/2^lat_bits градусов. Номера клеток, число участков и суммы площади и
+цены считаются одним GROUP BY по отфильтрованной выборке; строка geohash
+собирается из номеров клеток уже в Python. Точка участка — центроид границы
+(V0045), а без неё — маркер.
+"""
+from psycopg2.extras import RealDictCursor
+
+MIN_PRECISION = 1
+MAX_PRECISION = 8
+DEFAULT_PRECISION = 5
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def cell_size(precision):
+    '''Размер клетки (по широте, по долготе) в градусах и число бит на ось'''
+    bits = 5 * precision
+    lng_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits), lat_bits, lng_bits
+
+
+def encode(lat_index, lng_index, precision):
+    '''Geohash клетки по её номерам вдоль широты и долготы'''
+    _, _, lat_bits, lng_bits = cell_size(precision)
+    chars = []
+    value = 0
+    lat_left, lng_left = lat_bits, lng_bits
+    for i in range(5 * precision):
+        # Чётные биты geohash — долгота, нечётные — широта, от старших к младшим
+        if i % 2 == 0:
+            lng_left -= 1
+            bit = (lng_index >> lng_left) & 1
+        else:
+            lat_left -= 1
+            bit = (lat_index >> lat_left) & 1
+        value = (value << 1) | bit
+        if i % 5 == 4:
+            chars.append(BASE32[value])
+            value = 0
+    return ''.join(chars)
+
+
+def parse_precision(raw):
+    '''Точность из параметра precision; ValueError вне диапазона'''
+    precision = int(raw) if raw else DEFAULT_PRECISION
+    if not MIN_PRECISION <= precision <= MAX_PRECISION:
+        raise ValueError('invalid precision')
+    return precision
+
+
+def parse_bbox(raw):
+    '''Окно карты south,west,north,east или None'''
+    if not raw:
+        return None
+    values = tuple(float(v) for v in raw.split(','))
+    if len(values) != 4 or values[0] > values[2] or values[1] > values[3]:
+        raise ValueError('invalid bbox')
+    return values
+
+
+def compute_density(conn, where, args, precision, bbox=None):
+    '''Клетки с числом участков и суммами площади и цены'''
+    cell_lat, cell_lng, lat_bits, lng_bits = cell_size(precision)
+    point = 'COALESCE(centroid_lat, latitude)', 'COALESCE(centroid_lng, longitude)'
+    if bbox is not None:
+        where = f'{where} AND {point[0]} BETWEEN %s AND %s AND {point[1]} BETWEEN %s AND %s'
+        args = args + [bbox[0], bbox[2], bbox[1], bbox[3]]
+
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(f'''
+            SELECT LEAST(floor((lat + 90) / %s)::bigint, %s) AS lat_index,
+                   LEAST(floor((lng + 180) / %s)::bigint, %s) AS lng_index,
+                   COUNT(*) AS count,
+                   COALESCE(SUM(area), 0) AS area_sum,
+                   COALESCE(SUM(price), 0) AS price_sum
+            FROM (
+                SELECT {point[0]} AS lat, {point[1]} AS lng, area, price
+                FROM landplots
+                WHERE {where}
+            ) p
+            WHERE lat IS NOT NULL AND lng IS NOT NULL
+            GROUP BY 1, 2
+        ''', [cell_lat, (1 << lat_bits) - 1, cell_lng, (1 << lng_bits) - 1] + args)
+        rows = cur.fetchall()
+
+    cells = []
+    for row in rows:
+        south = row['lat_index'] * cell_lat - 90
+        west = row['lng_index'] * cell_lng - 180
+        cells.append({
+            'geohash': encode(row['lat_index'], row['lng_index'], precision),
+            'bbox': [south, west, south + cell_lat, west + cell_lng],
+            'center': [south + cell_lat / 2, west + cell_lng / 2],
+            'count': row['count'],
+            'area_sum': float(row['area_sum']),
+            'price_sum': float(row['price_sum']),
+        })
+    cells.sort(key=lambda c: c['geohash'])
+    return {'precision': precision, 'cell': [cell_lat, cell_lng], 'cells': cells}
@@ -0,0 +1,204 @@
+"""Поиск дублей и наложений участков после массовых импортов
+
+Пары-кандидаты находятся заметанием по bbox из колонок V0045: участки
+отсортированы по западной границе, и каждый сравнивается только с «активными»
+участками, чей bbox ещё не кончился по долготе, — почти линейно вместо
+сравнения всех пар. Для пар с заметным пересечением bbox считается точная
+площадь пересечения: второй полигон разбивается на треугольники, первый
+отсекается каждым из них (Сазерленд — Ходжмен). Доля наложения — площадь
+пересечения к меньшему из участков; к ней добавляется похожесть названий и
+адресов. Результат пишется в landplot_duplicates (V0046).
+"""
+from difflib import SequenceMatcher
+
+from psycopg2.extras import RealDictCursor, execute_values
+
+import geometry
+
+BBOX_OVERLAP_THRESHOLD = 0.05
+OVERLAP_THRESHOLD = 0.1
+# Вес наложения в итоговой оценке; остаток делят название и адрес
+OVERLAP_WEIGHT = 0.6
+
+
+def cross(o, a, b):
+    return (a[1] - o[1]) * (b[0] - o[0]) - (a[0] - o[0]) * (b[1] - o[1])
+
+
+def area(ring):
+    '''Площадь многоугольника в квадратных градусах (x=lng, y=lat)'''
+    return abs(geometry.planar_area(ring)) if len(ring) >= 3 else 0.0
+
+
+def _in_triangle(p, a, b, c):
+    return cross(a, b, p) >= 0 and cross(b, c, p) >= 0 and cross(c, a, p) >= 0
+
+
+def triangulate(ring):
+    '''Треугольники простого кольца против часовой стрелки (отсечение ушей)'''
+    points = list(ring)
+    triangles = []
+    while len(points) > 3:
+        for k in range(len(points)):
+            a, b, c = points[k - 1], points[k], points[(k + 1) % len(points)]
+            turn = cross(a, b, c)
+            if turn == 0:
+                # Вершина на прямой не даёт площади — просто убираем её
+                points.pop(k)
+                break
+            if turn < 0:
+                continue
+            if any(_in_triangle(p, a, b, c) for p in points if p not in (a, b, c)):
+                continue
+            triangles.append((a, b, c))
+            points.pop(k)
+            break
+        else:
+            # Ушей не нашлось — контур не простой, остаток не учитываем
+            return triangles
+    if len(points) == 3 and cross(*points) > 0:
+        triangles.append(tuple(points))
+    return triangles
+
+
+def clip(subject, convex):
+    '''Сазерленд — Ходжмен: часть subject внутри выпуклого кольца против часовой'''
+    output = list(subject)
+    for i in range(len(convex)):
+        if not output:
+            break
+        a, b = convex[i], convex[(i + 1) % len(convex)]
+        points, output = output, []
+        for j in range(len(points)):
+            p, q = points[j - 1], points[j]
+            p_in, q_in = cross(a, b, p) >= 0, cross(a, b, q) >= 0
+            if q_in != p_in:
+                # Точка пересечения ребра pq с прямой ab
+                d1, d2 = cross(a, b, p), cross(a, b, q)
+                t = d1 / (d1 - d2)
+                output.append((p[0] + t * (q[0] - p[0]), p[1] + t * (q[1] - p[1])))
+            if q_in:
+                output.append(q)
+    return output
+
+
+def intersection_area(parts_a, parts_b):
+    '''Площадь пересечения двух наборов простых колец (части не пересекаются)'''
+    total = 0.0
+    for ring_b in parts_b:
+        for triangle in triangulate(ring_b):
+            for ring_a in parts_a:
+                total += area(clip(ring_a, triangle))
+    return total
+
+
+def similarity(a, b):
+    a, b = (a or '').strip().lower(), (b or '').strip().lower()
+    if not a or not b:
+        return 0.0
+    return SequenceMatcher(None, a, b).ratio()
+
+
+class Plot:
+    """Участок для сравнения: bbox, исправленные кольца и их площадь"""
+
+    def __init__(self, row):
+        self.id = row['id']
+        self.title = row['title']
+        self.location = row['location']
+        self.south, self.west = row['bbox_south'], row['bbox_west']
+        self.north, self.east = row['bbox_north'], row['bbox_east']
+        self.parts = geometry.repair_rings(geometry.input_rings(row['boundary'], row['boundary_parts']), set())
+        self.area = sum(area(p) for p in self.parts)
+
+    @property
+    def bbox_area(self):
+        return (self.north - self.south) * (self.east - self.west)
+
+
+def candidate_pairs(plots):
+    '''Пары с пересекающимися bbox; plots отсортированы по west'''
+    active = []
+    for plot in plots:
+        active = [other for other in active if other.east >= plot.west]
+        for other in active:
+            if other.south <= plot.north and other.north >= plot.south:
+                yield other, plot
+        active.append(plot)
+
+
+def compare(a, b):
+    '''Метрики пары или None, если наложение ниже порога'''
+    if not a.area or not b.area:
+        return None
+    # Дешёвый отсев по пересечению bbox: соседи по границе почти не перекрываются
+    overlap_lat = min(a.north, b.north) - max(a.south, b.south)
+    overlap_lng = min(a.east, b.east) - max(a.west, b.west)
+    smaller_bbox = min(a.bbox_area, b.bbox_area)
+    if smaller_bbox > 0 and overlap_lat * overlap_lng / smaller_bbox < BBOX_OVERLAP_THRESHOLD:
+        return None
+
+    ratio = min(intersection_area(a.parts, b.parts) / min(a.area, b.area), 1.0)
+    if ratio < OVERLAP_THRESHOLD:
+        return None
+    title = similarity(a.title, b.title)
+    location = similarity(a.location, b.location)
+    score = OVERLAP_WEIGHT * ratio + (1 - OVERLAP_WEIGHT) / 2 * (title + location)
+    first, second = sorted((a.id, b.id))
+    return first, second, ratio, title, location, score
+
+
+def find_duplicates(plots):
+    plots = sorted(plots, key=lambda p: p.west)
+    return [pair for pair in (compare(a, b) for a, b in candidate_pairs(plots)) if pair]
+
+
+def detect(conn):
+    '''Пересчитать отчёт по всем участкам с геометрией; возвращает число пар'''
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute('''
+            SELECT id, title, location, boundary, boundary_parts,
+                   bbox_south, bbox_west, bbox_north, bbox_east
+            FROM landplots
+            WHERE bbox_south IS NOT NULL
+        ''')
+        plots = [Plot(row) for row in cur.fetchall()]
+
+    pairs = find_duplicates(plots)
+
+    with conn.cursor() as cur:
+        if pairs:
+            execute_values(cur, '''
+                INSERT INTO landplot_duplicates
+                    (plot_a, plot_b, overlap_ratio, title_similarity, location_similarity, score, detected_at)
+                VALUES %s
+                ON CONFLICT (plot_a, plot_b) DO UPDATE SET
+                    overlap_ratio = EXCLUDED.overlap_ratio,
+                    title_similarity = EXCLUDED.title_similarity,
+                    location_similarity = EXCLUDED.location_similarity,
+                    score = EXCLUDED.score,
+                    detected_at = EXCLUDED.detected_at
+            ''', pairs, template='(%s, %s, %s, %s, %s, %s, now())')
+        # now() одинаков в транзакции: пары, не найденные в этом прогоне, удаляются
+        cur.execute('DELETE FROM landplot_duplicates WHERE detected_at < now()')
+    conn.commit()
+    return len(pairs)
+
+
+def load_report(conn, status='open', limit=500):
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute('''
+            SELECT d.plot_a, a.title AS title_a, a.location AS location_a,
+                   d.plot_b, b.title AS title_b, b.location AS location_b,
+                   d.overlap_ratio, d.title_similarity, d.location_similarity,
+                   d.score, d.status, d.detected_at
+            FROM landplot_duplicates d
+            JOIN landplots a ON a.id = d.plot_a
+            JOIN landplots b ON b.id = d.plot_b
+            WHERE %s::text IS NULL OR d.status = %s
+            ORDER BY d.score DESC
+            LIMIT %s
+        ''', (status, status, limit))
+        rows = cur.fetchall()
+    conn.commit()
+    return rows
@@ -0,0 +1,171 @@
+"""Перевод фильтров карты в условие WHERE для запросов к landplots
+
+Повторяет matches_filter из filters.py (и matchesAdvanced/matchesSegment из
+src/pages/Index.tsx), чтобы агрегаты и выгрузки считались в БД по тем же
+правилам, что и выборка на карте.
+"""
+import json
+
+from search import WORD_RE, prefix_tsquery
+
+# Строковые колонки landplots, по которым может быть задан attributePath
+TEXT_COLUMNS = ('title', 'location', 'type', 'segment', 'status')
+
+CREATED_PERIODS = {
+    'today': "date_trunc('day', now())",
+    'week': "date_trunc('day', now()) - interval '7 days'",
+    'month': "date_trunc('day', now()) - interval '1 month'",
+}
+
+SEGMENT_SQL = '''(CASE jsonb_typeof(attributes->'segment')
+    WHEN 'array' THEN EXISTS (
+        SELECT 1 FROM jsonb_array_elements_text(attributes->'segment') s WHERE s = ANY(%s))
+    WHEN 'string' THEN EXISTS (
+        SELECT 1 FROM unnest(string_to_array(attributes->>'segment', ',')) s
+        WHERE btrim(s, ' "[]') = ANY(%s))
+    ELSE segment = ANY(%s)
+END)'''
+
+
+def load_filter_settings(conn):
+    '''Настройки фильтров карты {id: настройка} из filter_config'''
+    with conn.cursor() as cur:
+        cur.execute("SELECT config FROM filter_config WHERE config_type = 'filters' ORDER BY id LIMIT 1")
+        row = cur.fetchone()
+    config = row[0] if row else []
+    if isinstance(config, str):
+        config = json.loads(config)
+    return {s.get('id'): s for s in config or [] if isinstance(s, dict)}
+
+
+def filter_clause(filter_id, attribute_path, values):
+    '''SQL-условие и параметры для одного фильтра карты'''
+    values = [str(v) for v in values]
+
+    if filter_id == 'region' or attribute_path == 'attributes.region':
+        return (
+            "(jsonb_typeof(attributes->'region') = 'string' "
+            "AND attributes->>'region' NOT LIKE 'lyr\\_%%' AND attributes->>'region' = ANY(%s))",
+            [values]
+        )
+    if filter_id == 'segment' or attribute_path == 'attributes.segment':
+        return SEGMENT_SQL, [values, values, values]
+    if filter_id == 'status' or attribute_path == 'status':
+        return 'status = ANY(%s)', [values]
+    if filter_id == 'type' or attribute_path == 'type':
+        return 'type = ANY(%s)', [values]
+    if filter_id == 'status_publ' or attribute_path == 'attributes.status_publ':
+        return "COALESCE(attributes->>'status_publ' = ANY(%s), FALSE)", [values]
+
+    if attribute_path.startswith('attributes.'):
+        # Как во фронтенде: фильтр применяется только к непустым строковым значениям
+        keys = attribute_path.split('.')[1:]
+        return (
+            "(jsonb_typeof(attributes #> %s) IS DISTINCT FROM 'string' "
+            "OR attributes #>> %s = '' OR attributes #>> %s = ANY(%s))",
+            [keys, keys, keys, values]
+        )
+    if attribute_path in TEXT_COLUMNS:
+        return f"(COALESCE({attribute_path}, '') = '' OR {attribute_path} = ANY(%s))", [values]
+
+    return None, []
+
+
+def like_pattern(text):
+    '''Шаблон ILIKE «содержит» с экранированием спецсимволов'''
+    return '%' + text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def parse_filters(params):
+    '''Выбранные значения фильтров из параметра filters (JSON {id: [значения]})'''
+    try:
+        filters = json.loads(params.get('filters') or '{}')
+    except ValueError:
+        return {}
+    if not isinstance(filters, dict):
+        return {}
+    return {k: v for k, v in filters.items() if v and isinstance(v, list)}
+
+
+def build_where(params, projection, settings):
+    '''Условие WHERE (без ключевого слова) и параметры по query-параметрам карты
+
+    Поддерживаются filters (JSON {id: [значения]}), search, q, type,
+    segment, created (today/week/month/older) и date (даты в атрибутах, today/week/month).
+    '''
+    clauses = []
+    args = []
+
+    def add(sql, sql_args):
+        if sql:
+            clauses.append(sql)
+            args.extend(sql_args)
+
+    for filter_id, values in parse_filters(params).items():
+        # Скрытые для вызывающего фильтры он задать не может — их значения применяет сервер
+        if filter_id in projection.hidden_filter_ids:
+            continue
+        setting = settings.get(filter_id) or {}
+        add(*filter_clause(filter_id, setting.get('attributePath', ''), values))
+
+    for filter_id, attribute_path, values in projection.enforced_filters:
+        add(*filter_clause(filter_id, attribute_path, values))
+
+    search = (params.get('search') or '').strip()
+    if search:
+        pattern = like_pattern(search)
+        add('(title ILIKE %s OR location ILIKE %s)', [pattern, pattern])
+
+    # Поиск таблицы данных — те же правила совпадения, что и в search.search.
+    # <% обслуживается GIN-индексом; порог на соединении задаёт search.use_fuzzy_threshold
+    text = (params.get('q') or '').strip()
+    tsquery = prefix_tsquery(text) if text else None
+    if tsquery:
+        fuzzy = ' '.join(WORD_RE.findall(text.lower()))
+        add(
+            "(search_vector @@ to_tsquery('russian', %s) OR %s <%% search_document)",
+            [tsquery, fuzzy]
+        )
+
+    if params.get('type') and params['type'] != 'all':
+        add('type = %s', [params['type']])
+
+    if params.get('segment') and params['segment'] != 'all':
+        add(*filter_clause('segment', 'attributes.segment', [params['segment']]))
+
+    created = params.get('created')
+    if created == 'older':
+        add("created_at < date_trunc('day', now()) - interval '1 month'", [])
+    elif created in CREATED_PERIODS:
+        add(f'created_at >= {CREATED_PERIODS[created]}', [])
+
+    date = params.get('date')
+    if date in CREATED_PERIODS:
+        # Даты в атрибутах хранятся строками dd.MM.yyyy или ISO — сравниваем как текст,
+        # чтобы некорректные значения не роняли запрос
+        cutoff = CREATED_PERIODS[date]
+        add(f'''EXISTS (
+            SELECT 1 FROM jsonb_each(attributes) e
+            WHERE jsonb_typeof(e.value) = 'string' AND (
+                (e.value #>> '{{}}' ~ '^\\d{{2}}\\.\\d{{2}}\\.\\d{{4}}$'
+                 AND substr(e.value #>> '{{}}', 7, 4) || substr(e.value #>> '{{}}', 4, 2)
+                     || substr(e.value #>> '{{}}', 1, 2) >= to_char({cutoff}, 'YYYYMMDD'))
+                OR (e.value #>> '{{}}' ~ '^\\d{{4}}-\\d{{2}}-\\d{{2}}'
+                 AND left(e.value #>> '{{}}', 10) >= to_char({cutoff}, 'YYYY-MM-DD'))
+            ))''', [])
+
+    return ' AND '.join(clauses) or 'TRUE', args
+
+
+def filter_signature(params):
+    '''Канонический вид фильтров для ключей кэша'''
+    normalized = {k: sorted(str(v) for v in vals) for k, vals in parse_filters(params).items()}
+    return json.dumps({
+        'filters': normalized,
+        'search': (params.get('search') or '').strip().lower(),
+        'q': (params.get('q') or '').strip().lower(),
+        'type': params.get('type') or 'all',
+        'segment': params.get('segment') or 'all',
+        'created': params.get('created') or '',
+        'date': params.get('date') or '',
+    }, sort_keys=True, ensure_ascii=False)
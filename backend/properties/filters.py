@@ -0,0 +1,60 @@
+"""Серверная версия фильтров карты (см. matchesAdvanced в src/pages/Index.tsx)"""
+import json
+
+
+def get_path(prop, path):
+    '''Значение по пути вида attributes.region для сериализованного участка'''
+    current = prop
+    for key in path.split('.'):
+        if not isinstance(current, dict):
+            return None
+        current = current.get(key)
+    return current
+
+
+def matches_filter(prop, filter_id, attribute_path, values):
+    '''Проходит ли участок фильтр filter_id со списком выбранных значений'''
+    if not values:
+        return True
+    attrs = prop.get('attributes') or {}
+
+    if filter_id == 'region' or attribute_path == 'attributes.region':
+        region = attrs.get('region')
+        if not region or (isinstance(region, str) and region.startswith('lyr_')):
+            return False
+        return region in values
+    if filter_id == 'segment' or attribute_path == 'attributes.segment':
+        seg = attrs.get('segment')
+        if isinstance(seg, list):
+            return any(s in values for s in seg)
+        if isinstance(seg, str):
+            try:
+                parsed = json.loads(seg)
+                if isinstance(parsed, list):
+                    return any(s in values for s in parsed)
+            except ValueError:
+                pass
+            return any(s.strip() in values for s in seg.split(','))
+        return prop.get('segment') in values
+    if filter_id == 'status' or attribute_path == 'status':
+        return prop.get('status') in values
+    if filter_id == 'type' or attribute_path == 'type':
+        return prop.get('type') in values
+    if filter_id == 'status_publ' or attribute_path == 'attributes.status_publ':
+        return attrs.get('status_publ') in values
+
+    if attribute_path:
+        value = get_path(prop, attribute_path)
+        if value and isinstance(value, str):
+            return value in values
+
+    return True
+
+
+def matches_all(prop, filters, settings):
+    '''Проверка набора {filter_id: [значения]} с путями из filter_config'''
+    for filter_id, values in filters.items():
+        setting = settings.get(filter_id) or {}
+        if not matches_filter(prop, filter_id, setting.get('attributePath', ''), values):
+            return False
+    return True
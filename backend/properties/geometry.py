@@ -0,0 +1,244 @@
+"""Подготовка геометрии участка при записи границы
+
+Граница хранится как кольцо точек [lat, lng] — обычно открытое, без повтора
+первой точки. Мультиполигоны из GeoJSON/KML приходят в boundary_parts — списке
+колец, по одному на часть. Перед записью кольца проверяются и чинятся
+(некорректные и повторяющиеся точки, ориентация против часовой стрелки,
+самопересечения) и сохраняются в том же виде, в каком пришли: замкнутые —
+замкнутыми, открытые — открытыми. Метрики замыкают кольцо сами. По всем частям
+считаются центроид с весом по площади, геодезическая площадь и bbox. Эти
+значения сохраняются в колонках landplots (V0045) и используются запросами по
+bbox, кластеризацией и статистикой.
+
+Пакетный пересчёт всей таблицы — в geometry_batch.py (NumPy).
+"""
+import math
+
+EARTH_RADIUS = 6378137.0
+MIN_PART_AREA = 1e-14  # в квадратных градусах: меньше — вырожденная часть
+MAX_SPLITS = 64
+
+GEOMETRY_COLUMNS = (
+    'centroid_lat', 'centroid_lng', 'geo_area_m2',
+    'bbox_south', 'bbox_west', 'bbox_north', 'bbox_east', 'geometry_issues',
+)
+GEOMETRY_FIELDS = ', '.join(GEOMETRY_COLUMNS)
+
+
+def clean_ring(points, issues):
+    '''Открытое кольцо (без повтора первой точки) из валидных точек или None'''
+    ring = []
+    for point in points or []:
+        try:
+            lat, lng = float(point[0]), float(point[1])
+        except (TypeError, ValueError, IndexError):
+            issues.add('invalid_points')
+            continue
+        if not (math.isfinite(lat) and math.isfinite(lng)) or abs(lat) > 90 or abs(lng) > 180:
+            issues.add('invalid_points')
+            continue
+        if ring and ring[-1] == (lat, lng):
+            issues.add('duplicate_points')
+            continue
+        ring.append((lat, lng))
+
+    # Повтор первой точки в конце (замкнутое кольцо GeoJSON) — не ошибка, убираем
+    if len(ring) > 1 and ring[0] == ring[-1]:
+        ring.pop()
+
+    if len(ring) < 3:
+        issues.add('degenerate_ring')
+        return None
+    return ring
+
+
+def planar_area(ring):
+    '''Ориентированная площадь в плоскости (x=lng, y=lat); > 0 — против часовой'''
+    lat0, lng0 = ring[0]
+    total = 0.0
+    n = len(ring)
+    for i in range(n):
+        y1, x1 = ring[i][0] - lat0, ring[i][1] - lng0
+        y2, x2 = ring[(i + 1) % n][0] - lat0, ring[(i + 1) % n][1] - lng0
+        total += x1 * y2 - x2 * y1
+    return total / 2.0
+
+
+def _segment_intersection(p1, p2, p3, p4):
+    '''Точка собственного пересечения отрезков p1p2 и p3p4 или None'''
+    d = (p2[1] - p1[1]) * (p4[0] - p3[0]) - (p2[0] - p1[0]) * (p4[1] - p3[1])
+    if d == 0:
+        return None
+    t = ((p3[1] - p1[1]) * (p4[0] - p3[0]) - (p3[0] - p1[0]) * (p4[1] - p3[1])) / d
+    u = ((p3[1] - p1[1]) * (p2[0] - p1[0]) - (p3[0] - p1[0]) * (p2[1] - p1[1])) / d
+    if 0 < t < 1 and 0 < u < 1:
+        return (p1[0] + t * (p2[0] - p1[0]), p1[1] + t * (p2[1] - p1[1]))
+    return None
+
+
+def find_self_intersection(ring):
+    '''Первая пара пересекающихся несмежных рёбер (i, j, точка) или None
+
+    Рёбра перебираются заметанием по долготе, поэтому для обычных контуров
+    проверяются только рёбра с перекрывающимися проекциями, а не все пары.
+    '''
+    n = len(ring)
+    edges = []
+    for i in range(n):
+        a, b = ring[i], ring[(i + 1) % n]
+        edges.append((min(a[1], b[1]), max(a[1], b[1]), i))
+    edges.sort()
+
+    active = []
+    for lng_min, lng_max, i in edges:
+        active = [e for e in active if e[1] >= lng_min]
+        for _, _, j in active:
+            lo, hi = min(i, j), max(i, j)
+            if hi - lo == 1 or (lo == 0 and hi == n - 1):
+                continue
+            point = _segment_intersection(ring[lo], ring[(lo + 1) % n], ring[hi], ring[(hi + 1) % n])
+            if point is not None:
+                return lo, hi, point
+        active.append((lng_min, lng_max, i))
+    return None
+
+
+def split_self_intersections(ring, issues):
+    '''Разбить самопересекающееся кольцо на простые части'''
+    pending = [ring]
+    simple = []
+    splits = 0
+    while pending:
+        current = pending.pop()
+        hit = find_self_intersection(current) if splits < MAX_SPLITS else None
+        if hit is None:
+            simple.append(current)
+            continue
+        issues.add('self_intersection')
+        splits += 1
+        i, j, point = hit
+        pending.append([point] + current[i + 1:j + 1])
+        pending.append(current[:i + 1] + [point] + current[j + 1:])
+    return [r for r in simple if len(r) >= 3 and abs(planar_area(r)) > MIN_PART_AREA]
+
+
+def repair_rings(rings, issues):
+    '''Проверенные простые кольца против часовой стрелки (открытые)'''
+    parts = []
+    for points in rings:
+        ring = clean_ring(points, issues)
+        if ring is None:
+            continue
+        for part in split_self_intersections(ring, issues):
+            if planar_area(part) < 0:
+                issues.add('clockwise_ring')
+                part = part[::-1]
+            parts.append(part)
+    return parts
+
+
+def ring_metrics(ring):
+    '''Площадь в проекции, центроид и геодезическая площадь одного кольца'''
+    lats = [p[0] for p in ring]
+    lat_ref = math.radians((min(lats) + max(lats)) / 2.0)
+    scale = math.cos(lat_ref)
+    lat0, lng0 = ring[0]
+
+    area = cx = cy = spherical = 0.0
+    n = len(ring)
+    for k in range(n):
+        lat1, lng1 = ring[k]
+        lat2, lng2 = ring[(k + 1) % n]
+        # Локальная равнопромежуточная проекция вокруг первой точки
+        x1, y1 = (lng1 - lng0) * scale, lat1 - lat0
+        x2, y2 = (lng2 - lng0) * scale, lat2 - lat0
+        cross = x1 * y2 - x2 * y1
+        area += cross
+        cx += (x1 + x2) * cross
+        cy += (y1 + y2) * cross
+        spherical += math.radians(lng2 - lng1) * (2 + math.sin(math.radians(lat1)) + math.sin(math.radians(lat2)))
+
+    area /= 2.0
+    if area == 0:
+        return 0.0, lat0, lng0, 0.0
+    centroid_lat = lat0 + cy / (6.0 * area)
+    centroid_lng = lng0 + cx / (6.0 * area) / scale
+    return area, centroid_lat, centroid_lng, abs(spherical) * EARTH_RADIUS ** 2 / 2.0
+
+
+def combine_metrics(metrics, parts):
+    '''Итог по частям: центроид с весом по площади, сумма площадей, bbox'''
+    weight = sum(abs(m[0]) for m in metrics)
+    if weight == 0:
+        return None
+    lats = [p[0] for part in parts for p in part]
+    lngs = [p[1] for part in parts for p in part]
+    return {
+        'centroid_lat': sum(abs(m[0]) * m[1] for m in metrics) / weight,
+        'centroid_lng': sum(abs(m[0]) * m[2] for m in metrics) / weight,
+        'geo_area_m2': sum(m[3] for m in metrics),
+        'bbox_south': min(lats),
+        'bbox_west': min(lngs),
+        'bbox_north': max(lats),
+        'bbox_east': max(lngs),
+    }
+
+
+def is_closed(points):
+    '''Повторяет ли последняя точка кольца первую'''
+    try:
+        return len(points) > 1 and [float(c) for c in points[0][:2]] == [float(c) for c in points[-1][:2]]
+    except (TypeError, ValueError, IndexError, KeyError):
+        return False
+
+
+def stored(ring, close):
+    '''Открытое кольцо в формате хранения; close — замкнуть, как было на входе'''
+    points = [[lat, lng] for lat, lng in ring]
+    return points + [points[0]] if close else points
+
+
+def input_rings(boundary, boundary_parts):
+    '''Кольца из запроса: boundary_parts для мультиполигона, иначе boundary'''
+    if boundary_parts:
+        return list(boundary_parts)
+    return [boundary] if boundary else []
+
+
+def process_boundary(boundary, boundary_parts=None):
+    '''Исправленная граница, части и значения колонок геометрии
+
+    Возвращает (boundary, boundary_parts, columns); при отсутствии валидной
+    геометрии boundary и части None, а в columns остаются только проблемы.
+    '''
+    issues = set()
+    rings = input_rings(boundary, boundary_parts)
+    close = bool(rings) and is_closed(rings[0])
+    parts = repair_rings(rings, issues)
+    columns = dict.fromkeys(GEOMETRY_COLUMNS)
+    if parts:
+        metrics = [ring_metrics(part) for part in parts]
+        combined = combine_metrics(metrics, parts)
+        if combined:
+            columns.update(combined)
+            # Для отображения в boundary — самая большая часть, все части — в boundary_parts
+            order = sorted(range(len(parts)), key=lambda k: -abs(metrics[k][0]))
+            parts = [parts[k] for k in order]
+        else:
+            parts = []
+    columns['geometry_issues'] = sorted(issues)
+    if not parts:
+        return None, None, columns
+    return stored(parts[0], close), ([stored(p, close) for p in parts] if len(parts) > 1 else None), columns
+
+
+def serialize_geometry(row):
+    '''Поле geometry ответа API из колонок landplots'''
+    if row.get('centroid_lat') is None:
+        return None
+    return {
+        'centroid': [row['centroid_lat'], row['centroid_lng']],
+        'area': row['geo_area_m2'],
+        'bbox': [row['bbox_south'], row['bbox_west'], row['bbox_north'], row['bbox_east']],
+        'issues': row.get('geometry_issues') or [],
+    }
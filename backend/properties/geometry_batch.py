@@ -0,0 +1,210 @@
+"""Пакетный пересчёт геометрии участков на NumPy
+
+Кольца участков пачки склеиваются в один массив вершин, суммы по рёбрам
+(площадь, моменты центроида, сферический избыток) считаются через reduceat по
+началам колец, а итог по участку — через bincount по номеру участка. Формулы
+те же, что в geometry.ring_metrics, поэтому результат совпадает с записью по
+одному участку. Проверка и починка колец остаётся поштучной (geometry.repair_rings).
+"""
+import json
+import time
+
+import numpy as np
+from psycopg2.extras import RealDictCursor, execute_values
+
+import geometry
+
+BACKFILL_BATCH_SIZE = 500
+BACKFILL_TIME_BUDGET = 20
+
+
+def batch_metrics(plots):
+    '''Колонки геометрии и площади колец для списка участков
+
+    plots — список участков, каждый — список открытых колец из repair_rings.
+    Возвращает (columns, ring_areas): для участка без валидной площади
+    columns[k] равен None.
+    '''
+    rings = [(k, ring) for k, parts in enumerate(plots) for ring in parts]
+    if not rings:
+        return [None] * len(plots), [[] for _ in plots]
+
+    counts = np.array([len(ring) for _, ring in rings])
+    owner = np.array([k for k, _ in rings])
+    coords = np.array([p for _, ring in rings for p in ring], dtype=float)
+    lat, lng = coords[:, 0], coords[:, 1]
+
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    ring_of = np.repeat(np.arange(len(rings)), counts)
+    nxt = np.arange(len(lat)) + 1
+    nxt[starts + counts - 1] = starts
+
+    ring_lat_min = np.minimum.reduceat(lat, starts)
+    ring_lat_max = np.maximum.reduceat(lat, starts)
+    ring_lng_min = np.minimum.reduceat(lng, starts)
+    ring_lng_max = np.maximum.reduceat(lng, starts)
+    scale = np.cos(np.radians((ring_lat_min + ring_lat_max) / 2.0))
+
+    # Локальная равнопромежуточная проекция вокруг первой точки кольца
+    lat0, lng0 = lat[starts], lng[starts]
+    x = (lng - lng0[ring_of]) * scale[ring_of]
+    y = lat - lat0[ring_of]
+    x2, y2 = x[nxt], y[nxt]
+    cross = x * y2 - x2 * y
+    area = np.add.reduceat(cross, starts) / 2.0
+    cx = np.add.reduceat((x + x2) * cross, starts)
+    cy = np.add.reduceat((y + y2) * cross, starts)
+
+    sin_lat = np.sin(np.radians(lat))
+    spherical = np.add.reduceat(np.radians(lng[nxt] - lng) * (2 + sin_lat + sin_lat[nxt]), starts)
+    geo_area = np.abs(spherical) * geometry.EARTH_RADIUS ** 2 / 2.0
+
+    degenerate = area == 0
+    safe_area = np.where(degenerate, 1.0, area)
+    centroid_lat = np.where(degenerate, lat0, lat0 + cy / (6.0 * safe_area))
+    centroid_lng = np.where(degenerate, lng0, lng0 + cx / (6.0 * safe_area) / scale)
+    geo_area = np.where(degenerate, 0.0, geo_area)
+
+    n = len(plots)
+    weight = np.abs(area)
+    total = np.bincount(owner, weights=weight, minlength=n)
+    plot_lat = np.bincount(owner, weights=weight * centroid_lat, minlength=n)
+    plot_lng = np.bincount(owner, weights=weight * centroid_lng, minlength=n)
+    plot_area = np.bincount(owner, weights=geo_area, minlength=n)
+
+    south = np.full(n, np.inf)
+    west = np.full(n, np.inf)
+    north = np.full(n, -np.inf)
+    east = np.full(n, -np.inf)
+    np.minimum.at(south, owner, ring_lat_min)
+    np.minimum.at(west, owner, ring_lng_min)
+    np.maximum.at(north, owner, ring_lat_max)
+    np.maximum.at(east, owner, ring_lng_max)
+
+    columns = []
+    for k in range(n):
+        if total[k] == 0:
+            columns.append(None)
+            continue
+        columns.append({
+            'centroid_lat': float(plot_lat[k] / total[k]),
+            'centroid_lng': float(plot_lng[k] / total[k]),
+            'geo_area_m2': float(plot_area[k]),
+            'bbox_south': float(south[k]),
+            'bbox_west': float(west[k]),
+            'bbox_north': float(north[k]),
+            'bbox_east': float(east[k]),
+        })
+
+    ring_areas = [[] for _ in plots]
+    for (k, _), value in zip(rings, area.tolist()):
+        ring_areas[k].append(value)
+    return columns, ring_areas
+
+
+def prepare_rows(rows):
+    '''Строки для UPDATE: исправленные границы и колонки геометрии'''
+    issues = [set() for _ in rows]
+    rings = [geometry.input_rings(row['boundary'], row['boundary_parts']) for row in rows]
+    plots = [geometry.repair_rings(r, issues[k]) for k, r in enumerate(rings)]
+    columns, ring_areas = batch_metrics(plots)
+
+    prepared = []
+    for k, row in enumerate(rows):
+        values = dict.fromkeys(geometry.GEOMETRY_COLUMNS)
+        boundary = parts = None
+        if columns[k] is not None:
+            values.update(columns[k])
+            # Тот же порядок частей, что в geometry.process_boundary
+            order = sorted(range(len(plots[k])), key=lambda i: -abs(ring_areas[k][i]))
+            ordered = [plots[k][i] for i in order]
+            close = bool(rings[k]) and geometry.is_closed(rings[k][0])
+            boundary = geometry.stored(ordered[0], close)
+            if len(ordered) > 1:
+                parts = [geometry.stored(p, close) for p in ordered]
+        values['geometry_issues'] = sorted(issues[k])
+        prepared.append((
+            row['id'],
+            json.dumps(boundary) if boundary else None,
+            json.dumps(parts) if parts else None,
+            *(values[c] for c in geometry.GEOMETRY_COLUMNS),
+        ))
+    return prepared
+
+
+def _row_changed(row, values):
+    '''Изменил ли пересчёт участок: контур или колонки геометрии (values — строка из prepare_rows)'''
+    boundary, parts = values[1], values[2]
+    if boundary is not None and (
+        json.loads(boundary) != row['boundary'] or (json.loads(parts) if parts else None) != row['boundary_parts']
+    ):
+        return True
+    return any(row[c] != v for c, v in zip(geometry.GEOMETRY_COLUMNS, values[3:]))
+
+
+def backfill(conn, after_id=0, batch_size=BACKFILL_BATCH_SIZE, time_budget=BACKFILL_TIME_BUDGET):
+    '''Пересчитать геометрию участков с id > after_id пачками по id
+
+    Неисправимые контуры не затираются: остаются как есть с пустыми колонками
+    и списком проблем. Триггеры ленты изменений и истории на время пересчёта
+    отключены флагом сессии; в ленту одним INSERT на пачку попадают участки,
+    у которых изменились контур или колонки геометрии. Останавливается по исчерпании таблицы или бюджета
+    времени; возвращает (число обработанных строк, id для следующего вызова
+    или None в конце).
+    '''
+    deadline = time.monotonic() + time_budget
+    processed = 0
+    while True:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(f'''
+                SELECT id, boundary, boundary_parts, {geometry.GEOMETRY_FIELDS} FROM landplots
+                WHERE id > %s ORDER BY id LIMIT %s
+            ''', (after_id, batch_size))
+            rows = cur.fetchall()
+        if not rows:
+            conn.commit()
+            return processed, None
+
+        prepared = prepare_rows(rows)
+        with conn.cursor() as cur:
+            # Триггеры ленты и истории на каждую строку пропускаются (V0052)
+            cur.execute("SELECT set_config('landgis.backfill', 'on', true)")
+            execute_values(cur, '''
+                UPDATE landplots AS l SET
+                    boundary = COALESCE(v.boundary::jsonb, l.boundary),
+                    boundary_parts = CASE WHEN v.boundary IS NULL THEN l.boundary_parts
+                                          ELSE v.boundary_parts::jsonb END,
+                    centroid_lat = v.centroid_lat::float8,
+                    centroid_lng = v.centroid_lng::float8,
+                    geo_area_m2 = v.geo_area_m2::float8,
+                    bbox_south = v.bbox_south::float8,
+                    bbox_west = v.bbox_west::float8,
+                    bbox_north = v.bbox_north::float8,
+                    bbox_east = v.bbox_east::float8,
+                    geometry_issues = v.geometry_issues::text[]
+                FROM (VALUES %s) AS v(id, boundary, boundary_parts, centroid_lat, centroid_lng, geo_area_m2,
+                                      bbox_south, bbox_west, bbox_north, bbox_east, geometry_issues)
+                WHERE l.id = v.id
+            ''', prepared, page_size=batch_size)
+            changed = [values[0] for row, values in zip(rows, prepared) if _row_changed(row, values)]
+            if changed:
+                # Запись ленты на каждый изменённый участок: по ней клиенты перечитывают
+                # участки, а кэши R-дерева, nearest, stats и density видят новую версию данных
+                cur.execute('''
+                    WITH fed AS (
+                        INSERT INTO change_feed (table_name, row_id, op)
+                        SELECT 'landplots', unnest(%s::int[]), 'U'
+                        RETURNING id
+                    )
+                    SELECT pg_notify('landgis_changes', json_build_object(
+                        's', MAX(id), 't', 'landplots', 'o', 'U'
+                    )::text) FROM fed
+                ''', (changed,))
+        conn.commit()
+
+        processed += len(rows)
+        after_id = rows[-1]['id']
+        if len(rows) < batch_size:
+            return processed, None
+        if time.monotonic() >= deadline:
+            return processed, after_id
@@ -0,0 +1,156 @@
+"""История изменений участков и откат к прежней версии
+
+Записи создают триггеры V0047: каждое изменение — JSON Patch, где перед
+replace/remove идёт test со старым значением. Поэтому, чтобы получить
+состояние до изменения, достаточно пройти операции: test возвращает старое
+значение, add без test означает, что поля не было. Откат к версии применяет
+это ко всем изменениям начиная с неё, от последнего к первому, и пишет
+результат обычным UPDATE/INSERT/DELETE — сам откат тоже попадает в историю.
+"""
+import datetime
+import json
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+import geometry
+
+HISTORY_PAGE_SIZE = 100
+PARTITIONS_AHEAD = 2
+REVERTABLE_COLUMNS = (
+    'title', 'type', 'price', 'area', 'location', 'latitude', 'longitude',
+    'segment', 'status', 'boundary', 'boundary_parts',
+)
+
+_partitions_checked = None
+
+
+def set_actor(conn, caller):
+    '''Автор изменений текущей транзакции — его запишет триггер истории
+
+    Пишется вошедший аккаунт, а не компания, от имени которой он работает.
+    '''
+    if caller:
+        with conn.cursor() as cur:
+            cur.execute("SELECT set_config('landgis.company_id', %s, true)", (str(caller['account']),))
+
+
+def ensure_partitions(conn):
+    '''Создать недостающие партиции истории на PARTITIONS_AHEAD месяцев вперёд
+
+    Проверка — раз в месяц на инстанс, одним дешёвым запросом: есть ли
+    партиция следующего месяца и пуста ли DEFAULT. Функция V0051 переносит
+    застрявшие в DEFAULT строки в новые партиции. Ошибка обслуживания только
+    пишется в лог: запись пользователя от неё не зависит.
+    '''
+    global _partitions_checked
+    month = datetime.date.today().replace(day=1)
+    if _partitions_checked == month:
+        return
+    try:
+        with conn.cursor() as cur:
+            cur.execute('''
+                SELECT to_regclass('landplot_history_' || to_char(CURRENT_DATE + interval '1 month', 'YYYY_MM')) IS NULL
+                    OR EXISTS (SELECT 1 FROM landplot_history_default)
+            ''')
+            if cur.fetchone()[0]:
+                cur.execute('SELECT ensure_landplot_history_partitions(%s)', (PARTITIONS_AHEAD,))
+        conn.commit()
+        _partitions_checked = month
+    except psycopg2.Error as e:
+        conn.rollback()
+        print(f'⚠️ landplot_history partitions: {e}')
+
+
+def list_versions(conn, plot_id, before=None, limit=HISTORY_PAGE_SIZE):
+    '''Изменения участка от новых к старым; before — id записи для следующей страницы'''
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute('''
+            SELECT h.id AS version, h.op, h.patch, h.changed_at,
+                   h.changed_by, c.name AS changed_by_name
+            FROM landplot_history h
+            LEFT JOIN companies c ON c.id = h.changed_by
+            WHERE h.plot_id = %s AND (%s::bigint IS NULL OR h.id < %s)
+            ORDER BY h.id DESC
+            LIMIT %s
+        ''', (plot_id, before, before, limit))
+        rows = cur.fetchall()
+    conn.commit()
+    return rows
+
+
+def _path(pointer):
+    '''Путь JSON Pointer: ("title",) или ("attributes", ключ)'''
+    return tuple(p.replace('~1', '/').replace('~0', '~') for p in pointer.split('/')[1:])
+
+
+def undo(state, entry):
+    '''Состояние участка до изменения entry по состоянию после него'''
+    if entry['op'] == 'I':
+        return None
+    if state is None:
+        state = {}
+    state = dict(state, attributes=dict(state.get('attributes') or {}))
+
+    for op in entry['patch']:
+        path = _path(op['path'])
+        target = state['attributes'] if path[0] == 'attributes' else state
+        key = path[-1]
+        if op['op'] == 'test':
+            target[key] = op['value']
+        elif op['op'] == 'add':
+            target.pop(key, None)
+    return state
+
+
+def revert(conn, plot_id, version):
+    '''Вернуть участок к состоянию до изменения version
+
+    Возвращает (найдена ли версия, участок существует после отката).
+    '''
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute('SELECT to_jsonb(l) AS row FROM landplots l WHERE id = %s', (plot_id,))
+        current = cur.fetchone()
+        current = current['row'] if current else None
+        cur.execute('''
+            SELECT id, op, patch FROM landplot_history
+            WHERE plot_id = %s AND id >= %s
+            ORDER BY id DESC
+        ''', (plot_id, version))
+        entries = cur.fetchall()
+
+    if not entries or entries[-1]['id'] != version:
+        conn.commit()
+        return False, current is not None
+
+    state = current
+    for entry in entries:
+        state = undo(state, entry)
+
+    with conn.cursor() as cur:
+        if state is None:
+            cur.execute('DELETE FROM landplots WHERE id = %s', (plot_id,))
+            conn.commit()
+            return True, False
+
+        boundary, parts, geo = geometry.process_boundary(state.get('boundary'), state.get('boundary_parts'))
+        values = {column: state.get(column) for column in REVERTABLE_COLUMNS}
+        values.update(boundary=boundary, boundary_parts=parts, **geo)
+        for column in ('boundary', 'boundary_parts'):
+            values[column] = json.dumps(values[column]) if values[column] else None
+        values['attributes'] = json.dumps(state['attributes'])
+        columns = list(values)
+
+        if current is None:
+            cur.execute(f'''
+                INSERT INTO landplots (id, {', '.join(columns)})
+                VALUES (%s, {', '.join(['%s'] * len(columns))})
+            ''', [plot_id] + [values[c] for c in columns])
+        else:
+            cur.execute(f'''
+                UPDATE landplots
+                SET {', '.join(f'{c} = %s' for c in columns)}, updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s
+            ''', [values[c] for c in columns] + [plot_id])
+    conn.commit()
+    return True, True
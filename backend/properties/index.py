@@ -1,7 +1,51 @@
+import base64
+import hashlib
 import json
 import os
-import psycopg2
+import random
+import time
+from urllib.parse import quote
 from psycopg2.extras import RealDictCursor
+import config_cache
+import change_feed
+import density
+import duplicates
+import filter_sql
+import geometry
+import history
+import search
+import session_tokens
+import nearest
+import pdf_report
+import queries
+import sorting
+import spatial_index
+import stats
+import table_export
+import visibility
+
+CHANGES_MAX_TIMEOUT = 25
+CHANGES_BATCH_LIMIT = 500
+DEFAULT_SORT = '-created_at'
+LIST_MAX_LIMIT = 1000
+NEAREST_DEFAULT_K = 10
+NEAREST_MAX_K = 100
+DUPLICATE_STATUSES = ('open', 'dismissed', 'resolved')
+
+PROPERTY_BY_ID = queries.statement('property_by_id', f'''
+    SELECT id, title, type, price, area, location, latitude, longitude,
+           segment, status, boundary, boundary_parts, attributes, {geometry.GEOMETRY_FIELDS},
+           created_at, updated_at
+    FROM {{schema}}.landplots WHERE id = $1
+''')
+ATTRIBUTE_CONFIGS = queries.statement('attribute_configs', '''
+    SELECT id, attribute_key as "attributeKey", display_name as "displayName",
+           display_order as "displayOrder", visible_in_table as "visibleInTable",
+           visible_roles as "visibleRoles", created_at as "createdAt",
+           updated_at as "updatedAt"
+    FROM {schema}.attribute_config
+    ORDER BY display_order, id
+''')
 
 def handler(event: dict, context) -> dict:
     '''API для управления объектами недвижимости'''
@@ -13,42 +57,94 @@ def handler(event: dict, context) -> dict:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Authorization, X-DB-Version',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
             'isBase64Encoded': False
         }
     
+    response = dispatch(event, method)
+    if method != 'GET':
+        # Метка записи: следующие GET этого клиента пойдут на основную БД
+        config_cache.mark_write(response)
+    return response
+
+def dispatch(event, method):
+    '''Обработка запроса: GET читают с реплики, если она настроена (кроме ленты изменений)'''
     try:
         dsn = os.environ.get('DATABASE_URL')
         if not dsn:
             return error_response('DATABASE_URL not configured', 500)
         
-        conn = psycopg2.connect(dsn)
+        query_params = event.get('queryStringParameters') or {}
+        if method == 'GET' and query_params.get('action') != 'changes':
+            lazy_conn = config_cache.reader(event, dsn)
+        else:
+            lazy_conn = config_cache.LazyConnection(dsn)
+        change_feed.drain(dsn=dsn)
         
         # Check if this is a config request
         path = event.get('path', '')
         if '/config' in path or event.get('queryStringParameters', {}).get('type') == 'config':
             if method == 'GET':
-                return get_attribute_configs(conn)
+                configs = config_cache.get_or_load(
+                    ('attribute_config',), ['attribute_config'], lazy_conn, get_attribute_configs
+                )
+                return success_response(configs)
             elif method == 'PUT':
                 body = json.loads(event.get('body', '{}'))
-                return update_attribute_config(conn, body)
+                result = update_attribute_config(lazy_conn.get(), body)
+                config_cache.invalidate('attribute_config')
+                return result
             else:
                 return error_response('Method not allowed', 405)
         
+        caller = session_tokens.resolve_caller(lazy_conn, event)
+        projection = visibility.get_projection(lazy_conn, caller)
+        if query_params.get('q'):
+            # Условие q из filter_sql.build_where сравнивает через <% с порогом соединения
+            search.use_fuzzy_threshold(lazy_conn.get())
+        
+        if method == 'GET' and query_params.get('action') == 'changes':
+            return get_changes(lazy_conn, dsn, query_params, projection)
+        if method == 'GET' and query_params.get('action') == 'stats':
+            return get_stats(lazy_conn, query_params, caller, projection)
+        if method == 'GET' and query_params.get('action') == 'density':
+            return get_density(lazy_conn, query_params, caller, projection)
+        if method == 'GET' and query_params.get('action') == 'export':
+            return get_export(lazy_conn, query_params, projection)
+        if method == 'GET' and query_params.get('action') == 'report':
+            return get_report(lazy_conn, query_params, projection)
+        if method == 'GET' and query_params.get('action') == 'search':
+            return get_search(lazy_conn, query_params, projection)
+        if method == 'GET' and query_params.get('action') == 'nearest':
+            return get_nearest(lazy_conn, query_params, projection)
+        if method == 'GET' and query_params.get('action') in ('contains', 'within'):
+            return get_spatial(lazy_conn, query_params, projection)
+        if method == 'POST' and query_params.get('action') == 'backfill-geometry':
+            return backfill_geometry(lazy_conn, query_params, caller)
+        if query_params.get('action') in ('duplicates', 'detect-duplicates'):
+            return handle_duplicates(lazy_conn, method, event, query_params, caller)
+        if query_params.get('action') in ('history', 'revert'):
+            return handle_history(lazy_conn, method, query_params, caller, projection)
+        
+        conn = lazy_conn.get()
+        if method in ('POST', 'PUT', 'DELETE'):
+            history.ensure_partitions(conn)
+            history.set_actor(conn, caller)
+        
         if method == 'GET':
-            return get_properties(conn)
+            return get_properties(lazy_conn, query_params, projection)
         elif method == 'POST':
             body = json.loads(event.get('body', '{}'))
-            return create_property(conn, body)
+            return create_property(conn, body, projection)
         elif method == 'PUT':
             property_id = event.get('queryStringParameters', {}).get('id')
             if not property_id:
                 return error_response('Property ID required', 400)
             body = json.loads(event.get('body', '{}'))
-            return update_property(conn, int(property_id), body)
+            return update_property(conn, int(property_id), body, projection)
         elif method == 'DELETE':
             property_id = event.get('queryStringParameters', {}).get('id')
             if not property_id:
@@ -60,111 +156,145 @@ def handler(event: dict, context) -> dict:
     except Exception as e:
         return error_response(f'Server error: {str(e)}', 500)
     finally:
-        if 'conn' in locals():
-            conn.close()
+        if 'lazy_conn' in locals():
+            lazy_conn.close()
 
-def get_properties(conn):
-    '''Получить все объекты недвижимости'''
-    with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute('''
+def get_properties(lazy_conn, params, projection, spatial_ids=None):
+    '''Получить объекты недвижимости
+
+    Без параметров возвращает весь список. sort задаёт типизированную сортировку,
+    limit и cursor — постраничную выдачу по ключу {items, next_cursor}, ids —
+    выборку по списку id, mode=light — индекс без boundary и attributes с хэшем
+    содержимого каждой строки. spatial_ids — результат пространственного запроса.
+    '''
+    format_types = config_cache.get_or_load(
+        ('format_types',), ['attribute_config', 'display_configs'], lazy_conn, sorting.load_format_types
+    )
+    settings = config_cache.get_or_load(
+        ('filter_settings',), ['filter_config'], lazy_conn, filter_sql.load_filter_settings
+    )
+    raw_sort = params.get('sort') or DEFAULT_SORT
+    try:
+        keys = sorting.parse_sort(raw_sort, format_types)
+        limit = max(1, min(int(params['limit']), LIST_MAX_LIMIT)) if params.get('limit') else None
+        after = sorting.decode_cursor(params['cursor'], raw_sort, keys) if params.get('cursor') else None
+        ids = [int(i) for i in params['ids'].split(',') if i.strip()] if params.get('ids') else None
+    except ValueError:
+        return error_response('Invalid sort, limit, cursor or ids', 400)
+    if ids is not None and len(ids) > LIST_MAX_LIMIT:
+        return error_response(f'No more than {LIST_MAX_LIMIT} ids per request', 400)
+    light = params.get('mode') == 'light'
+
+    where, args = filter_sql.build_where(params, projection, settings)
+    if ids is not None:
+        where, args = f'{where} AND id = ANY(%s)', args + [ids]
+    if spatial_ids is not None:
+        where, args = f'{where} AND id = ANY(%s)', args + [spatial_ids]
+    sort_select, sort_args = sorting.select_values(keys)
+    if after is not None:
+        after_sql, after_args = sorting.after_clause(keys, *after)
+        where, args = f'{where} AND {after_sql}', args + after_args
+    order_sql, order_args = sorting.order_by(keys)
+    limit_sql = f'LIMIT {limit + 1}' if limit else ''
+    detail_columns = '' if light else 'boundary, boundary_parts, attributes,'
+
+    with lazy_conn.get().cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(f'''
             SELECT 
                 id, title, type, price, area, location,
-                latitude, longitude, segment, status, boundary, attributes,
-                created_at, updated_at
+                latitude, longitude, segment, status, {detail_columns}
+                {geometry.GEOMETRY_FIELDS}, created_at, updated_at,
+                md5(concat_ws('|', title, type, price, area, location, latitude, longitude,
+                              segment, status, boundary::text, boundary_parts::text, attributes::text,
+                              {geometry.GEOMETRY_FIELDS})) AS content_md5{sort_select}
             FROM landplots
-            ORDER BY created_at DESC
-        ''')
+            WHERE {where}
+            ORDER BY {order_sql}
+            {limit_sql}
+        ''', sort_args + args + order_args)
         properties = cur.fetchall()
-        
-        result = []
-        for prop in properties:
-            # Очистка attributes от двойных JSON строк
-            attrs = prop['attributes'] if prop['attributes'] else {}
-            if isinstance(attrs, dict):
-                cleaned_attrs = {}
-                for k, v in attrs.items():
-                    # Если значение это строка с двойными кавычками, заменить на пустую строку
-                    if isinstance(v, str) and v in ('""', '"\\"\\""', '\\"\\""'):
-                        cleaned_attrs[k] = ''
-                    else:
-                        cleaned_attrs[k] = v
-                attrs = cleaned_attrs
-            
-            result.append({
-                'id': prop['id'],
-                'title': prop['title'],
-                'type': prop['type'],
-                'price': float(prop['price']),
-                'area': float(prop['area']),
-                'location': prop['location'],
-                'coordinates': [float(prop['latitude']), float(prop['longitude'])],
-                'segment': prop['segment'],
-                'status': prop['status'],
-                'boundary': prop['boundary'] if prop['boundary'] else None,
-                'attributes': attrs,
-                'created_at': prop['created_at'].isoformat() if prop['created_at'] else None,
-                'updated_at': prop['updated_at'].isoformat() if prop['updated_at'] else None
-            })
-        
-        return success_response(result)
 
-def create_property(conn, data):
+    # Хэш зависит и от настроек видимости: после их смены клиент перезапросит строки
+    tag = str(config_cache.table_versions(lazy_conn, visibility.PROJECTION_TABLES))
+
+    next_cursor = None
+    if limit and len(properties) > limit:
+        properties = properties[:limit]
+        next_cursor = sorting.encode_cursor(raw_sort, properties[-1], keys)
+
+    result = []
+    for prop in properties:
+        content_hash = hashlib.md5(f"{prop['content_md5']}:{tag}".encode('utf-8')).hexdigest()
+        if light:
+            # Принудительные фильтры проекции уже применены в WHERE
+            result.append(dict(serialize_light(prop), hash=content_hash))
+            continue
+        projected = projection.apply(serialize_property(prop))
+        if projected is not None:
+            result.append(dict(projected, hash=content_hash))
+
+    if limit:
+        return success_response({'items': result, 'next_cursor': next_cursor})
+    return success_response(result)
+
+def create_property(conn, data, projection):
     '''Создать новый объект недвижимости'''
-    required_fields = ['title', 'type', 'price', 'area', 'location', 'coordinates', 'segment', 'status']
+    required_fields = ['title', 'type', 'price', 'area', 'location', 'segment', 'status']
     for field in required_fields:
         if field not in data:
             return error_response(f'Missing required field: {field}', 400)
     
+    boundary, parts, geo = geometry.process_boundary(data.get('boundary'), data.get('boundary_parts'))
+    if boundary is None and (data.get('boundary') or data.get('boundary_parts')):
+        return error_response(f"Invalid boundary: {', '.join(geo['geometry_issues'])}", 400)
+    # Без явной точки маркер ставится в центроид границы
+    coordinates = data.get('coordinates') or (
+        [geo['centroid_lat'], geo['centroid_lng']] if boundary else None
+    )
+    if not coordinates:
+        return error_response('Missing required field: coordinates', 400)
+    
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        boundary_json = json.dumps(data.get('boundary')) if data.get('boundary') else None
+        boundary_json = json.dumps(boundary) if boundary else None
         attributes_json = json.dumps(data.get('attributes', {}))
         
         print(f"Creating property: {data.get('title')}")
         print(f"Attributes count: {len(data.get('attributes', {}))}")
         print(f"Attributes: {attributes_json[:200]}...")
         
-        cur.execute('''
+        cur.execute(f'''
             INSERT INTO landplots 
-            (title, type, price, area, location, latitude, longitude, segment, status, boundary, attributes)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s::jsonb, %s::jsonb)
+            (title, type, price, area, location, latitude, longitude, segment, status, boundary, attributes,
+             boundary_parts, {geometry.GEOMETRY_FIELDS})
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s::jsonb, %s::jsonb,
+                    %s::jsonb, %s, %s, %s, %s, %s, %s, %s, %s)
             RETURNING id, title, type, price, area, location, latitude, longitude, 
-                      segment, status, boundary, attributes, created_at, updated_at
+                      segment, status, boundary, boundary_parts, attributes, {geometry.GEOMETRY_FIELDS},
+                      created_at, updated_at
         ''', (
             data['title'],
             data['type'],
             data['price'],
             data['area'],
             data['location'],
-            data['coordinates'][0],
-            data['coordinates'][1],
+            coordinates[0],
+            coordinates[1],
             data['segment'],
             data['status'],
             boundary_json,
-            attributes_json
+            attributes_json,
+            json.dumps(parts) if parts else None,
+            *(geo[c] for c in geometry.GEOMETRY_COLUMNS)
         ))
         
         conn.commit()
         prop = cur.fetchone()
         
-        result = {
-            'id': prop['id'],
-            'title': prop['title'],
-            'type': prop['type'],
-            'price': float(prop['price']),
-            'area': float(prop['area']),
-            'location': prop['location'],
-            'coordinates': [float(prop['latitude']), float(prop['longitude'])],
-            'segment': prop['segment'],
-            'status': prop['status'],
-            'boundary': prop['boundary'] if prop['boundary'] else None,
-            'attributes': prop['attributes'] if prop['attributes'] else {},
-            'created_at': prop['created_at'].isoformat() if prop['created_at'] else None,
-            'updated_at': prop['updated_at'].isoformat() if prop['updated_at'] else None
-        }
+        result = projection.strip(serialize_property(prop))
         
         return success_response(result, 201)
 
-def update_property(conn, property_id, data):
+def update_property(conn, property_id, data, projection):
     '''Обновить объект недвижимости'''
     updates = []
     params = []
@@ -190,9 +320,18 @@ def update_property(conn, property_id, data):
     if 'status' in data:
         updates.append('status = %s')
         params.append(data['status'])
-    if 'boundary' in data:
+    if 'boundary' in data or 'boundary_parts' in data:
+        # Граница без частей заменяет и мультиполигон: контур отредактирован целиком
+        boundary, parts, geo = geometry.process_boundary(data.get('boundary'), data.get('boundary_parts'))
+        if boundary is None and (data.get('boundary') or data.get('boundary_parts')):
+            return error_response(f"Invalid boundary: {', '.join(geo['geometry_issues'])}", 400)
         updates.append('boundary = %s::jsonb')
-        params.append(json.dumps(data['boundary']) if data['boundary'] else None)
+        params.append(json.dumps(boundary) if boundary else None)
+        updates.append('boundary_parts = %s::jsonb')
+        params.append(json.dumps(parts) if parts else None)
+        for column in geometry.GEOMETRY_COLUMNS:
+            updates.append(f'{column} = %s')
+            params.append(geo[column])
     if 'coordinates' in data:
         coords = data['coordinates']
         if coords and len(coords) == 2:
@@ -230,38 +369,10 @@ def update_property(conn, property_id, data):
         
         conn.commit()
         
-        cur.execute('''
-            SELECT id, title, type, price, area, location, latitude, longitude,
-                   segment, status, boundary, attributes, created_at, updated_at
-            FROM landplots WHERE id = %s
-        ''', (property_id,))
+        queries.execute(cur, PROPERTY_BY_ID, (property_id,))
         prop = cur.fetchone()
         
-        attrs = prop['attributes'] if prop['attributes'] else {}
-        if isinstance(attrs, dict):
-            cleaned_attrs = {}
-            for k, v in attrs.items():
-                if isinstance(v, str) and v in ('""', '"\\"\\""', '\\"\\""'):
-                    cleaned_attrs[k] = ''
-                else:
-                    cleaned_attrs[k] = v
-            attrs = cleaned_attrs
-        
-        result = {
-            'id': prop['id'],
-            'title': prop['title'],
-            'type': prop['type'],
-            'price': float(prop['price']),
-            'area': float(prop['area']),
-            'location': prop['location'],
-            'coordinates': [float(prop['latitude']), float(prop['longitude'])],
-            'segment': prop['segment'],
-            'status': prop['status'],
-            'boundary': prop['boundary'] if prop['boundary'] else None,
-            'attributes': attrs,
-            'created_at': prop['created_at'].isoformat() if prop['created_at'] else None,
-            'updated_at': prop['updated_at'].isoformat() if prop['updated_at'] else None
-        }
+        result = projection.strip(serialize_property(prop))
         
         return success_response(result)
 
@@ -276,6 +387,548 @@ def delete_property(conn, property_id):
         
         return success_response({'message': 'Property deleted successfully'})
 
+def serialize_property(prop):
+    '''Преобразовать строку landplots в формат ответа API'''
+    # Очистка attributes от двойных JSON строк
+    attrs = prop['attributes'] if prop['attributes'] else {}
+    if isinstance(attrs, dict):
+        cleaned_attrs = {}
+        for k, v in attrs.items():
+            # Если значение это строка с двойными кавычками, заменить на пустую строку
+            if isinstance(v, str) and v in ('""', '"\\"\\""', '\\"\\""'):
+                cleaned_attrs[k] = ''
+            else:
+                cleaned_attrs[k] = v
+        attrs = cleaned_attrs
+    
+    return {
+        'id': prop['id'],
+        'title': prop['title'],
+        'type': prop['type'],
+        'price': float(prop['price']),
+        'area': float(prop['area']),
+        'location': prop['location'],
+        'coordinates': [float(prop['latitude']), float(prop['longitude'])],
+        'segment': prop['segment'],
+        'status': prop['status'],
+        'boundary': prop['boundary'] if prop['boundary'] else None,
+        'boundary_parts': prop.get('boundary_parts'),
+        'geometry': geometry.serialize_geometry(prop),
+        'attributes': attrs,
+        'created_at': prop['created_at'].isoformat() if prop['created_at'] else None,
+        'updated_at': prop['updated_at'].isoformat() if prop['updated_at'] else None
+    }
+
+def serialize_light(prop):
+    '''Строка landplots для индекса: без boundary и attributes'''
+    return {
+        'id': prop['id'],
+        'title': prop['title'],
+        'type': prop['type'],
+        'price': float(prop['price']),
+        'area': float(prop['area']),
+        'location': prop['location'],
+        'coordinates': [float(prop['latitude']), float(prop['longitude'])],
+        'segment': prop['segment'],
+        'status': prop['status'],
+        'geometry': geometry.serialize_geometry(prop),
+        'created_at': prop['created_at'].isoformat() if prop['created_at'] else None,
+        'updated_at': prop['updated_at'].isoformat() if prop['updated_at'] else None
+    }
+
+def get_changes(lazy_conn, dsn, params, projection):
+    '''Long-poll ленты изменений: дельты участков после курсора since
+
+    Курсор — "xact.id": позиция в порядке (транзакция, id). Выдаются только
+    записи транзакций младше xmin текущего снимка, т.е. уже завершённых, —
+    запись, зафиксированная позже соседней с большим id, не теряется.
+    '''
+    conn = lazy_conn.get()
+    
+    if 'since' not in params:
+        # Первый вызов клиента: отдаём текущую позицию ленты без ожидания
+        cursor = (snapshot_horizon(conn), 0)
+        conn.commit()
+        return success_response({'cursor': encode_changes_cursor(cursor), 'reset': False, 'changes': []})
+    
+    try:
+        timeout = min(float(params.get('timeout', 20)), CHANGES_MAX_TIMEOUT)
+    except (TypeError, ValueError):
+        return error_response('timeout must be a number', 400)
+    try:
+        since = decode_changes_cursor(params['since'])
+    except ValueError:
+        # Курсор прежнего формата (id) — клиенту нужна полная перезагрузка
+        return success_response({'cursor': params['since'], 'reset': True, 'changes': []})
+    
+    with conn.cursor() as cur:
+        cur.execute('SELECT purged_through FROM change_feed_purge')
+        purged = cur.fetchone()
+    if purged and since[0] <= purged[0]:
+        # Очистка могла удалить записи после курсора — клиенту нужна полная перезагрузка
+        conn.commit()
+        return success_response({'cursor': params['since'], 'reset': True, 'changes': []})
+    
+    deadline = time.monotonic() + timeout
+    
+    while True:
+        horizon = snapshot_horizon(conn)
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute('''
+                SELECT id, row_id, op, xact FROM change_feed
+                WHERE (xact, id) > (%s, %s) AND xact < %s AND table_name = 'landplots'
+                ORDER BY xact, id
+                LIMIT %s
+            ''', (since[0], since[1], horizon, CHANGES_BATCH_LIMIT))
+            entries = cur.fetchall()
+        conn.commit()
+        
+        if len(entries) == CHANGES_BATCH_LIMIT:
+            cursor = (entries[-1]['xact'], entries[-1]['id'])
+        else:
+            # Все записи завершённых до horizon транзакций выданы
+            cursor = max(since, (horizon, 0))
+        remaining = deadline - time.monotonic()
+        if entries or remaining <= 0:
+            break
+        since = cursor
+        # Ждём NOTIFY от триггера вместо частого опроса таблицы
+        if change_feed.drain(timeout=remaining, dsn=dsn) == 0:
+            time.sleep(min(1.0, max(0.0, deadline - time.monotonic())))
+    
+    if random.random() < 0.01:
+        with conn.cursor() as cur:
+            cur.execute('''
+                WITH purged AS (
+                    DELETE FROM change_feed
+                    WHERE changed_at < CURRENT_TIMESTAMP - INTERVAL '1 day'
+                    RETURNING xact
+                )
+                INSERT INTO change_feed_purge (purged_through)
+                SELECT MAX(xact) FROM purged HAVING COUNT(*) > 0
+                ON CONFLICT (id) DO UPDATE
+                SET purged_through = GREATEST(change_feed_purge.purged_through, EXCLUDED.purged_through)
+            ''')
+        conn.commit()
+    
+    if not entries:
+        return success_response({'cursor': encode_changes_cursor(cursor), 'reset': False, 'changes': []})
+    
+    # Несколько изменений одного участка схлопываем до последнего
+    latest = {}
+    for entry in entries:
+        latest[entry['row_id']] = entry
+    
+    live_ids = [row_id for row_id, entry in latest.items() if entry['op'] != 'D']
+    rows = {}
+    if live_ids:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(f'''
+                SELECT id, title, type, price, area, location,
+                       latitude, longitude, segment, status, boundary, boundary_parts, attributes,
+                       {geometry.GEOMETRY_FIELDS}, created_at, updated_at
+                FROM landplots
+                WHERE id = ANY(%s)
+            ''', (live_ids,))
+            for row in cur.fetchall():
+                projected = projection.apply(serialize_property(row))
+                if projected is not None:
+                    rows[row['id']] = projected
+    
+    changes = []
+    for row_id, entry in sorted(latest.items(), key=lambda item: (item[1]['xact'], item[1]['id'])):
+        prop = rows.get(row_id)
+        changes.append({
+            'seq': entry['id'],
+            'op': 'delete' if prop is None else ('insert' if entry['op'] == 'I' else 'update'),
+            'id': row_id,
+            'property': prop
+        })
+    
+    return success_response({'cursor': encode_changes_cursor(cursor), 'reset': False, 'changes': changes})
+
+def snapshot_horizon(conn):
+    '''xmin текущего снимка: транзакции с меньшим номером уже завершены'''
+    with conn.cursor() as cur:
+        cur.execute('SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint')
+        return cur.fetchone()[0]
+
+def encode_changes_cursor(cursor):
+    return f'{cursor[0]}.{cursor[1]}'
+
+def decode_changes_cursor(text):
+    '''(xact, id) из курсора "xact.id"; ValueError для другого формата'''
+    xact, _, row_id = str(text).partition('.')
+    return int(xact), int(row_id)
+
+def get_spatial(lazy_conn, params, projection):
+    '''Участки, содержащие точку (contains) или лежащие в полигоне (within)
+
+    contains: lat, lng. within: polygon=lat,lng;lat,lng;..., predicate=intersects —
+    пересекающие полигон, а не целиком внутри. Остальные параметры — как у
+    списка (фильтры, sort, limit, mode=light).
+    '''
+    try:
+        if params['action'] == 'contains':
+            lat, lng = float(params['lat']), float(params['lng'])
+        else:
+            polygon = [[float(v) for v in point.split(',')] for point in params['polygon'].split(';') if point]
+            if any(len(point) != 2 for point in polygon):
+                raise ValueError('invalid point')
+    except (KeyError, ValueError):
+        return error_response('contains needs lat and lng, within needs polygon=lat,lng;...', 400)
+
+    index = spatial_index.get_index(lazy_conn, stats.data_version(lazy_conn))
+    if params['action'] == 'contains':
+        found = index.contains(lat, lng)
+    else:
+        try:
+            found = index.within(polygon, intersecting=params.get('predicate') == 'intersects')
+        except ValueError as e:
+            return error_response(str(e), 400)
+    return get_properties(lazy_conn, params, projection, spatial_ids=found)
+
+def get_nearest(lazy_conn, params, projection):
+    '''k ближайших участков к точке или к участку с расстояниями в метрах
+
+    lat и lng или id участка (сам он в ответ не входит), k — до NEAREST_MAX_K.
+    Фильтры — как у карты, плюс status, area_min и area_max; mode=light —
+    строки без boundary и attributes.
+    '''
+    try:
+        k = max(1, min(int(params.get('k', NEAREST_DEFAULT_K)), NEAREST_MAX_K))
+        origin_id = int(params['id']) if params.get('id') else None
+        if origin_id is None:
+            lat, lng = float(params['lat']), float(params['lng'])
+        area_min = float(params['area_min']) if params.get('area_min') else None
+        area_max = float(params['area_max']) if params.get('area_max') else None
+    except (KeyError, ValueError):
+        return error_response('nearest needs lat and lng or id; k and area range must be numbers', 400)
+
+    conn = lazy_conn.get()
+    settings = config_cache.get_or_load(
+        ('filter_settings',), ['filter_config'], lazy_conn, filter_sql.load_filter_settings
+    )
+    if origin_id is not None:
+        # Исходный участок — только среди видимых вызывающему (без фильтров карты)
+        visible, visible_args = filter_sql.build_where({}, projection, settings)
+        with conn.cursor() as cur:
+            cur.execute(
+                f'SELECT latitude, longitude FROM landplots WHERE id = %s AND {visible}',
+                [origin_id] + visible_args
+            )
+            origin = cur.fetchone()
+        if not origin:
+            return error_response('Property not found', 404)
+        if origin[0] is None or origin[1] is None:
+            return error_response('Property has no coordinates', 400)
+        lat, lng = float(origin[0]), float(origin[1])
+
+    where, args = filter_sql.build_where(params, projection, settings)
+    if params.get('status') and params['status'] != 'all':
+        where, args = f'{where} AND status = %s', args + [params['status']]
+    if area_min is not None:
+        where, args = f'{where} AND area >= %s', args + [area_min]
+    if area_max is not None:
+        where, args = f'{where} AND area <= %s', args + [area_max]
+
+    # Фильтры сводятся к множеству id, поиск соседей идёт только среди них
+    allowed = None
+    if where != 'TRUE':
+        with conn.cursor() as cur:
+            cur.execute(f'SELECT id FROM landplots WHERE {where}', args)
+            allowed = [row[0] for row in cur.fetchall()]
+
+    index = nearest.get_index(lazy_conn, stats.data_version(lazy_conn))
+    found = index.nearest(lat, lng, k, index.mask(allowed), exclude=origin_id)
+    if not found:
+        return success_response([])
+
+    light = params.get('mode') == 'light'
+    detail_columns = '' if light else 'boundary, boundary_parts, attributes,'
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(f'''
+            SELECT id, title, type, price, area, location,
+                   latitude, longitude, segment, status, {detail_columns}
+                   {geometry.GEOMETRY_FIELDS}, created_at, updated_at
+            FROM landplots
+            WHERE id = ANY(%s)
+        ''', ([plot_id for plot_id, _ in found],))
+        rows = {row['id']: row for row in cur.fetchall()}
+
+    result = []
+    for plot_id, distance in found:
+        row = rows.get(plot_id)
+        if row is None:
+            continue
+        item = serialize_light(row) if light else projection.strip(serialize_property(row))
+        item['distance'] = round(distance, 1)
+        result.append(item)
+    return success_response(result)
+
+def get_stats(lazy_conn, params, caller, projection):
+    '''Агрегированная статистика по тем же фильтрам, что и на карте'''
+    try:
+        price_edges = stats.parse_edges(params.get('price_bins'))
+        area_edges = stats.parse_edges(params.get('area_bins'))
+    except ValueError:
+        return error_response('Invalid bin edges', 400)
+
+    settings = config_cache.get_or_load(
+        ('filter_settings',), ['filter_config'], lazy_conn, filter_sql.load_filter_settings
+    )
+    where, args = filter_sql.build_where(params, projection, settings)
+    key = (
+        caller['role'] if caller else None,
+        caller['id'] if caller else None,
+        filter_sql.filter_signature(params),
+        price_edges,
+        area_edges,
+    )
+    result = stats.get_or_compute(
+        lazy_conn, key, visibility.PROJECTION_TABLES,
+        lambda conn: stats.compute_stats(conn, where, args, projection, price_edges, area_edges)
+    )
+    return success_response(result)
+
+def get_density(lazy_conn, params, caller, projection):
+    '''Сетка плотности (geohash precision) по тем же фильтрам, что и на карте'''
+    try:
+        precision = density.parse_precision(params.get('precision'))
+        bbox = density.parse_bbox(params.get('bbox'))
+    except ValueError:
+        return error_response('Invalid precision or bbox', 400)
+
+    settings = config_cache.get_or_load(
+        ('filter_settings',), ['filter_config'], lazy_conn, filter_sql.load_filter_settings
+    )
+    where, args = filter_sql.build_where(params, projection, settings)
+    key = (
+        'density',
+        caller['role'] if caller else None,
+        caller['id'] if caller else None,
+        filter_sql.filter_signature(params),
+        precision,
+        bbox,
+    )
+    result = stats.get_or_compute(
+        lazy_conn, key, visibility.PROJECTION_TABLES,
+        lambda conn: density.compute_density(conn, where, args, precision, bbox)
+    )
+    return success_response(result)
+
+def get_search(lazy_conn, params, projection):
+    '''Ранжированный поиск с постраничной выдачей по курсору'''
+    text = (params.get('q') or '').strip()
+    if not text:
+        return error_response('Search query required', 400)
+    try:
+        limit = min(int(params.get('limit', search.SEARCH_DEFAULT_LIMIT)), search.SEARCH_MAX_LIMIT)
+        after = search.decode_cursor(params['cursor']) if params.get('cursor') else None
+    except ValueError:
+        return error_response('Invalid limit or cursor', 400)
+
+    settings = config_cache.get_or_load(
+        ('filter_settings',), ['filter_config'], lazy_conn, filter_sql.load_filter_settings
+    )
+    # Совпадение по q search добавляет сам; принудительные фильтры проекции уже в WHERE
+    where, args = filter_sql.build_where(dict(params, q=None), projection, settings)
+    rows, next_cursor = search.search(lazy_conn.get(), text, where, args, max(limit, 1), after)
+
+    items = []
+    for row in rows:
+        item = projection.strip(serialize_property(row))
+        item['rank'] = row['rank']
+        items.append(item)
+    return success_response({'items': items, 'next_cursor': next_cursor})
+
+def get_export(lazy_conn, params, projection):
+    '''Выгрузка таблицы в CSV/XLSX с фильтрами, сортировкой и набором колонок'''
+    fmt = params.get('format', 'xlsx')
+    if fmt not in table_export.CONTENT_TYPES:
+        return error_response('Unsupported export format', 400)
+
+    columns = [c for c in (params.get('columns') or 'title').split(',') if c]
+    columns = [c for c in columns if c not in projection.hidden_attributes]
+
+    settings = config_cache.get_or_load(
+        ('filter_settings',), ['filter_config'], lazy_conn, filter_sql.load_filter_settings
+    )
+    labels = config_cache.get_or_load(
+        ('column_labels',), ['display_configs', 'attribute_config'], lazy_conn, table_export.load_column_labels
+    )
+    where, args = filter_sql.build_where(params, projection, settings)
+
+    format_types = config_cache.get_or_load(
+        ('format_types',), ['attribute_config', 'display_configs'], lazy_conn, sorting.load_format_types
+    )
+    try:
+        keys = sorting.parse_sort(params.get('sort'), format_types)
+    except ValueError:
+        return error_response('Invalid sort', 400)
+    order_by, order_args = sorting.order_by(keys)
+
+    content = table_export.export_table(
+        lazy_conn.get(), fmt, columns, labels, where, args, order_by, order_args, projection
+    )
+    filename = f'Объекты_{time.strftime("%d.%m.%Y")}.{fmt}'
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': table_export.CONTENT_TYPES[fmt],
+            'Content-Disposition': f"attachment; filename*=UTF-8''{quote(filename)}",
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Expose-Headers': 'Content-Disposition'
+        },
+        'body': base64.b64encode(content).decode('ascii'),
+        'isBase64Encoded': True
+    }
+
+def get_report(lazy_conn, params, projection):
+    '''PDF-отчёт: layout=card — карточка на участок, catalog — каталог выборки
+
+    Участки задаются списком ids (в его порядке) или теми же фильтрами и
+    сортировкой, что и таблица; не больше REPORT_MAX_PLOTS.
+    '''
+    layout = params.get('layout', 'card')
+    if layout not in pdf_report.LAYOUTS:
+        return error_response('layout must be card or catalog', 400)
+    format_types = config_cache.get_or_load(
+        ('format_types',), ['attribute_config', 'display_configs'], lazy_conn, sorting.load_format_types
+    )
+    try:
+        ids = [int(i) for i in params['ids'].split(',') if i.strip()] if params.get('ids') else None
+        keys = sorting.parse_sort(params.get('sort'), format_types)
+    except ValueError:
+        return error_response('Invalid ids or sort', 400)
+    if ids is not None and len(ids) > pdf_report.REPORT_MAX_PLOTS:
+        return error_response(f'No more than {pdf_report.REPORT_MAX_PLOTS} plots per report', 400)
+
+    settings = config_cache.get_or_load(
+        ('filter_settings',), ['filter_config'], lazy_conn, filter_sql.load_filter_settings
+    )
+    where, args = filter_sql.build_where(params, projection, settings)
+    if ids is not None:
+        where, args = f'{where} AND id = ANY(%s)', args + [ids]
+        order_by, order_args = 'array_position(%s::int[], id)', [ids]
+    else:
+        order_by, order_args = sorting.order_by(keys)
+
+    conn = lazy_conn.get()
+    plots = pdf_report.load_plots(conn, where, args, order_by, order_args, projection)
+    if not plots:
+        return error_response('No plots for report', 404)
+    fields = config_cache.get_or_load(
+        ('report_fields',), ['attribute_config', 'display_configs'], lazy_conn, pdf_report.load_report_fields
+    )
+    content = pdf_report.build_report(plots, fields, layout, params.get('title'))
+
+    name = plots[0]['title'] if len(plots) == 1 else f'Каталог_{time.strftime("%d.%m.%Y")}'
+    filename = f'{name}.pdf'
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/pdf',
+            'Content-Disposition': f"attachment; filename*=UTF-8''{quote(filename)}",
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Expose-Headers': 'Content-Disposition'
+        },
+        'body': base64.b64encode(content).decode('ascii'),
+        'isBase64Encoded': True
+    }
+
+def backfill_geometry(lazy_conn, params, caller):
+    '''Пересчитать геометрию существующих участков (только администратор)
+
+    Один вызов обрабатывает пачки в пределах бюджета времени функции и
+    возвращает after для следующего вызова; null — таблица пройдена.
+    '''
+    if not caller or caller['role'] != 'admin':
+        return error_response('Admin access required', 403)
+    try:
+        after_id = int(params.get('after', 0))
+    except ValueError:
+        return error_response('after must be a number', 400)
+
+    # NumPy нужен только здесь, не при каждом холодном старте
+    import geometry_batch
+    processed, next_after = geometry_batch.backfill(lazy_conn.get(), after_id)
+    return success_response({'processed': processed, 'after': next_after})
+
+def handle_duplicates(lazy_conn, method, event, params, caller):
+    '''Отчёт о дублях и наложениях участков (только администратор)
+
+    POST action=detect-duplicates пересчитывает отчёт, GET action=duplicates
+    отдаёт пары по убыванию оценки (status=all — с любым решением), PUT
+    action=duplicates с {plot_a, plot_b, status} сохраняет решение по паре.
+    '''
+    if not caller or caller['role'] != 'admin':
+        return error_response('Admin access required', 403)
+    conn = lazy_conn.get()
+
+    if params['action'] == 'detect-duplicates':
+        if method != 'POST':
+            return error_response('Method not allowed', 405)
+        return success_response({'pairs': duplicates.detect(conn)})
+
+    if method == 'GET':
+        status = params.get('status', 'open')
+        rows = duplicates.load_report(conn, None if status == 'all' else status)
+        return success_response(rows)
+    if method == 'PUT':
+        body = json.loads(event.get('body', '{}'))
+        if body.get('status') not in DUPLICATE_STATUSES:
+            return error_response(f"status must be one of: {', '.join(DUPLICATE_STATUSES)}", 400)
+        with conn.cursor() as cur:
+            cur.execute('''
+                UPDATE landplot_duplicates SET status = %s
+                WHERE plot_a = LEAST(%s, %s)::int AND plot_b = GREATEST(%s, %s)::int
+            ''', (body['status'], body.get('plot_a'), body.get('plot_b'), body.get('plot_a'), body.get('plot_b')))
+            updated = cur.rowcount
+        conn.commit()
+        if not updated:
+            return error_response('Pair not found', 404)
+        return success_response({'message': 'Status updated'})
+    return error_response('Method not allowed', 405)
+
+def handle_history(lazy_conn, method, params, caller, projection):
+    '''История изменений участка и откат (только администратор)
+
+    GET action=history&id= — изменения от новых к старым (before — страница
+    дальше), POST action=revert&id=&version= — вернуть участок к состоянию до
+    изменения version, включая восстановление удалённого.
+    '''
+    if not caller or caller['role'] != 'admin':
+        return error_response('Admin access required', 403)
+    try:
+        plot_id = int(params['id'])
+        before = int(params['before']) if params.get('before') else None
+        version = int(params['version']) if params.get('version') else None
+    except (KeyError, ValueError):
+        return error_response('id, before and version must be numbers', 400)
+    conn = lazy_conn.get()
+
+    if params['action'] == 'history':
+        if method != 'GET':
+            return error_response('Method not allowed', 405)
+        return success_response(history.list_versions(conn, plot_id, before))
+
+    if method != 'POST':
+        return error_response('Method not allowed', 405)
+    if version is None:
+        return error_response('version required', 400)
+    history.set_actor(conn, caller)
+    found, exists = history.revert(conn, plot_id, version)
+    if not found:
+        return error_response('Version not found', 404)
+    if not exists:
+        return success_response({'message': 'Property deleted by revert'})
+
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        queries.execute(cur, PROPERTY_BY_ID, (plot_id,))
+        prop = cur.fetchone()
+    return success_response(projection.strip(serialize_property(prop)))
+
 def success_response(data, status_code=200):
     return {
         'statusCode': status_code,
@@ -301,17 +954,10 @@ def error_response(message, status_code=400):
 def get_attribute_configs(conn):
     '''Получить настройки отображения атрибутов'''
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute('''
-            SELECT id, attribute_key as "attributeKey", display_name as "displayName",
-                   display_order as "displayOrder", visible_in_table as "visibleInTable",
-                   visible_roles as "visibleRoles", created_at as "createdAt", 
-                   updated_at as "updatedAt"
-            FROM t_p78972315_landgis_creator.attribute_config
-            ORDER BY display_order, id
-        ''')
+        queries.execute(cur, ATTRIBUTE_CONFIGS)
         configs = cur.fetchall()
     
-    return success_response(configs)
+    return [dict(c) for c in configs]
 
 def update_attribute_config(conn, data):
     '''Обновить настройки атрибута'''
@@ -0,0 +1,149 @@
+"""Поиск ближайших участков по координатам маркера
+
+Точки (latitude, longitude) раскладываются по равномерной сетке в градусах;
+запрос просматривает клетки кольцами вокруг клетки точки и останавливается,
+когда k-е найденное расстояние не больше нижней оценки расстояния до
+следующего кольца. Расстояния — по гаверсинусу, в метрах. Индекс строится из
+БД при первом запросе и перестраивается при смене версии данных landplots.
+"""
+import math
+import threading
+
+import numpy as np
+
+EARTH_MEAN_RADIUS = 6371008.8
+POINTS_PER_CELL = 16
+MIN_CELL_DEGREES = 0.001
+
+_lock = threading.Lock()
+_current = None  # (версия данных, GridIndex)
+
+
+def haversine(lat, lng, lats, lngs):
+    '''Расстояние в метрах от точки до массива точек'''
+    phi1, phi2 = math.radians(lat), np.radians(lats)
+    d_phi = phi2 - phi1
+    d_lambda = np.radians(lngs - lng)
+    a = np.sin(d_phi / 2) ** 2 + math.cos(phi1) * np.cos(phi2) * np.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_MEAN_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class GridIndex:
+    """Сетка клеток с точками участков, отсортированными по клетке"""
+
+    def __init__(self, ids, lats, lngs):
+        ids = np.asarray(ids, dtype=np.int64)
+        lats = np.asarray(lats, dtype=float)
+        lngs = np.asarray(lngs, dtype=float)
+        n = len(ids)
+        if n:
+            span = max((lats.max() - lats.min()) * (lngs.max() - lngs.min()), MIN_CELL_DEGREES ** 2)
+            self.cell = max(math.sqrt(span * POINTS_PER_CELL / n), MIN_CELL_DEGREES)
+            self.origin = (lats.min(), lngs.min())
+            self.max_abs_lat = max(abs(lats.min()), abs(lats.max()))
+        else:
+            self.cell, self.origin, self.max_abs_lat = 1.0, (0.0, 0.0), 0.0
+
+        rows = np.floor((lats - self.origin[0]) / self.cell).astype(np.int64)
+        cols = np.floor((lngs - self.origin[1]) / self.cell).astype(np.int64)
+        order = np.lexsort((cols, rows))
+        self.ids, self.lats, self.lngs = ids[order], lats[order], lngs[order]
+        rows, cols = rows[order], cols[order]
+
+        self.cells = {}
+        if n:
+            boundaries = np.flatnonzero((np.diff(rows) != 0) | (np.diff(cols) != 0)) + 1
+            starts = np.concatenate(([0], boundaries))
+            ends = np.concatenate((boundaries, [n]))
+            for start, end in zip(starts.tolist(), ends.tolist()):
+                self.cells[(int(rows[start]), int(cols[start]))] = (start, end)
+            self.rows, self.cols = int(rows.max()) + 1, int(cols.max()) + 1
+        else:
+            self.rows = self.cols = 0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def mask(self, allowed_ids):
+        '''Маска точек по множеству разрешённых id (None — все)'''
+        if allowed_ids is None:
+            return None
+        return np.isin(self.ids, np.fromiter(allowed_ids, dtype=np.int64))
+
+    def _ring(self, row, col, r):
+        '''Диапазоны точек в клетках на расстоянии r (по Чебышёву) от клетки
+
+        Перебираются только клетки внутри сетки, поэтому точка далеко за
+        пределами данных не стоит лишних проходов.
+        '''
+        ranges = []
+        for rr in range(max(row - r, 0), min(row + r, self.rows - 1) + 1):
+            if abs(rr - row) == r:
+                candidates = range(max(col - r, 0), min(col + r, self.cols - 1) + 1)
+            else:
+                candidates = [c for c in (col - r, col + r) if 0 <= c < self.cols]
+            ranges.extend(self.cells[(rr, c)] for c in candidates if (rr, c) in self.cells)
+        return ranges
+
+    def nearest(self, lat, lng, k, mask=None, exclude=None):
+        '''k ближайших: список (id, расстояние в метрах) по возрастанию'''
+        if not len(self) or k <= 0:
+            return []
+        row = int(math.floor((lat - self.origin[0]) / self.cell))
+        col = int(math.floor((lng - self.origin[1]) / self.cell))
+        # Кольца до первой клетки сетки пусты, после дальней — тоже
+        first_ring = max(0, -row, row - self.rows + 1, -col, col - self.cols + 1)
+        last_ring = max(abs(row), abs(row - self.rows + 1), abs(col), abs(col - self.cols + 1))
+        # Нижняя оценка метров на клетку: по долготе клетка сжимается к полюсу
+        max_lat = min(max(self.max_abs_lat, abs(lat)), 89.0)
+        cell_meters = math.radians(self.cell) * EARTH_MEAN_RADIUS * math.cos(math.radians(max_lat))
+
+        found_idx = []
+        found_dist = []
+        kth = math.inf
+        for r in range(first_ring, last_ring + 1):
+            ranges = self._ring(row, col, r)
+            if ranges:
+                idx = np.concatenate([np.arange(s, e) for s, e in ranges])
+                if mask is not None:
+                    idx = idx[mask[idx]]
+                if exclude is not None:
+                    idx = idx[self.ids[idx] != exclude]
+                if len(idx):
+                    found_idx.append(idx)
+                    found_dist.append(haversine(lat, lng, self.lats[idx], self.lngs[idx]))
+                    total = sum(len(i) for i in found_idx)
+                    if total >= k:
+                        kth = np.partition(np.concatenate(found_dist), k - 1)[k - 1]
+            # Непросмотренные клетки отстоят от точки не меньше чем на r клеток
+            if kth <= r * cell_meters:
+                break
+
+        if not found_idx:
+            return []
+        idx = np.concatenate(found_idx)
+        dist = np.concatenate(found_dist)
+        order = np.lexsort((self.ids[idx], dist))[:k]
+        return [(int(self.ids[idx[i]]), float(dist[i])) for i in order]
+
+
+def load_points(conn):
+    with conn.cursor() as cur:
+        cur.execute('SELECT id, latitude, longitude FROM landplots WHERE latitude IS NOT NULL AND longitude IS NOT NULL')
+        rows = cur.fetchall()
+    conn.commit()
+    return GridIndex([r[0] for r in rows], [float(r[1]) for r in rows], [float(r[2]) for r in rows])
+
+
+def get_index(lazy_conn, version):
+    '''Сетка для текущей версии данных; перестраивается после изменений landplots'''
+    global _current
+    with _lock:
+        if _current is not None and _current[0] == version:
+            return _current[1]
+
+    index = load_points(lazy_conn.get())
+
+    with _lock:
+        _current = (version, index)
+    return index
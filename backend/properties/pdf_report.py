@@ -0,0 +1,358 @@
+"""PDF-отчёты по участкам: карточки и каталоги выборки
+
+Атрибуты подписываются и форматируются по attribute_config (display_name,
+format_type, format_options) так же, как formatValue во фронтенде, а скрытые
+роли атрибуты убирает проекция ещё до рендеринга. Шрифт — подмножество
+PT Sans из font_asset, один файл на инстанс; fpdf2 дополнительно оставляет
+в PDF только использованные глифы.
+
+Почти всё время вёрстки (порядка 20 мс на участок) уходит на перенос строк,
+поэтому большие выборки делятся на пачки по REPORT_CHUNK_SIZE и строки пачек
+переносятся параллельно в пуле процессов. Документ из готовых строк
+собирается один: шрифт встраивается в него один раз, а каталог идёт
+сплошным потоком без разрывов страниц между пачками. Если процессы в
+окружении недоступны, пачки обрабатываются последовательно.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, datetime
+
+from psycopg2.extras import RealDictCursor
+
+import font_asset
+
+REPORT_MAX_PLOTS = 500
+REPORT_CHUNK_SIZE = 25
+REPORT_WORKERS = int(os.environ.get('REPORT_WORKERS', str(min(4, os.cpu_count() or 1))))
+LAYOUTS = ('card', 'catalog')
+FONT_FAMILY = 'PTSans'
+FONT_SUBSET = 'cyrillic-latin'
+TYPE_LABELS = {'land': 'Земля', 'commercial': 'Коммерческая', 'residential': 'Жилая'}
+# Кегль, интервал строк и ширина подписи (для строк «подпись: значение») блоков вёрстки
+STYLES = {
+    'card': {'title': (18, 9), 'location': (11, 6), 'main': (12, 7, 45), 'rows': (10, 6, 60)},
+    'catalog': {'title': (13, 7), 'location': (9, 5), 'summary': (9, 5), 'rows': (9, 5, 50)},
+}
+GREY = (100, 100, 100)
+BLACK = (0, 0, 0)
+EMPTY = '—'
+NBSP = '\u00a0'
+
+_font_path = None
+_pool = None
+_lock = threading.Lock()
+
+
+def load_report_fields(conn):
+    '''Атрибуты в порядке отображения: (ключ, подпись, формат, опции формата)'''
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute('''
+            SELECT attribute_key AS key, display_name AS label, format_type, format_options
+            FROM attribute_config
+            ORDER BY display_order, id
+        ''')
+        fields = {row['key']: row for row in cur.fetchall()}
+        cur.execute('''
+            SELECT config_key AS key, display_name AS label, format_type, format_options
+            FROM display_configs
+            WHERE config_type = 'attribute'
+            ORDER BY display_order, id
+        ''')
+        for row in cur.fetchall():
+            fields.setdefault(row['key'], row)
+    conn.commit()
+    return [(f['key'], f['label'] or f['key'], f['format_type'], f['format_options'] or {}) for f in fields.values()]
+
+
+def group_digits(number, decimals=0):
+    text = f'{number:,.{decimals}f}'.replace(',', NBSP).replace('.', ',')
+    return text.rstrip('0').rstrip(',') if decimals else text
+
+
+def format_value(value, format_type=None, options=None):
+    '''Значение атрибута как formatValue (AttributeEditField.tsx)'''
+    options = options or {}
+    if value is None:
+        return EMPTY
+    if format_type in ('money', 'number'):
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            return str(value)
+        if format_type == 'money':
+            return f'{group_digits(round(number))}{NBSP}₽'
+        return group_digits(number, 3)
+    if format_type == 'boolean':
+        return 'Да' if value else 'Нет'
+    if format_type == 'toggle':
+        true_label = options.get('trueLabel') or 'Да'
+        is_true = value is True or str(value).strip().lower() in ('true', 'да', true_label.lower())
+        return true_label if is_true else (options.get('falseLabel') or 'Нет')
+    if format_type == 'date':
+        try:
+            return datetime.fromisoformat(str(value).replace('Z', '+00:00')).strftime('%d.%m.%Y')
+        except ValueError:
+            return str(value)
+    if format_type == 'multiselect':
+        if isinstance(value, str):
+            try:
+                parsed = json.loads(value)
+                value = parsed if isinstance(parsed, list) else value
+            except ValueError:
+                pass
+        if isinstance(value, list):
+            return ', '.join(str(v) for v in value) or EMPTY
+        return str(value).strip() or EMPTY
+    if format_type == 'button':
+        try:
+            data = json.loads(value) if isinstance(value, str) else value
+            return (data or {}).get('text') or 'Кнопка'
+        except (ValueError, AttributeError):
+            return 'Кнопка'
+    if isinstance(value, bool):
+        return 'Да' if value else 'Нет'
+    if isinstance(value, list):
+        return ', '.join(str(v) for v in value)
+    if isinstance(value, dict):
+        return ', '.join(f'{k}: {v}' for k, v in value.items())
+    return str(value)
+
+
+def plot_entries(prop, fields):
+    '''Заголовок, адрес, основные поля и строки атрибутов участка для вёрстки'''
+    main = [
+        ('Тип', TYPE_LABELS.get(prop.get('type'), prop.get('type') or EMPTY)),
+        ('Статус', prop.get('status') or EMPTY),
+        ('Площадь', f'{group_digits(prop["area"], 2)}{NBSP}га' if prop.get('area') else EMPTY),
+        ('Цена', format_value(prop.get('price'), 'money') if prop.get('price') else EMPTY),
+    ]
+    attrs = prop.get('attributes') or {}
+    rows = []
+    for key, label, format_type, options in fields:
+        if key not in attrs or format_type == 'button':
+            continue
+        text = format_value(attrs[key], format_type, options)
+        if text and text != EMPTY:
+            rows.append((label, text))
+    return {
+        'id': prop['id'],
+        'title': prop.get('title') or f'Участок {prop["id"]}',
+        'location': prop.get('location') or '',
+        'main': main,
+        'rows': rows,
+        'boundary': prop.get('boundary') or [],
+    }
+
+
+def _new_pdf(font_path, title=None):
+    from fpdf import FPDF
+
+    pdf = FPDF(orientation='portrait', unit='mm', format='A4')
+    pdf.set_auto_page_break(True, margin=15)
+    pdf.set_margins(15, 15, 15)
+    pdf.add_font(FONT_FAMILY, '', font_path)
+    pdf.set_font(FONT_FAMILY, size=10)
+    if title:
+        pdf.set_title(title)
+        pdf.set_creator('LandGIS')
+    return pdf
+
+
+def _wrap(pdf, text, size, width):
+    pdf.set_font_size(size)
+    return pdf.multi_cell(width, 1, text, dry_run=True, output='LINES')
+
+
+def wrap_chunk(font_path, layout, entries):
+    '''Тексты пачки участков, разбитые на строки по STYLES; вызывается и в процессах пула'''
+    pdf = _new_pdf(font_path)
+    pdf.add_page()
+    styles = STYLES[layout]
+    wrapped = []
+    for entry in entries:
+        texts = {'title': entry['title'], 'location': entry['location']}
+        if layout == 'catalog':
+            texts['title'] = f'{entry["title"]} (№{entry["id"]})'
+            texts['summary'] = '  ·  '.join(f'{label}: {text}' for label, text in entry['main'])
+        lines = {block: _wrap(pdf, text, styles[block][0], 0) if text else [] for block, text in texts.items()}
+        for block in ('main', 'rows'):
+            if block in styles:
+                size, _, label_width = styles[block]
+                lines[block] = [
+                    (_wrap(pdf, f'{label}:', size, label_width), _wrap(pdf, text, size, pdf.epw - label_width))
+                    for label, text in entry[block]
+                ]
+        wrapped.append(lines)
+    return wrapped
+
+
+def _draw_lines(pdf, lines, style, color=BLACK):
+    size, line_height = style
+    pdf.set_font_size(size)
+    pdf.set_text_color(*color)
+    for line in lines:
+        pdf.cell(0, line_height, line, new_x='LMARGIN', new_y='NEXT')
+    pdf.set_text_color(*BLACK)
+
+
+def _draw_rows(pdf, rows, style):
+    '''Подписи слева, значения справа; длинное значение переходит на новую страницу построчно'''
+    size, line_height, label_width = style
+    pdf.set_font_size(size)
+    for label_lines, value_lines in rows:
+        for i in range(max(len(label_lines), len(value_lines))):
+            if pdf.will_page_break(line_height):
+                pdf.add_page()
+            if i < len(label_lines):
+                pdf.set_text_color(*GREY)
+                pdf.cell(label_width, line_height, label_lines[i])
+            pdf.set_x(pdf.l_margin + label_width)
+            pdf.set_text_color(*BLACK)
+            pdf.cell(0, line_height, value_lines[i] if i < len(value_lines) else '', new_x='LMARGIN', new_y='NEXT')
+
+
+def _draw_boundary(pdf, ring, x, y, size):
+    '''Контур участка, вписанный в квадрат size×size (без подложки карты)'''
+    points = [(p[0], p[1]) for p in ring if isinstance(p, (list, tuple)) and len(p) >= 2]
+    if len(points) < 3:
+        return False
+    lats, lngs = [p[0] for p in points], [p[1] for p in points]
+    span = max(max(lats) - min(lats), max(lngs) - min(lngs)) or 1
+    scale = size / span
+    coords = [(x + (lng - min(lngs)) * scale, y + (max(lats) - lat) * scale) for lat, lng in points]
+    pdf.set_draw_color(255, 107, 53)
+    pdf.set_fill_color(255, 225, 214)
+    pdf.set_line_width(0.6)
+    pdf.polygon(coords, style='DF')
+    pdf.set_draw_color(200, 200, 200)
+    pdf.set_line_width(0.2)
+    return True
+
+
+def _render_card(pdf, entry, lines):
+    styles = STYLES['card']
+    pdf.add_page()
+    _draw_lines(pdf, lines['title'], styles['title'])
+    _draw_lines(pdf, lines['location'], styles['location'], GREY)
+    pdf.ln(4)
+    if _draw_boundary(pdf, entry['boundary'], pdf.l_margin, pdf.get_y(), 60):
+        pdf.set_y(pdf.get_y() + 66)
+    _draw_rows(pdf, lines['main'], styles['main'])
+    if lines['rows']:
+        pdf.ln(4)
+        pdf.set_font_size(14)
+        pdf.cell(0, 8, 'Характеристики объекта', new_x='LMARGIN', new_y='NEXT')
+        _draw_rows(pdf, lines['rows'], styles['rows'])
+
+
+def _render_catalog_item(pdf, lines):
+    styles = STYLES['catalog']
+    # Заголовок не отрывается от первых строк участка
+    if pdf.will_page_break(30):
+        pdf.add_page()
+    _draw_lines(pdf, lines['title'], styles['title'])
+    _draw_lines(pdf, lines['location'], styles['location'], GREY)
+    _draw_lines(pdf, lines['summary'], styles['summary'])
+    _draw_rows(pdf, lines['rows'], styles['rows'])
+    pdf.ln(2)
+    pdf.set_draw_color(200, 200, 200)
+    pdf.line(pdf.l_margin, pdf.get_y(), pdf.w - pdf.r_margin, pdf.get_y())
+    pdf.ln(3)
+
+
+def font_path():
+    '''Файл подмножества шрифта на инстанс: его читают и процессы пула'''
+    global _font_path
+    with _lock:
+        if _font_path is None or not os.path.exists(_font_path):
+            data, etag = font_asset.get_font(FONT_SUBSET)
+            path = os.path.join(tempfile.gettempdir(), f'ptsans-{etag}.ttf')
+            with open(path, 'wb') as f:
+                f.write(data)
+            _font_path = path
+        return _font_path
+
+
+def _get_pool():
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=REPORT_WORKERS)
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def render_report(entries, layout, title):
+    '''Байты PDF: строки переносятся пачками параллельно, документ верстается один'''
+    path = font_path()
+    chunks = [entries[i:i + REPORT_CHUNK_SIZE] for i in range(0, len(entries), REPORT_CHUNK_SIZE)]
+    if len(chunks) <= 1 or REPORT_WORKERS <= 1:
+        wrapped = [wrap_chunk(path, layout, chunk) for chunk in chunks]
+    else:
+        try:
+            pool = _get_pool()
+            wrapped = list(pool.map(wrap_chunk, [path] * len(chunks), [layout] * len(chunks), chunks))
+        except (OSError, NotImplementedError, BrokenProcessPool) as e:
+            # Нет /dev/shm или fork, либо процесс пула упал — переносим в текущем
+            print(f'⚠️ report pool unavailable: {e}')
+            _reset_pool()
+            wrapped = [wrap_chunk(path, layout, chunk) for chunk in chunks]
+    lines = [item for chunk in wrapped for item in chunk]
+
+    pdf = _new_pdf(path, title)
+    if layout == 'catalog':
+        pdf.add_page()
+        pdf.set_font_size(18)
+        pdf.multi_cell(0, 9, title, new_x='LMARGIN', new_y='NEXT')
+        pdf.set_font_size(9)
+        pdf.set_text_color(*GREY)
+        pdf.cell(0, 5, f'Сформирован {date.today().strftime("%d.%m.%Y")}', new_x='LMARGIN', new_y='NEXT')
+        pdf.set_text_color(*BLACK)
+        pdf.ln(4)
+        for item in lines:
+            _render_catalog_item(pdf, item)
+    else:
+        for entry, item in zip(entries, lines):
+            _render_card(pdf, entry, item)
+    return bytes(pdf.output())
+
+
+def load_plots(conn, where, args, order_by, order_args, projection, limit=REPORT_MAX_PLOTS):
+    '''Участки отчёта с применённой проекцией'''
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(f'''
+            SELECT id, title, type, price, area, location, status, attributes, boundary
+            FROM landplots
+            WHERE {where}
+            ORDER BY {order_by}
+            LIMIT %s
+        ''', args + order_args + [limit])
+        rows = cur.fetchall()
+    conn.commit()
+    plots = []
+    for row in rows:
+        prop = projection.apply(dict(row, attributes=row['attributes'] or {}))
+        if prop is not None:
+            plots.append(prop)
+    return plots
+
+
+def build_report(plots, fields, layout, title=None):
+    title = title or ('Каталог участков' if layout == 'catalog' else 'Карточки участков')
+    started = time.monotonic()
+    entries = [plot_entries(prop, fields) for prop in plots]
+    content = render_report(entries, layout, title)
+    print(f'📄 report: {len(entries)} plots, {layout}, {len(content)} bytes, {time.monotonic() - started:.2f}s')
+    return content
@@ -0,0 +1,114 @@
+"""Именованные подготовленные запросы для горячих путей
+
+Тексты запросов регистрируются под именем с плейсхолдером {schema} и
+параметрами $1, $2, … Схема определяется один раз на инстанс (MAIN_DB_SCHEMA
+или current_schema() первого соединения). При первом выполнении на
+соединении запрос готовится через PREPARE, дальше отправляется только
+EXECUTE с параметрами — без повторного разбора и планирования. Соединения
+живут в пуле LazyConnection (config_cache), поэтому подготовка окупается
+уже со второго вызова тёплого инстанса.
+
+DB_PREPARED_STATEMENTS=0 отключает PREPARE (например, за pgbouncer в режиме
+transaction) — те же запросы выполняются обычным execute. Для каждого имени
+ведутся счётчики вызовов, подготовок и времени; DB_STATS_LOG_EVERY=N
+печатает их в лог каждые N вызовов.
+"""
+import json
+import os
+import re
+import threading
+import time
+import weakref
+
+from psycopg2.extensions import quote_ident
+
+PREPARED_ENABLED = os.environ.get('DB_PREPARED_STATEMENTS', '1') != '0'
+STATS_LOG_EVERY = int(os.environ.get('DB_STATS_LOG_EVERY', '0'))
+
+_statements = {}
+_plain = {}
+_prepared = weakref.WeakKeyDictionary()
+_stats = {}
+_schema = None
+_calls = 0
+_lock = threading.Lock()
+
+
+def statement(name, sql):
+    '''Зарегистрировать запрос; возвращает имя для execute'''
+    if not re.fullmatch(r'[a-z][a-z0-9_]*', name):
+        raise ValueError(f'invalid statement name: {name}')
+    _statements[name] = sql
+    return name
+
+
+def schema(conn):
+    '''Схема приложения, определяется один раз на инстанс'''
+    global _schema
+    if _schema is None:
+        name = os.environ.get('MAIN_DB_SCHEMA')
+        if not name:
+            with conn.cursor() as cur:
+                cur.execute('SELECT current_schema()')
+                name = cur.fetchone()[0]
+        _schema = name
+    return _schema
+
+
+def qualify(conn, sql):
+    '''Текст запроса с подставленной схемой'''
+    return sql.replace('{schema}', quote_ident(schema(conn), conn))
+
+
+def _plain_text(conn, name):
+    '''Запрос для обычного execute: $N -> %(pN)s'''
+    if name not in _plain:
+        text = qualify(conn, _statements[name]).replace('%', '%%')
+        _plain[name] = re.sub(r'\$(\d+)', r'%(p\1)s', text)
+    return _plain[name]
+
+
+def execute(cur, name, params=()):
+    '''Выполнить зарегистрированный запрос на курсоре cur'''
+    conn = cur.connection
+    started = time.perf_counter()
+    prepared_now = False
+    if PREPARED_ENABLED:
+        with _lock:
+            names = _prepared.setdefault(conn, set())
+        if name not in names:
+            # Подготовленный запрос живёт до конца сессии и не откатывается вместе с транзакцией
+            cur.execute(f'PREPARE {name} AS {qualify(conn, _statements[name])}')
+            names.add(name)
+            prepared_now = True
+        if params:
+            cur.execute(f'EXECUTE {name} ({", ".join(["%s"] * len(params))})', tuple(params))
+        else:
+            cur.execute(f'EXECUTE {name}')
+    else:
+        cur.execute(_plain_text(conn, name), {f'p{i}': v for i, v in enumerate(params, 1)})
+    _count(name, time.perf_counter() - started, prepared_now)
+    return cur
+
+
+def _count(name, seconds, prepared_now):
+    global _calls
+    with _lock:
+        entry = _stats.setdefault(name, {'calls': 0, 'prepares': 0, 'total_ms': 0.0})
+        entry['calls'] += 1
+        entry['prepares'] += int(prepared_now)
+        entry['total_ms'] += seconds * 1000
+        _calls += 1
+        due = STATS_LOG_EVERY and _calls % STATS_LOG_EVERY == 0
+    if due:
+        print(f'📊 queries: {json.dumps(stats())}')
+
+
+def stats():
+    '''Счётчики по именам запросов: вызовы, подготовки, суммарное и среднее время'''
+    with _lock:
+        return {
+            name: dict(entry, total_ms=round(entry['total_ms'], 3),
+                       avg_ms=round(entry['total_ms'] / entry['calls'], 3))
+            for name, entry in _stats.items()
+        }
@@ -0,0 +1,96 @@
+"""Поиск участков по названию, адресу, кадастровым атрибутам и региону
+
+Используются поля search_vector/search_document (см. V0043): полнотекстовое
+совпадение с русской морфологией и префиксами ранжируется выше, нечёткое
+совпадение по триграммам ловит опечатки в адресах. Обе ветки обслуживаются
+GIN-индексами, поэтому время поиска не растёт вместе с каталогом. Страницы
+отдаются по ключу (rank, id), без OFFSET.
+"""
+import base64
+import json
+import re
+import weakref
+
+from psycopg2.extras import RealDictCursor
+
+import geometry
+
+SEARCH_DEFAULT_LIMIT = 50
+SEARCH_MAX_LIMIT = 200
+FUZZY_THRESHOLD = 0.5
+WORD_RE = re.compile(r'\w+')
+
+_threshold_set = weakref.WeakSet()
+
+
+def prefix_tsquery(text):
+    '''Запрос to_tsquery: все слова, каждое как префикс'''
+    words = WORD_RE.findall(text.lower())
+    if not words:
+        return None
+    return ' & '.join(f'{w}:*' for w in words)
+
+
+def use_fuzzy_threshold(conn):
+    '''Порог оператора <% на всю сессию соединения — для условия q из filter_sql.build_where
+
+    Значение фиксируется commit, чтобы его не отменил откат при возврате
+    соединения в пул; на каждом соединении порог задаётся один раз.
+    '''
+    if conn in _threshold_set:
+        return
+    with conn.cursor() as cur:
+        cur.execute('SELECT set_config(%s, %s, false)', ('pg_trgm.word_similarity_threshold', str(FUZZY_THRESHOLD)))
+    conn.commit()
+    _threshold_set.add(conn)
+
+
+def encode_cursor(rank, row_id):
+    raw = json.dumps([rank, row_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor):
+    '''Позиция (rank, id) из курсора; ValueError для повреждённого'''
+    try:
+        rank, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return float(rank), int(row_id)
+    except (TypeError, ValueError, UnicodeError):
+        raise ValueError('invalid cursor')
+
+
+def search(conn, text, where, args, limit=SEARCH_DEFAULT_LIMIT, after=None):
+    '''Страница результатов и курсор следующей (None, если страниц больше нет)'''
+    tsquery = prefix_tsquery(text)
+    if tsquery is None:
+        return [], None
+    fuzzy = ' '.join(WORD_RE.findall(text.lower()))
+    after_rank, after_id = after if after else (None, None)
+
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute('SELECT set_config(%s, %s, true)', ('pg_trgm.word_similarity_threshold', str(FUZZY_THRESHOLD)))
+        cur.execute(f'''
+            SELECT * FROM (
+                SELECT
+                    id, title, type, price, area, location,
+                    latitude, longitude, segment, status, boundary, boundary_parts, attributes,
+                    {geometry.GEOMETRY_FIELDS}, created_at, updated_at,
+                    GREATEST(
+                        CASE WHEN search_vector @@ q.ts THEN 1 + ts_rank_cd(search_vector, q.ts) ELSE 0 END,
+                        word_similarity(%s, search_document)
+                    )::float8 AS rank
+                FROM landplots, (SELECT to_tsquery('russian', %s) AS ts) q
+                WHERE (search_vector @@ q.ts OR %s <%% search_document)
+                  AND {where}
+            ) r
+            WHERE %s::float8 IS NULL OR (r.rank, r.id) < (%s::float8, %s::int)
+            ORDER BY r.rank DESC, r.id DESC
+            LIMIT %s
+        ''', [fuzzy, tsquery, fuzzy] + args + [after_rank, after_rank, after_id, limit + 1])
+        rows = cur.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['rank'], rows[-1]['id'])
+    return rows, next_cursor
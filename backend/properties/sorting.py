@@ -0,0 +1,158 @@
+"""Сортировка участков по колонкам и атрибутам с приведением типов
+
+Параметр sort — список ключей через запятую, минус означает убывание:
+sort=-price,ekspos. Атрибуты приводятся по attribute_config.format_type
+функциями из V0044 (number/money — число, date — дата, toggle — boolean),
+остальные сравниваются как текст без учёта регистра. Последним ключом всегда
+идёт id, поэтому порядок однозначен и страницы по курсору не теряют и не
+повторяют строки.
+"""
+import base64
+import json
+
+MAX_SORT_KEYS = 3
+
+# Колонки landplots: выражение и тип для приведения значения из курсора
+COLUMNS = {
+    'title': ('lower(title)', 'text'),
+    'location': ('lower(location)', 'text'),
+    'type': ('type', 'text'),
+    'segment': ('segment', 'text'),
+    'status': ('status', 'text'),
+    'price': ('price', 'numeric'),
+    'area': ('area', 'numeric'),
+    'created_at': ('created_at', 'timestamp'),
+    'updated_at': ('updated_at', 'timestamp'),
+}
+
+FORMAT_CASTS = {
+    'number': ('landplot_numeric(attributes->>%s)', 'numeric'),
+    'money': ('landplot_numeric(attributes->>%s)', 'numeric'),
+    'date': ('landplot_date(attributes->>%s)', 'date'),
+    'toggle': ('landplot_bool(attributes->%s)', 'boolean'),
+    'boolean': ('landplot_bool(attributes->%s)', 'boolean'),
+}
+
+# Текст как в getCellValue: массив через запятую, пустое значение — NULL
+TEXT_CAST = (
+    "NULLIF(lower(CASE jsonb_typeof(attributes->%s) "
+    "WHEN 'array' THEN array_to_string(ARRAY(SELECT jsonb_array_elements_text(attributes->%s)), ', ') "
+    "ELSE attributes->>%s END), '')",
+    'text'
+)
+
+
+class SortKey:
+    """Ключ сортировки: SQL-выражение с параметрами, тип и направление"""
+
+    def __init__(self, name, expression, args, sql_type, desc):
+        self.name = name
+        self.expression = expression
+        self.args = args
+        self.sql_type = sql_type
+        self.desc = desc
+
+
+def load_format_types(conn):
+    '''Типы атрибутов: attribute_config, затем display_configs'''
+    with conn.cursor() as cur:
+        cur.execute('SELECT attribute_key, format_type FROM attribute_config')
+        types = {key: fmt for key, fmt in cur.fetchall() if fmt}
+        cur.execute("SELECT config_key, format_type FROM display_configs WHERE config_type = 'attribute'")
+        for key, fmt in cur.fetchall():
+            if fmt:
+                types.setdefault(key, fmt)
+    return types
+
+
+def parse_sort(raw, format_types):
+    '''Ключи сортировки из параметра sort; ValueError для некорректного'''
+    keys = []
+    for part in (raw or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        desc = part.startswith('-')
+        name = part.lstrip('-+')
+        if not name or len(keys) >= MAX_SORT_KEYS:
+            raise ValueError('invalid sort')
+        if name in COLUMNS:
+            expression, sql_type = COLUMNS[name]
+            args = []
+        else:
+            expression, sql_type = FORMAT_CASTS.get(format_types.get(name), TEXT_CAST)
+            args = [name] * expression.count('%s')
+        keys.append(SortKey(name, expression, args, sql_type, desc))
+    return keys
+
+
+def order_by(keys):
+    '''ORDER BY и параметры; id в направлении первого ключа'''
+    parts = [f"{k.expression} {'DESC NULLS LAST' if k.desc else 'ASC NULLS FIRST'}" for k in keys]
+    parts.append('id DESC' if keys and keys[0].desc else 'id ASC')
+    return ', '.join(parts), [a for k in keys for a in k.args]
+
+
+def select_values(keys):
+    '''Дополнительные колонки SELECT со значениями ключей для курсора'''
+    if not keys:
+        return '', []
+    sql = ''.join(f', {k.expression} AS sort_{i}' for i, k in enumerate(keys))
+    return sql, [a for k in keys for a in k.args]
+
+
+def after_clause(keys, values, last_id):
+    '''Условие «строка после курсора» для порядка из order_by'''
+    branches = []
+    prefix_sql = []
+    prefix_args = []
+    for key, value in zip(keys, values):
+        expr = key.expression
+        if value is None:
+            # NULL стоят первыми при ASC и последними при DESC
+            gt_sql, gt_args = ('FALSE', []) if key.desc else (f'{expr} IS NOT NULL', list(key.args))
+            eq_sql, eq_args = f'{expr} IS NULL', list(key.args)
+        else:
+            cast = f'%s::{key.sql_type}'
+            if key.desc:
+                gt_sql = f'({expr} < {cast} OR {expr} IS NULL)'
+                gt_args = key.args + [value] + key.args
+            else:
+                gt_sql = f'{expr} > {cast}'
+                gt_args = key.args + [value]
+            eq_sql, eq_args = f'{expr} = {cast}', key.args + [value]
+        branches.append((prefix_sql + [gt_sql], prefix_args + gt_args))
+        prefix_sql = prefix_sql + [eq_sql]
+        prefix_args = prefix_args + eq_args
+
+    id_desc = bool(keys) and keys[0].desc
+    branches.append((prefix_sql + ['id < %s' if id_desc else 'id > %s'], prefix_args + [last_id]))
+
+    sql = ' OR '.join('(' + ' AND '.join(parts) + ')' for parts, _ in branches)
+    return f'({sql})', [a for _, args in branches for a in args]
+
+
+def cursor_value(value):
+    '''Значение ключа в виде, пригодном для JSON и обратного приведения в SQL'''
+    if value is None or isinstance(value, (bool, str)):
+        return value
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_cursor(raw_sort, row, keys):
+    data = {'s': raw_sort or '', 'v': [cursor_value(row[f'sort_{i}']) for i in range(len(keys))], 'i': row['id']}
+    return base64.urlsafe_b64encode(json.dumps(data).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor, raw_sort, keys):
+    '''Значения ключей и id из курсора; курсор другой сортировки недействителен'''
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        values, last_id = data['v'], int(data['i'])
+    except (TypeError, KeyError, ValueError, UnicodeError):
+        raise ValueError('invalid cursor')
+    if data.get('s') != (raw_sort or '') or len(values) != len(keys):
+        raise ValueError('cursor does not match sort')
+    return values, last_id
@@ -0,0 +1,281 @@
+"""Пространственный индекс участков в памяти процесса
+
+R-дерево, упакованное по Sort-Tile-Recursive, над bbox участков из колонок
+V0045. Дерево строится из БД при первом запросе и перестраивается, когда
+меняется версия данных landplots (stats.data_version). Кандидаты из дерева
+проверяются точно: точка в полигоне и пересечение рёбер считаются NumPy сразу
+по всем рёбрам кандидатов, без цикла по участкам.
+
+Сравнение с последовательным просмотром: python spatial_index.py
+"""
+import math
+import threading
+
+import numpy as np
+from psycopg2.extras import RealDictCursor
+
+NODE_CAPACITY = 16
+MATRIX_CHUNK = 1 << 20  # элементов матрицы «вершины × рёбра запроса» за один шаг
+
+_lock = threading.Lock()
+_current = None  # (версия данных, SpatialIndex)
+
+
+def expand(starts, counts):
+    '''Индексы всех диапазонов [start, start + count) подряд'''
+    total = int(counts.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+    offsets = np.cumsum(counts) - counts
+    return np.arange(total) - np.repeat(offsets, counts) + np.repeat(starts, counts)
+
+
+def str_order(boxes, capacity):
+    '''Порядок прямоугольников (south, west, north, east) по Sort-Tile-Recursive'''
+    n = len(boxes)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    center_lat = (boxes[:, 0] + boxes[:, 2]) / 2
+    center_lng = (boxes[:, 1] + boxes[:, 3]) / 2
+    slices = max(1, math.ceil(math.sqrt(math.ceil(n / capacity))))
+    per_slice = slices * capacity
+    by_lng = np.argsort(center_lng, kind='stable')
+    tiles = [chunk[np.argsort(center_lat[chunk], kind='stable')]
+             for chunk in (by_lng[s:s + per_slice] for s in range(0, n, per_slice))]
+    return np.concatenate(tiles)
+
+
+def intersects(boxes, south, west, north, east):
+    return (boxes[:, 0] <= north) & (boxes[:, 2] >= south) & (boxes[:, 1] <= east) & (boxes[:, 3] >= west)
+
+
+def open_ring(ring):
+    '''Кольцо без повтора первой точки в конце'''
+    points = [(float(p[0]), float(p[1])) for p in ring]
+    if len(points) > 1 and points[0] == points[-1]:
+        points.pop()
+    return points
+
+
+class SpatialIndex:
+    """STR R-дерево над bbox участков и плоские массивы их колец"""
+
+    def __init__(self, plots, capacity=NODE_CAPACITY):
+        '''plots — список (id, [кольцо, ...]), кольца — точки [lat, lng]'''
+        plots = [(pid, [r for r in map(open_ring, rings) if len(r) >= 3]) for pid, rings in plots]
+        plots = [(pid, rings) for pid, rings in plots if rings]
+
+        boxes = np.array([
+            (min(p[0] for r in rings for p in r), min(p[1] for r in rings for p in r),
+             max(p[0] for r in rings for p in r), max(p[1] for r in rings for p in r))
+            for _, rings in plots
+        ], dtype=float).reshape(-1, 4)
+        order = str_order(boxes, capacity)
+        plots = [plots[k] for k in order]
+
+        self.ids = np.array([pid for pid, _ in plots], dtype=np.int64)
+        self.boxes = boxes[order]
+
+        # Вершины всех колец подряд; кольца и участки — диапазоны в этих массивах
+        ring_lengths = [len(r) for _, rings in plots for r in rings]
+        coords = np.array([p for _, rings in plots for r in rings for p in r], dtype=float).reshape(-1, 2)
+        self.lat, self.lng = coords[:, 0], coords[:, 1]
+        self.ring_start = np.concatenate(([0], np.cumsum(ring_lengths)[:-1])).astype(np.int64)
+        self.ring_count = np.array(ring_lengths, dtype=np.int64)
+        self.next_vertex = np.arange(len(self.lat)) + 1
+        if len(ring_lengths):
+            self.next_vertex[self.ring_start + self.ring_count - 1] = self.ring_start
+        rings_per_plot = np.array([len(rings) for _, rings in plots], dtype=np.int64)
+        self.plot_ring_start = np.concatenate(([0], np.cumsum(rings_per_plot)[:-1])).astype(np.int64)
+        self.plot_ring_count = rings_per_plot
+        vertices_per_plot = np.array([sum(len(r) for r in rings) for _, rings in plots], dtype=np.int64)
+        self.plot_vertex_start = np.concatenate(([0], np.cumsum(vertices_per_plot)[:-1])).astype(np.int64)
+        self.plot_vertex_count = vertices_per_plot
+
+        # Уровни дерева снизу вверх: bbox узла и диапазон детей на уровне ниже
+        self.levels = []
+        level_boxes = self.boxes
+        while len(level_boxes) > capacity:
+            starts = np.arange(0, len(level_boxes), capacity)
+            counts = np.minimum(capacity, len(level_boxes) - starts)
+            node_boxes = np.column_stack([
+                np.minimum.reduceat(level_boxes[:, 0], starts),
+                np.minimum.reduceat(level_boxes[:, 1], starts),
+                np.maximum.reduceat(level_boxes[:, 2], starts),
+                np.maximum.reduceat(level_boxes[:, 3], starts),
+            ])
+            node_order = str_order(node_boxes, capacity)
+            self.levels.append((node_boxes[node_order], starts[node_order], counts[node_order]))
+            level_boxes = node_boxes[node_order]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def candidates(self, south, west, north, east):
+        '''Номера участков, чей bbox пересекает прямоугольник'''
+        nodes = None
+        for boxes, starts, counts in reversed(self.levels):
+            nodes = np.arange(len(boxes)) if nodes is None else nodes
+            nodes = nodes[intersects(boxes[nodes], south, west, north, east)]
+            nodes = expand(starts[nodes], counts[nodes])
+        plots = np.arange(len(self.ids)) if nodes is None else nodes
+        return plots[intersects(self.boxes[plots], south, west, north, east)]
+
+    def _point_in_plots(self, plots, lat, lng):
+        '''Точка внутри участков plots (чётность пересечений по всем кольцам)'''
+        if len(plots) == 0:
+            return np.zeros(0, dtype=bool)
+        rings = expand(self.plot_ring_start[plots], self.plot_ring_count[plots])
+        edges = expand(self.ring_start[rings], self.ring_count[rings])
+        y1, x1 = self.lat[edges], self.lng[edges]
+        y2, x2 = self.lat[self.next_vertex[edges]], self.lng[self.next_vertex[edges]]
+        straddles = (y1 > lat) != (y2 > lat)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            crossing = straddles & (lng < (x2 - x1) * (lat - y1) / (y2 - y1) + x1)
+        ring_offsets = np.concatenate(([0], np.cumsum(self.ring_count[rings])[:-1]))
+        inside_ring = np.add.reduceat(crossing.astype(np.int64), ring_offsets) % 2 == 1
+        plot_offsets = np.concatenate(([0], np.cumsum(self.plot_ring_count[plots])[:-1]))
+        return np.logical_or.reduceat(inside_ring, plot_offsets)
+
+    def contains(self, lat, lng):
+        '''id участков, содержащих точку'''
+        plots = self.candidates(lat, lng, lat, lng)
+        return self.ids[plots[self._point_in_plots(plots, lat, lng)]].tolist()
+
+    def within(self, polygon, intersecting=False):
+        '''id участков внутри полигона [[lat, lng], ...] (или пересекающих его)'''
+        ring = open_ring(polygon)
+        if len(ring) < 3:
+            raise ValueError('polygon needs at least 3 points')
+        q = np.array(ring, dtype=float)
+        south, west = q.min(axis=0)
+        north, east = q.max(axis=0)
+
+        plots = self.candidates(south, west, north, east)
+        if not intersecting:
+            boxes = self.boxes[plots]
+            plots = plots[(boxes[:, 0] >= south) & (boxes[:, 1] >= west) & (boxes[:, 2] <= north) & (boxes[:, 3] <= east)]
+        if len(plots) == 0:
+            return []
+
+        vertices = expand(self.plot_vertex_start[plots], self.plot_vertex_count[plots])
+        inside, crossed = self._against_polygon(vertices, q)
+        offsets = np.concatenate(([0], np.cumsum(self.plot_vertex_count[plots])[:-1]))
+        any_crossed = np.logical_or.reduceat(crossed, offsets)
+        if intersecting:
+            # Полигон целиком внутри участка: его вершина лежит в участке
+            hit = np.logical_or.reduceat(inside, offsets) | any_crossed | self._point_in_plots(plots, *ring[0])
+        else:
+            hit = np.logical_and.reduceat(inside, offsets) & ~any_crossed
+        return self.ids[plots[hit]].tolist()
+
+    def _against_polygon(self, vertices, q):
+        '''Для вершин участков: внутри ли полигона q и пересекает ли его ребро, начатое в вершине'''
+        qy1, qx1 = q[:, 0], q[:, 1]
+        qy2, qx2 = np.roll(qy1, -1), np.roll(qx1, -1)
+        inside = np.zeros(len(vertices), dtype=bool)
+        crossed = np.zeros(len(vertices), dtype=bool)
+        step = max(1, MATRIX_CHUNK // len(q))
+        for s in range(0, len(vertices), step):
+            v = vertices[s:s + step]
+            py, px = self.lat[v][:, None], self.lng[v][:, None]
+            ny, nx = self.lat[self.next_vertex[v]][:, None], self.lng[self.next_vertex[v]][:, None]
+
+            straddles = (qy1 > py) != (qy2 > py)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                crossing = straddles & (px < (qx2 - qx1) * (py - qy1) / (qy2 - qy1) + qx1)
+            inside[s:s + step] = crossing.sum(axis=1) % 2 == 1
+
+            # Собственное пересечение ребра участка с ребром полигона
+            d1 = (qx2 - qx1) * (py - qy1) - (qy2 - qy1) * (px - qx1)
+            d2 = (qx2 - qx1) * (ny - qy1) - (qy2 - qy1) * (nx - qx1)
+            d3 = (nx - px) * (qy1 - py) - (ny - py) * (qx1 - px)
+            d4 = (nx - px) * (qy2 - py) - (ny - py) * (qx2 - px)
+            crossed[s:s + step] = ((d1 * d2 < 0) & (d3 * d4 < 0)).any(axis=1)
+        return inside, crossed
+
+
+def load_plots(conn):
+    '''Участки с посчитанной геометрией: (id, кольца)'''
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute('''
+            SELECT id, boundary, boundary_parts FROM landplots
+            WHERE bbox_south IS NOT NULL
+        ''')
+        rows = cur.fetchall()
+    conn.commit()
+    return [(row['id'], row['boundary_parts'] or [row['boundary']]) for row in rows]
+
+
+def get_index(lazy_conn, version):
+    '''Индекс для текущей версии данных; перестраивается после изменений landplots'''
+    global _current
+    with _lock:
+        if _current is not None and _current[0] == version:
+            return _current[1]
+
+    index = SpatialIndex(load_plots(lazy_conn.get()))
+
+    with _lock:
+        _current = (version, index)
+    return index
+
+
+def sequential_contains(plots, lat, lng):
+    '''Последовательный просмотр: bbox и чётность пересечений по каждому участку'''
+    found = []
+    for pid, rings in plots:
+        inside = False
+        for ring in rings:
+            lats = [p[0] for p in ring]
+            lngs = [p[1] for p in ring]
+            if not (min(lats) <= lat <= max(lats) and min(lngs) <= lng <= max(lngs)):
+                continue
+            n = len(ring)
+            for i in range(n):
+                y1, x1 = ring[i]
+                y2, x2 = ring[(i + 1) % n]
+                if (y1 > lat) != (y2 > lat) and lng < (x2 - x1) * (lat - y1) / (y2 - y1) + x1:
+                    inside = not inside
+        if inside:
+            found.append(pid)
+    return found
+
+
+def benchmark(plot_count=20000, queries=500, seed=7):
+    '''Время запросов contains по индексу и последовательным просмотром'''
+    import random
+    import time
+
+    rnd = random.Random(seed)
+    plots = []
+    for pid in range(plot_count):
+        lat, lng = rnd.uniform(54.5, 56.5), rnd.uniform(36.5, 39.0)
+        size = rnd.uniform(0.0005, 0.005)
+        sides = rnd.randint(4, 24)
+        ring = [(lat + size * math.sin(2 * math.pi * k / sides), lng + size * math.cos(2 * math.pi * k / sides))
+                for k in range(sides)]
+        plots.append((pid, [ring]))
+    points = [(rnd.uniform(54.5, 56.5), rnd.uniform(36.5, 39.0)) for _ in range(queries)]
+
+    started = time.perf_counter()
+    index = SpatialIndex(plots)
+    build = time.perf_counter() - started
+
+    started = time.perf_counter()
+    indexed = [sorted(index.contains(lat, lng)) for lat, lng in points]
+    indexed_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    scanned = [sorted(sequential_contains(plots, lat, lng)) for lat, lng in points]
+    scan_time = time.perf_counter() - started
+
+    assert indexed == scanned, 'index and sequential scan disagree'
+    print(f'{plot_count} plots, {queries} point queries, {sum(map(len, indexed))} hits')
+    print(f'build:           {build * 1000:.1f} ms')
+    print(f'R-tree contains: {indexed_time / queries * 1000:.3f} ms/query')
+    print(f'sequential scan: {scan_time / queries * 1000:.3f} ms/query')
+
+
+if __name__ == '__main__':
+    benchmark()
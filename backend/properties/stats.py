@@ -0,0 +1,215 @@
+"""Агрегированная статистика участков для панели администратора
+
+Итоги, разрезы по статусу/типу/региону и гистограммы считаются в БД через
+GROUPING SETS за один проход по отфильтрованной выборке. Результат хранится в
+LRU тёплого инстанса под ключом (роль, подпись фильтров, интервалы) и
+действителен, пока не изменились версия данных landplots и версии настроек.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+from psycopg2.extras import RealDictCursor
+
+import change_feed
+import config_cache
+
+STATS_CACHE_MAX_ENTRIES = int(os.environ.get('STATS_CACHE_MAX_ENTRIES', '64'))
+DEFAULT_BIN_COUNT = 10
+MAX_BIN_EDGES = 50
+
+# Измерения для разрезов; регион с префиксом lyr_ — служебный слой, не регион
+DIMENSIONS = {
+    'status': 'status',
+    'type': 'type',
+    'region': (
+        "CASE WHEN jsonb_typeof(attributes->'region') = 'string' "
+        "AND attributes->>'region' NOT LIKE 'lyr\\_%%' THEN attributes->>'region' END"
+    ),
+}
+
+_results = OrderedDict()
+_lock = threading.Lock()
+
+
+def parse_edges(raw):
+    '''Границы интервалов гистограммы из строки вида "0,1000000,5000000"'''
+    if not raw:
+        return None
+    edges = sorted({float(x) for x in raw.split(',') if x.strip()})
+    if not edges or len(edges) > MAX_BIN_EDGES:
+        raise ValueError('invalid bin edges')
+    return tuple(edges)
+
+
+def data_version(lazy_conn):
+    '''Версия данных landplots: из LISTEN, а без слушателя — из последовательности ленты'''
+    if lazy_conn.route == 'replica':
+        # Уведомления приходят с основной БД раньше, чем реплика применит
+        # изменения, — версия по ленте самой реплики
+        with lazy_conn.get().cursor() as cur:
+            cur.execute('SELECT COALESCE(MAX(id), 0) FROM change_feed')
+            return cur.fetchone()[0]
+    if change_feed.listening():
+        return change_feed.landplots_version()
+    with lazy_conn.get().cursor() as cur:
+        cur.execute('SELECT last_value FROM change_feed_id_seq')
+        return cur.fetchone()[0]
+
+
+def get_or_compute(lazy_conn, key, tables, compute):
+    '''Результат из кэша, если не изменились ни данные, ни настройки tables'''
+    config_versions = config_cache.table_versions(lazy_conn, tables)
+    if config_versions is None:
+        return compute(lazy_conn.get())
+    versions = (data_version(lazy_conn), config_versions)
+
+    with _lock:
+        entry = _results.get(key)
+        if entry is not None and entry[0] == versions:
+            _results.move_to_end(key)
+            return entry[1]
+
+    value = compute(lazy_conn.get())
+
+    with _lock:
+        _results[key] = (versions, value)
+        _results.move_to_end(key)
+        while len(_results) > STATS_CACHE_MAX_ENTRIES:
+            _results.popitem(last=False)
+
+    return value
+
+
+def auto_edges(low, high):
+    '''Равные интервалы между минимумом и максимумом'''
+    if low is None or high is None:
+        return None
+    if high <= low:
+        return (low,)
+    step = (high - low) / DEFAULT_BIN_COUNT
+    return tuple(low + step * i for i in range(DEFAULT_BIN_COUNT)) + (high,)
+
+
+def histogram(counts, edges, inclusive_last):
+    '''Интервалы [from, to) по номерам width_bucket; 0 и len(edges) — хвосты'''
+    counts = dict(counts)
+    n = len(edges)
+    if inclusive_last and n > 1 and n in counts:
+        # Для автоматических границ максимум попадает в последний интервал, а не в хвост
+        counts[n - 1] = counts.get(n - 1, 0) + counts.pop(n)
+    bins = []
+    for bucket in range(n + 1):
+        count = counts.get(bucket, 0)
+        if bucket in (0, n) and not count:
+            continue
+        bins.append({
+            'from': edges[bucket - 1] if bucket > 0 else None,
+            'to': edges[bucket] if bucket < n else None,
+            'count': count,
+        })
+    return bins
+
+
+def compute_stats(conn, where, args, projection, price_edges=None, area_edges=None):
+    '''Итоги, разрезы и гистограммы по выборке WHERE where'''
+    dims = [d for d in DIMENSIONS if d not in projection.hidden_attributes]
+    # Проекция может скрыть все измерения — тогда остаются одни итоги
+    dim_columns = ''.join(f'{d}, ' for d in dims)
+    dim_select = ''.join(f'{DIMENSIONS[d]} AS {d}, ' for d in dims)
+    grouping = f"GROUPING({', '.join(dims)})" if dims else '0'
+    grouping_sets = ', '.join(['()'] + [f'({d})' for d in dims])
+
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(f'''
+            SELECT {dim_columns}{grouping} AS grp,
+                   COUNT(*) AS count,
+                   COALESCE(SUM(price), 0) AS total_price,
+                   COALESCE(SUM(area), 0) AS total_area,
+                   COUNT(*) FILTER (WHERE has_boundary) AS with_boundary,
+                   MIN(price) AS min_price, MAX(price) AS max_price,
+                   MIN(area) AS min_area, MAX(area) AS max_area
+            FROM (
+                SELECT {dim_select}price, area,
+                       CASE WHEN jsonb_typeof(boundary) = 'array'
+                            THEN jsonb_array_length(boundary) > 0 ELSE FALSE END AS has_boundary
+                FROM landplots
+                WHERE {where}
+            ) p
+            GROUP BY GROUPING SETS ({grouping_sets})
+        ''', args)
+        rows = cur.fetchall()
+
+        cur.execute(f'''
+            SELECT seg AS segment, COUNT(*) AS count
+            FROM (
+                SELECT CASE jsonb_typeof(attributes->'segment')
+                    WHEN 'array' THEN ARRAY(
+                        SELECT DISTINCT jsonb_array_elements_text(attributes->'segment'))
+                    WHEN 'string' THEN ARRAY(
+                        SELECT DISTINCT btrim(s, ' "[]')
+                        FROM unnest(string_to_array(attributes->>'segment', ',')) s)
+                    ELSE ARRAY[segment]
+                END AS segments
+                FROM landplots
+                WHERE {where}
+            ) p, unnest(p.segments) seg
+            WHERE seg <> ''
+            GROUP BY seg
+        ''', args)
+        by_segment = {r['segment']: r['count'] for r in cur.fetchall()}
+
+        total_mask = (1 << len(dims)) - 1
+        totals = next(r for r in rows if r['grp'] == total_mask)
+        breakdowns = {f'by_{d}': {} for d in dims}
+        for row in rows:
+            for i, d in enumerate(dims):
+                # Бит измерения сброшен — строка относится к его набору группировки
+                if row['grp'] == total_mask & ~(1 << (len(dims) - 1 - i)) and row[d] is not None:
+                    breakdowns[f'by_{d}'][row[d]] = {
+                        'count': row['count'],
+                        'total_price': float(row['total_price']),
+                        'total_area': float(row['total_area']),
+                    }
+
+        min_price = float(totals['min_price']) if totals['min_price'] is not None else None
+        max_price = float(totals['max_price']) if totals['max_price'] is not None else None
+        min_area = float(totals['min_area']) if totals['min_area'] is not None else None
+        max_area = float(totals['max_area']) if totals['max_area'] is not None else None
+
+        histograms = {'price': [], 'area': []}
+        price_bins = price_edges or auto_edges(min_price, max_price)
+        area_bins = area_edges or auto_edges(min_area, max_area)
+        if price_bins and area_bins:
+            cur.execute(f'''
+                SELECT pb, ab, GROUPING(pb, ab) AS grp, COUNT(*) AS count
+                FROM (
+                    SELECT width_bucket(price::float8, %s::float8[]) AS pb,
+                           width_bucket(area::float8, %s::float8[]) AS ab
+                    FROM landplots
+                    WHERE {where}
+                ) h
+                GROUP BY GROUPING SETS ((pb), (ab))
+            ''', [list(price_bins), list(area_bins)] + args)
+            price_counts = {}
+            area_counts = {}
+            for row in cur.fetchall():
+                if row['grp'] == 1:
+                    price_counts[row['pb']] = row['count']
+                else:
+                    area_counts[row['ab']] = row['count']
+            histograms['price'] = histogram(price_counts, price_bins, price_edges is None)
+            histograms['area'] = histogram(area_counts, area_bins, area_edges is None)
+
+    result = {
+        'total': totals['count'],
+        'total_price': float(totals['total_price']),
+        'total_area': float(totals['total_area']),
+        'with_boundary': totals['with_boundary'],
+        'price_range': {'min': min_price, 'max': max_price},
+        'area_range': {'min': min_area, 'max': max_area},
+        'by_segment': by_segment,
+        'histograms': histograms,
+    }
+    result.update(breakdowns)
+    return result
@@ -0,0 +1,114 @@
+"""Выгрузка таблицы участков в CSV и XLSX
+
+Строки читаются из именованного (серверного) курсора пачками по
+EXPORT_BATCH_SIZE и сразу пишутся в файл: CSV — построчно, XLSX — через
+xlsxwriter в режиме constant_memory, который сбрасывает каждую строку на диск.
+В памяти одновременно находится только одна пачка строк.
+"""
+import csv
+import os
+import tempfile
+
+import xlsxwriter
+from psycopg2.extras import RealDictCursor
+
+from conditional_display import js_string
+
+EXPORT_BATCH_SIZE = 2000
+TITLE_LABEL = 'Название'
+SHEET_NAME = 'Объекты'
+CSV_DELIMITER = ';'  # Excel с русской локалью ожидает точку с запятой
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def load_column_labels(conn):
+    '''Подписи колонок: display_configs, затем attribute_config'''
+    with conn.cursor() as cur:
+        cur.execute("SELECT config_key, display_name FROM display_configs WHERE config_type = 'attribute'")
+        labels = dict(cur.fetchall())
+        cur.execute('SELECT attribute_key, display_name FROM attribute_config')
+        for key, name in cur.fetchall():
+            labels.setdefault(key, name)
+    labels['title'] = TITLE_LABEL
+    return labels
+
+
+def cell_value(prop, key):
+    '''Значение ячейки как в getCellValue (useTableLogic.ts)'''
+    if key == 'title':
+        return prop.get('title') or ''
+    value = (prop.get('attributes') or {}).get(key)
+    if isinstance(value, list):
+        return ', '.join(js_string(v) for v in value)
+    if isinstance(value, bool):
+        return 'Да' if value else 'Нет'
+    if value is None:
+        return ''
+    if isinstance(value, (int, float)):
+        # Числа в XLSX остаются числами, как при выгрузке из браузера
+        return value
+    return js_string(value)
+
+
+def iter_rows(conn, where, args, order_by, order_args, projection):
+    '''Участки из серверного курсора с применённой проекцией'''
+    with conn.cursor(name='table_export', cursor_factory=RealDictCursor) as cur:
+        cur.itersize = EXPORT_BATCH_SIZE
+        cur.execute(f'''
+            SELECT id, title, attributes
+            FROM landplots
+            WHERE {where}
+            ORDER BY {order_by}
+        ''', args + order_args)
+        for row in cur:
+            prop = projection.apply({'id': row['id'], 'title': row['title'], 'attributes': row['attributes'] or {}})
+            if prop is not None:
+                yield prop
+
+
+def write_csv(rows, columns, labels, path):
+    with open(path, 'w', newline='', encoding='utf-8-sig') as fh:
+        writer = csv.writer(fh, delimiter=CSV_DELIMITER)
+        writer.writerow([labels.get(key, key) for key in columns])
+        for prop in rows:
+            writer.writerow([js_string(cell_value(prop, key)) for key in columns])
+
+
+def write_xlsx(rows, columns, labels, path):
+    workbook = xlsxwriter.Workbook(path, {
+        'constant_memory': True,
+        'tmpdir': tempfile.gettempdir(),
+        'strings_to_numbers': False,
+        'strings_to_formulas': False,
+        'strings_to_urls': False,
+    })
+    sheet = workbook.add_worksheet(SHEET_NAME)
+    for col, key in enumerate(columns):
+        label = labels.get(key, key)
+        sheet.set_column(col, col, max(len(label), 15))
+        sheet.write_string(0, col, label)
+    for row_index, prop in enumerate(rows, start=1):
+        for col, key in enumerate(columns):
+            value = cell_value(prop, key)
+            if isinstance(value, (int, float)):
+                sheet.write_number(row_index, col, value)
+            elif value:
+                sheet.write_string(row_index, col, value)
+    workbook.close()
+
+
+def export_table(conn, fmt, columns, labels, where, args, order_by, order_args, projection):
+    '''Сформировать файл выгрузки и вернуть его содержимое'''
+    writer = write_xlsx if fmt == 'xlsx' else write_csv
+    fd, path = tempfile.mkstemp(suffix=f'.{fmt}')
+    os.close(fd)
+    try:
+        writer(iter_rows(conn, where, args, order_by, order_args, projection), columns, labels, path)
+        with open(path, 'rb') as fh:
+            return fh.read()
+    finally:
+        os.remove(path)
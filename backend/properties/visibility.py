@@ -0,0 +1,135 @@
+"""Серверная проекция видимых данных для вызывающего пользователя
+
+Правила видимости раньше применялись только во фронтенде. Проекция для роли
+компилируется один раз на версию attribute_config/display_configs/filter_config/
+edit_permissions и хранится в config_cache, поэтому на запрос остаётся только
+применить её.
+"""
+import json
+
+from psycopg2.extras import RealDictCursor
+
+import config_cache
+from conditional_display import compile_rules, hidden_by_rules, rule_from_format_options
+from filters import matches_filter
+
+FULL_ACCESS_ROLES = ('admin',)
+PROJECTION_TABLES = ['attribute_config', 'display_configs', 'filter_config', 'edit_permissions']
+
+
+class Projection:
+    '''Скомпилированные правила видимости для роли и компании'''
+
+    def __init__(self, hidden_attributes=(), hidden_filter_ids=(), enforced_filters=(),
+                 conditional_rules=()):
+        self.hidden_attributes = frozenset(hidden_attributes)
+        self.hidden_filter_ids = frozenset(hidden_filter_ids)
+        # (filter_id, attribute_path, default_values) скрытых фильтров применяются на сервере
+        self.enforced_filters = tuple(enforced_filters)
+        # (ключ, предикат) из conditionalDisplay — проверяются по атрибутам участка
+        self.conditional_rules = tuple(conditional_rules)
+
+    @property
+    def is_full(self):
+        return not self.hidden_attributes and not self.enforced_filters and not self.conditional_rules
+
+    def strip(self, prop):
+        '''Убрать скрытые и не прошедшие условия атрибуты из сериализованного участка'''
+        attrs = prop.get('attributes')
+        if not attrs or not (self.hidden_attributes or self.conditional_rules):
+            return prop
+        hidden = self.hidden_attributes
+        if self.conditional_rules:
+            # Условия считаются по полному набору атрибутов, как во фронтенде
+            hidden = hidden | hidden_by_rules(attrs, self.conditional_rules)
+        return dict(prop, attributes={k: v for k, v in attrs.items() if k not in hidden})
+
+    def apply(self, prop):
+        '''Участок после проекции или None, если он не проходит скрытые фильтры'''
+        for filter_id, attribute_path, values in self.enforced_filters:
+            if not matches_filter(prop, filter_id, attribute_path, values):
+                return None
+        return self.strip(prop)
+
+
+FULL_PROJECTION = Projection()
+
+
+def role_allows(visible_roles, role):
+    '''Та же проверка, что в AddPropertyDialog: пустой список — видно всем'''
+    if not visible_roles:
+        return True
+    if role in visible_roles:
+        return True
+    return role == 'vip' and 'admin' in visible_roles
+
+
+def compile_projection(conn, role, company_id):
+    '''Собрать проекцию для роли по текущим настройкам в БД'''
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute('SELECT attribute_key, visible_roles, format_options FROM attribute_config')
+        attribute_roles = {}
+        conditions = {}
+        for row in cur.fetchall():
+            attribute_roles[row['attribute_key']] = row['visible_roles']
+            conditions[row['attribute_key']] = rule_from_format_options(row['format_options'])
+
+        # display_configs учитываем только для ключей, которых нет в attribute_config
+        cur.execute(
+            "SELECT config_key, visible_roles, format_options FROM display_configs WHERE config_type = 'attribute'"
+        )
+        for row in cur.fetchall():
+            attribute_roles.setdefault(row['config_key'], row['visible_roles'])
+            conditions.setdefault(row['config_key'], rule_from_format_options(row['format_options']))
+
+        cur.execute('SELECT allowed_roles FROM edit_permissions ORDER BY id DESC LIMIT 1')
+        permissions = cur.fetchone()
+        editor_roles = list(permissions['allowed_roles']) if permissions else list(FULL_ACCESS_ROLES)
+
+        cur.execute('SELECT config_type, config FROM filter_config ORDER BY id')
+        filter_rows = {}
+        for row in cur.fetchall():
+            config = json.loads(row['config']) if isinstance(row['config'], str) else row['config']
+            filter_rows.setdefault(row['config_type'], config)
+
+    hidden_attributes = {
+        key for key, roles in attribute_roles.items() if not role_allows(list(roles or []), role)
+    }
+
+    hidden_filter_ids = set()
+    for rule in (filter_rows.get('filter_visibility') or {}).get('rules', []):
+        if role in rule.get('hiddenForRoles', []) or company_id in rule.get('hiddenForCompanies', []):
+            hidden_filter_ids.add(rule.get('filterId'))
+
+    enforced_filters = []
+    for setting in filter_rows.get('filters') or []:
+        path = setting.get('attributePath', '')
+        attr_key = path[len('attributes.'):] if path.startswith('attributes.') else None
+        # Фильтр по скрытому атрибуту пользователю бесполезен — скрываем и его
+        if attr_key and attr_key in hidden_attributes:
+            hidden_filter_ids.add(setting.get('id'))
+        if setting.get('id') in hidden_filter_ids:
+            if attr_key:
+                hidden_attributes.add(attr_key)
+            # Значения по умолчанию скрытого фильтра клиент больше не применит — применяем здесь
+            if setting.get('defaultValues'):
+                enforced_filters.append((setting.get('id'), path, list(setting['defaultValues'])))
+
+    if role in editor_roles:
+        # PUT в update-attributes перезаписывает весь документ attributes, поэтому
+        # редактор должен получать его целиком, иначе сохранение сотрёт скрытые поля
+        return Projection((), hidden_filter_ids, enforced_filters)
+
+    return Projection(hidden_attributes, hidden_filter_ids, enforced_filters, compile_rules(conditions))
+
+
+def get_projection(lazy_conn, caller):
+    '''Проекция для вызывающего; компилируется один раз на версию настроек'''
+    if caller and caller['role'] in FULL_ACCESS_ROLES:
+        return FULL_PROJECTION
+    role = caller['role'] if caller else None
+    company_id = caller['id'] if caller else None
+    return config_cache.get_or_load(
+        ('projection', role, company_id), PROJECTION_TABLES, lazy_conn,
+        lambda conn: compile_projection(conn, role, company_id)
+    )
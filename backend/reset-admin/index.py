@@ -3,7 +3,7 @@ import json
 import os
 import psycopg2
 from psycopg2.extras import RealDictCursor
-import bcrypt
+import passwords
 
 def handler(event: dict, context) -> dict:
     method = event.get('httpMethod', 'GET')
@@ -33,7 +33,7 @@ def handler(event: dict, context) -> dict:
         schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
         
         password = 'admin123'
-        password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        password_hash = passwords.hash_password(password)
         
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
             cur.execute(f"""
@@ -5,6 +5,7 @@ import json
 import os
 import psycopg2
 from psycopg2.extras import RealDictCursor
+import config_cache
 
 def handler(event: dict, context) -> dict:
     """Управление настройками приложения (логотип, заголовок и т.д.)"""
@@ -16,7 +17,7 @@ def handler(event: dict, context) -> dict:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
+                'Access-Control-Allow-Headers': 'Content-Type, X-DB-Version'
             },
             'body': '',
             'isBase64Encoded': False
@@ -31,23 +32,13 @@ def handler(event: dict, context) -> dict:
             'isBase64Encoded': False
         }
 
-    conn = psycopg2.connect(dsn)
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-
     if method == 'GET':
         # Получить все настройки
-        cur.execute("SELECT setting_key, setting_value FROM app_settings")
-        rows = cur.fetchall()
-        
-        settings = {}
-        for row in rows:
-            try:
-                settings[row['setting_key']] = json.loads(row['setting_value'])
-            except:
-                settings[row['setting_key']] = row['setting_value']
-        
-        cur.close()
-        conn.close()
+        lazy_conn = config_cache.reader(event, dsn)
+        try:
+            settings = config_cache.get_or_load(('app_settings',), ['app_settings'], lazy_conn, load_settings)
+        finally:
+            lazy_conn.close()
         
         return {
             'statusCode': 200,
@@ -56,7 +47,10 @@ def handler(event: dict, context) -> dict:
             'isBase64Encoded': False
         }
 
-    elif method == 'PUT':
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+
+    if method == 'PUT':
         # Обновить настройки
         body = json.loads(event.get('body', '{}'))
         
@@ -73,13 +67,14 @@ def handler(event: dict, context) -> dict:
         conn.commit()
         cur.close()
         conn.close()
+        config_cache.invalidate('app_settings')
         
-        return {
+        return config_cache.mark_write({
             'statusCode': 200,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'body': json.dumps({'success': True}),
             'isBase64Encoded': False
-        }
+        })
 
     cur.close()
     conn.close()
@@ -90,3 +85,17 @@ def handler(event: dict, context) -> dict:
         'body': json.dumps({'error': 'Method not allowed'}),
         'isBase64Encoded': False
     }
+
+
+def load_settings(conn):
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("SELECT setting_key, setting_value FROM app_settings")
+        rows = cur.fetchall()
+    
+    settings = {}
+    for row in rows:
+        try:
+            settings[row['setting_key']] = json.loads(row['setting_value'])
+        except:
+            settings[row['setting_key']] = row['setting_value']
+    return settings
@@ -1,7 +1,8 @@
 import json
 import os
-import psycopg2
 from psycopg2.extras import RealDictCursor
+import config_cache
+import session_tokens
 
 def handler(event: dict, context) -> dict:
     '''API для управления атрибутами и их настройками'''
@@ -15,18 +16,50 @@ def handler(event: dict, context) -> dict:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
+                'Access-Control-Allow-Headers': 'Content-Type, X-Authorization, X-DB-Version'
             },
             'body': '',
             'isBase64Encoded': False
         }
     
+    response = dispatch(event, method, query_params)
+    if method != 'GET':
+        # Метка записи: следующие GET этого клиента пойдут на основную БД
+        config_cache.mark_write(response)
+    return response
+
+def dispatch(event, method, query_params):
+    '''Обработка запроса после OPTIONS'''
     dsn = os.environ.get('DATABASE_URL')
     if not dsn:
         return error_response('DATABASE_URL not configured', 500)
     
     try:
-        conn = psycopg2.connect(dsn)
+        lazy_conn = config_cache.LazyConnection(dsn)
+        
+        # Handle edit permissions requests
+        if query_params.get('type') == 'edit_permissions':
+            if method == 'GET':
+                result = config_cache.get_or_load(
+                    ('edit_permissions',), ['edit_permissions'], lazy_conn, get_edit_permissions
+                )
+            elif method == 'POST':
+                body = json.loads(event.get('body', '{}'))
+                result = save_edit_permissions(lazy_conn.get(), body)
+                config_cache.invalidate('edit_permissions')
+            else:
+                result = error_response('Method not allowed', 405)
+            lazy_conn.close()
+            return result
+        
+        if query_params.get('type') == 'config' and method == 'GET':
+            result = config_cache.get_or_load(
+                ('attribute_config',), ['attribute_config'], lazy_conn, get_attribute_configs
+            )
+            lazy_conn.close()
+            return result
+        
+        conn = lazy_conn.get()
         
         # Handle attribute key renaming
         if query_params.get('action') == 'rename_key':
@@ -56,35 +89,27 @@ def handler(event: dict, context) -> dict:
         if query_params.get('action') == 'sync_configs':
             if method == 'POST':
                 body = json.loads(event.get('body', '{}'))
-                return sync_attribute_configs(conn, body)
-            else:
-                return error_response('Method not allowed', 405)
-        
-        # Handle edit permissions requests
-        if query_params.get('type') == 'edit_permissions':
-            if method == 'GET':
-                return get_edit_permissions(conn)
-            elif method == 'POST':
-                body = json.loads(event.get('body', '{}'))
-                return save_edit_permissions(conn, body)
+                result = sync_attribute_configs(conn, body)
+                config_cache.invalidate('attribute_config')
+                return result
             else:
                 return error_response('Method not allowed', 405)
         
         # Handle attribute config requests
         if query_params.get('type') == 'config':
-            if method == 'GET':
-                return get_attribute_configs(conn)
-            elif method == 'POST':
+            if method == 'POST':
                 body = json.loads(event.get('body', '{}'))
                 if 'updates' in body:
-                    return batch_update_order(conn, body['updates'])
+                    result = batch_update_order(conn, body['updates'])
                 else:
-                    return update_single_config(conn, body)
+                    result = update_single_config(conn, body)
             elif method == 'PUT':
                 body = json.loads(event.get('body', '{}'))
-                return update_single_config(conn, body)
+                result = update_single_config(conn, body)
             else:
                 return error_response('Method not allowed', 405)
+            config_cache.invalidate('attribute_config')
+            return result
         
         # Handle property attribute updates (original functionality)
         if method != 'PUT':
@@ -101,14 +126,20 @@ def handler(event: dict, context) -> dict:
         print(f'📝 Updating property {property_id}')
         print(f'📝 Received attributes: {json.dumps(attributes, ensure_ascii=False)[:500]}')
         
+        name_value = attributes.get('name', '')
+        title = name_value if name_value and name_value != '""' else None
+        caller = session_tokens.resolve_caller(lazy_conn, event)
+        
         try:
+            set_actor(conn, caller)
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                # Атрибуты и название одним UPDATE — одна версия в истории на сохранение
                 cur.execute('''
                     UPDATE t_p78972315_landgis_creator.landplots
-                    SET attributes = %s, updated_at = CURRENT_TIMESTAMP
+                    SET attributes = %s, title = COALESCE(%s::text, title), updated_at = CURRENT_TIMESTAMP
                     WHERE id = %s
                     RETURNING id, attributes
-                ''', (json.dumps(attributes), int(property_id)))
+                ''', (json.dumps(attributes), title, int(property_id)))
                 
                 row = cur.fetchone()
                 
@@ -122,14 +153,6 @@ def handler(event: dict, context) -> dict:
                         'isBase64Encoded': False
                     }
                 
-                name_value = attributes.get('name', '')
-                if name_value and name_value != '""':
-                    cur.execute('''
-                        UPDATE t_p78972315_landgis_creator.landplots
-                        SET title = %s
-                        WHERE id = %s
-                    ''', (name_value, int(property_id)))
-                
                 conn.commit()
                 
                 result = {
@@ -145,6 +168,12 @@ def handler(event: dict, context) -> dict:
     except Exception as e:
         return error_response(str(e), 500)
 
+def set_actor(conn, caller):
+    '''Автор изменений текущей транзакции для триггера истории (как history.set_actor в properties)'''
+    if caller:
+        with conn.cursor() as cur:
+            cur.execute("SELECT set_config('landgis.company_id', %s, true)", (str(caller['account']),))
+
 def get_attribute_configs(conn):
     '''Получить настройки отображения атрибутов'''
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
@@ -0,0 +1,134 @@
+"""Подписанные токены сессии: проверка авторизации без обращения к companies
+
+Токен — base64url(JSON) и HMAC-SHA256 от него. В полезной нагрузке: id
+вошедшего аккаунта и его роль account_role, company — компания, от имени
+которой он работает (после переключения администратором), её role, name и
+login, версии токенов компании и аккаунта tv/atv, версия ключа подписи kid и
+срок exp. Секреты берутся из SESSION_SECRET_V<kid>: при ротации добавляется
+новый ключ и меняется SESSION_KEY_VERSION, старые токены действуют, пока
+задан их ключ.
+
+Отзыв — через companies.token_version (V0048): версия растёт при смене роли,
+пароля, логина, названия и деактивации. Небольшой список компаний с
+поднятой версией или выключенных хранится в config_cache и перечитывается
+только при изменении версии таблицы companies.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+
+import config_cache
+
+SESSION_TTL = int(os.environ.get('SESSION_TTL', str(12 * 3600)))
+
+
+class TokenError(Exception):
+    pass
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def _secret(kid):
+    secret = os.environ.get(f'SESSION_SECRET_V{kid}')
+    return secret.encode('utf-8') if secret else None
+
+
+def current_key_version():
+    return int(os.environ.get('SESSION_KEY_VERSION', '1'))
+
+
+def issue(account, company=None, now=None):
+    '''Токен для вошедшего account (dict из companies) от имени company'''
+    company = company or account
+    kid = current_key_version()
+    secret = _secret(kid)
+    if secret is None:
+        raise TokenError(f'SESSION_SECRET_V{kid} is not configured')
+    payload = {
+        'id': account['id'],
+        'company': company['id'],
+        'role': company['role'],
+        'name': company['name'],
+        'login': company['login'],
+        'account_role': account['role'],
+        'tv': company.get('token_version') or 1,
+        'atv': account.get('token_version') or 1,
+        'kid': kid,
+        'exp': int(now if now is not None else time.time()) + SESSION_TTL,
+    }
+    body = _b64encode(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+    signature = _b64encode(hmac.new(secret, body.encode('ascii'), hashlib.sha256).digest())
+    return f'{body}.{signature}'
+
+
+def decode(token, now=None):
+    '''Полезная нагрузка токена; TokenError при неверной подписи или истёкшем сроке'''
+    try:
+        body, signature = token.split('.')
+        payload = json.loads(_b64decode(body))
+        secret = _secret(int(payload['kid']))
+    except (ValueError, KeyError, TypeError):
+        raise TokenError('malformed token')
+    if secret is None:
+        raise TokenError('unknown key version')
+    expected = _b64encode(hmac.new(secret, body.encode('ascii'), hashlib.sha256).digest())
+    if not hmac.compare_digest(expected.encode('ascii'), signature.encode('utf-8')):
+        raise TokenError('bad signature')
+    if payload.get('exp', 0) < (now if now is not None else time.time()):
+        raise TokenError('token expired')
+    return payload
+
+
+def load_revocations(conn):
+    '''{id компании: token_version или None для выключенной}; обычные компании не попадают'''
+    with conn.cursor() as cur:
+        cur.execute('SELECT id, token_version, is_active FROM companies WHERE token_version > 1 OR NOT is_active')
+        rows = cur.fetchall()
+    conn.commit()
+    return {row[0]: (row[1] if row[2] else None) for row in rows}
+
+
+def is_revoked(payload, revocations):
+    # Проверяются и компания, и вошедший аккаунт: переключение не переживает
+    # отключение или смену роли администратора
+    for key, version in (('company', 'tv'), ('id', 'atv')):
+        current = revocations.get(payload[key], 1)
+        if current is None or payload.get(version, 1) < current:
+            return True
+    return False
+
+
+def verify(lazy_conn, token):
+    '''Полезная нагрузка действующего токена или None'''
+    try:
+        payload = decode(token)
+    except TokenError:
+        return None
+    revocations = config_cache.get_or_load(('token_revocations',), ['companies'], lazy_conn, load_revocations)
+    return None if is_revoked(payload, revocations) else payload
+
+
+def bearer_token(event):
+    headers = event.get('headers') or {}
+    auth_header = headers.get('X-Authorization') or headers.get('x-authorization') or ''
+    if not auth_header.startswith('Bearer '):
+        return None
+    return auth_header[len('Bearer '):]
+
+
+def resolve_caller(lazy_conn, event):
+    '''{id, role, account} компании из заголовка X-Authorization или None'''
+    token = bearer_token(event)
+    payload = verify(lazy_conn, token) if token else None
+    if payload is None:
+        return None
+    return {'id': payload['company'], 'role': payload['role'], 'account': payload['id']}
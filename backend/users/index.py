@@ -3,6 +3,16 @@ import json
 import os
 import psycopg2
 from psycopg2.extras import RealDictCursor
+import listing
+
+LIST_COLUMNS = {
+    'id': 'u.id', 'company_id': 'u.company_id', 'full_name': 'u.full_name', 'email': 'u.email',
+    'phone': 'u.phone', 'role': 'u.role', 'is_active': 'u.is_active',
+    'created_at': 'u.created_at', 'updated_at': 'u.updated_at', 'company_name': 'c.name',
+}
+# Совпадает с выражением индекса idx_users_search_trgm (V0049)
+SEARCH_EXPRESSION = "lower(u.full_name || ' ' || u.email)"
+PAGE_PARAMS = ('limit', 'cursor', 'fields', 'q', 'role', 'active', 'company_id')
 
 def handler(event: dict, context) -> dict:
     method = event.get('httpMethod', 'GET')
@@ -28,7 +38,7 @@ def handler(event: dict, context) -> dict:
             if user_id:
                 result = get_user(conn, int(user_id))
             else:
-                result = get_all_users(conn)
+                result = get_all_users(conn, params)
         elif method == 'POST':
             data = json.loads(event.get('body', '{}'))
             result = create_user(conn, data)
@@ -43,7 +53,18 @@ def handler(event: dict, context) -> dict:
     except Exception as e:
         return error_response(str(e), 500)
 
-def get_all_users(conn):
+def get_all_users(conn, params=None):
+    """Список пользователей
+
+    Без параметров — весь список, как раньше. С любым из limit, cursor,
+    fields, q, role, active, company_id — страница {items, next_cursor} по
+    имени: fields задаёт колонки, q ищет по имени и email. Компания
+    присоединяется, только если запрошено company_name.
+    """
+    params = params or {}
+    if any(params.get(p) for p in PAGE_PARAMS):
+        return get_users_page(conn, params)
+    
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
         cur.execute('''
             SELECT u.*, c.name as company_name
@@ -59,6 +80,39 @@ def get_all_users(conn):
             'isBase64Encoded': False
         }
 
+def get_users_page(conn, params):
+    try:
+        fields = listing.parse_fields(params.get('fields'), LIST_COLUMNS, LIST_COLUMNS)
+        limit = listing.parse_limit(params.get('limit'))
+        after = listing.decode_cursor(params['cursor'], 2) if params.get('cursor') else None
+        active = listing.parse_active(params.get('active'))
+        company_id = int(params['company_id']) if params.get('company_id') else None
+    except ValueError as e:
+        return error_response(f'Invalid parameters: {e}', 400)
+    
+    where, args = 'TRUE', []
+    if params.get('q', '').strip():
+        where, args = f'{where} AND {SEARCH_EXPRESSION} LIKE %s', args + [listing.search_pattern(params['q'])]
+    if params.get('role'):
+        where, args = f'{where} AND u.role = %s', args + [params['role']]
+    if active is not None:
+        where, args = f'{where} AND u.is_active = %s', args + [active]
+    if company_id is not None:
+        where, args = f'{where} AND u.company_id = %s', args + [company_id]
+    
+    source = 'users u'
+    if 'company_name' in fields:
+        source = 'users u LEFT JOIN companies c ON u.company_id = c.id'
+    items, next_cursor = listing.fetch_page(
+        conn, source, LIST_COLUMNS, fields, where, args, ['full_name', 'id'], limit, after
+    )
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({'items': items, 'next_cursor': next_cursor}, default=str),
+        'isBase64Encoded': False
+    }
+
 def get_user(conn, user_id):
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
         cur.execute('''
@@ -0,0 +1,39 @@
+-- Версии конфигурационных таблиц для инвалидации кэша в тёплых инстансах функций
+CREATE TABLE IF NOT EXISTS config_versions (
+    table_name VARCHAR(100) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE OR REPLACE FUNCTION bump_config_version() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO config_versions (table_name, version, updated_at)
+    VALUES (TG_TABLE_NAME, 1, CURRENT_TIMESTAMP)
+    ON CONFLICT (table_name)
+    DO UPDATE SET version = config_versions.version + 1, updated_at = CURRENT_TIMESTAMP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Один триггер на оператор: массовые сохранения увеличивают версию один раз
+CREATE TRIGGER trg_app_settings_version AFTER INSERT OR UPDATE OR DELETE ON app_settings
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_config_version();
+CREATE TRIGGER trg_map_settings_version AFTER INSERT OR UPDATE OR DELETE ON map_settings
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_config_version();
+CREATE TRIGGER trg_display_configs_version AFTER INSERT OR UPDATE OR DELETE ON display_configs
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_config_version();
+CREATE TRIGGER trg_filter_config_version AFTER INSERT OR UPDATE OR DELETE ON filter_config
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_config_version();
+CREATE TRIGGER trg_polygon_style_config_version AFTER INSERT OR UPDATE OR DELETE ON polygon_style_config
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_config_version();
+CREATE TRIGGER trg_polygon_style_settings_version AFTER INSERT OR UPDATE OR DELETE ON polygon_style_settings
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_config_version();
+CREATE TRIGGER trg_attribute_config_version AFTER INSERT OR UPDATE OR DELETE ON attribute_config
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_config_version();
+CREATE TRIGGER trg_edit_permissions_version AFTER INSERT OR UPDATE OR DELETE ON edit_permissions
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_config_version();
+
+INSERT INTO config_versions (table_name) VALUES
+    ('app_settings'), ('map_settings'), ('display_configs'), ('filter_config'),
+    ('polygon_style_config'), ('polygon_style_settings'), ('attribute_config'), ('edit_permissions')
+ON CONFLICT (table_name) DO NOTHING;
@@ -0,0 +1,54 @@
+-- Лента изменений участков и конфигурации для long-poll клиентов и инвалидации кэшей
+CREATE TABLE IF NOT EXISTS change_feed (
+    id BIGSERIAL PRIMARY KEY,
+    table_name VARCHAR(100) NOT NULL,
+    row_id INTEGER,
+    op CHAR(1) NOT NULL,
+    changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_change_feed_changed_at ON change_feed(changed_at);
+
+-- Строковый триггер landplots: запись в ленту + компактное уведомление {s, t, i, o}
+CREATE OR REPLACE FUNCTION notify_landplot_change() RETURNS trigger AS $$
+DECLARE
+    changed_id INTEGER;
+    seq BIGINT;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        changed_id := OLD.id;
+    ELSE
+        changed_id := NEW.id;
+    END IF;
+
+    INSERT INTO change_feed (table_name, row_id, op)
+    VALUES (TG_TABLE_NAME, changed_id, left(TG_OP, 1))
+    RETURNING id INTO seq;
+
+    PERFORM pg_notify('landgis_changes', json_build_object(
+        's', seq, 't', TG_TABLE_NAME, 'i', changed_id, 'o', left(TG_OP, 1)
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_landplots_change_feed AFTER INSERT OR UPDATE OR DELETE ON landplots
+    FOR EACH ROW EXECUTE FUNCTION notify_landplot_change();
+
+-- Конфигурационные таблицы: к увеличению версии добавляем уведомление {t, v}
+CREATE OR REPLACE FUNCTION bump_config_version() RETURNS trigger AS $$
+DECLARE
+    new_version BIGINT;
+BEGIN
+    INSERT INTO config_versions (table_name, version, updated_at)
+    VALUES (TG_TABLE_NAME, 1, CURRENT_TIMESTAMP)
+    ON CONFLICT (table_name)
+    DO UPDATE SET version = config_versions.version + 1, updated_at = CURRENT_TIMESTAMP
+    RETURNING version INTO new_version;
+
+    PERFORM pg_notify('landgis_changes', json_build_object(
+        't', TG_TABLE_NAME, 'v', new_version
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,27 @@
+-- Поисковый документ участка: название, адрес, кадастровые атрибуты и регион
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Нечёткий поиск (опечатки в адресах) — по триграммам нормализованного текста
+ALTER TABLE landplots ADD COLUMN IF NOT EXISTS search_document TEXT
+    GENERATED ALWAYS AS (
+        lower(
+            coalesce(title, '') || ' ' ||
+            coalesce(location, '') || ' ' ||
+            coalesce(attributes->>'uchastok', '') || ' ' ||
+            coalesce(attributes->>'ID', '') || ' ' ||
+            coalesce(attributes->>'region', '')
+        )
+    ) STORED;
+
+-- Полнотекстовый поиск с русской морфологией; название весит больше адреса
+ALTER TABLE landplots ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(location, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(attributes->>'uchastok', '') || ' ' ||
+                                        coalesce(attributes->>'ID', '')), 'B') ||
+        setweight(to_tsvector('russian', coalesce(attributes->>'region', '')), 'C')
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_landplots_search_vector ON landplots USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_landplots_search_trgm ON landplots USING GIN (search_document gin_trgm_ops);
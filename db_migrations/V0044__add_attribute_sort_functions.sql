@@ -0,0 +1,50 @@
+-- Приведение значений атрибутов к типам для сортировки по attribute_config.format_type.
+-- Функции IMMUTABLE, чтобы по ним можно было строить индексы; некорректные
+-- значения дают NULL, а не ошибку.
+
+-- number/money: "1 250 000,50 ₽" -> 1250000.50
+CREATE OR REPLACE FUNCTION landplot_numeric(value TEXT) RETURNS NUMERIC AS $$
+DECLARE
+    cleaned TEXT;
+BEGIN
+    cleaned := replace(regexp_replace(value, '[^0-9,.-]', '', 'g'), ',', '.');
+    IF cleaned !~ '^-?[0-9]+(\.[0-9]+)?$' THEN
+        RETURN NULL;
+    END IF;
+    RETURN cleaned::numeric;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+-- date: dd.MM.yyyy или ISO yyyy-MM-dd
+CREATE OR REPLACE FUNCTION landplot_date(value TEXT) RETURNS DATE AS $$
+BEGIN
+    IF value ~ '^\d{2}\.\d{2}\.\d{4}$' THEN
+        RETURN make_date(substr(value, 7, 4)::int, substr(value, 4, 2)::int, substr(value, 1, 2)::int);
+    ELSIF value ~ '^\d{4}-\d{2}-\d{2}' THEN
+        RETURN make_date(substr(value, 1, 4)::int, substr(value, 6, 2)::int, substr(value, 9, 2)::int);
+    END IF;
+    RETURN NULL;
+EXCEPTION WHEN others THEN
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+-- toggle/boolean: JSON true/false, строки "true"/"false" (V0030) и "да"/"нет"
+CREATE OR REPLACE FUNCTION landplot_bool(value JSONB) RETURNS BOOLEAN AS $$
+    SELECT CASE
+        WHEN jsonb_typeof(value) = 'boolean' THEN value::text::boolean
+        WHEN lower(value #>> '{}') IN ('true', 'да', 'yes', '1') THEN TRUE
+        WHEN lower(value #>> '{}') IN ('false', 'нет', 'no', '0') THEN FALSE
+    END
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Индексы под сортировку с ключом (значение, id): ASC NULLS FIRST,
+-- обратный проход по тому же индексу даёт DESC NULLS LAST
+CREATE INDEX IF NOT EXISTS idx_landplots_sort_title ON landplots (lower(title) NULLS FIRST, id);
+CREATE INDEX IF NOT EXISTS idx_landplots_sort_price ON landplots (price NULLS FIRST, id);
+CREATE INDEX IF NOT EXISTS idx_landplots_sort_area ON landplots (area NULLS FIRST, id);
+CREATE INDEX IF NOT EXISTS idx_landplots_sort_created_at ON landplots (created_at NULLS FIRST, id);
+CREATE INDEX IF NOT EXISTS idx_landplots_sort_ekspos
+    ON landplots (landplot_numeric(attributes->>'ekspos') NULLS FIRST, id);
+CREATE INDEX IF NOT EXISTS idx_landplots_sort_date
+    ON landplots (landplot_date(attributes->>'date') NULLS FIRST, id);
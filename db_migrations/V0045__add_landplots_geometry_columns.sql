@@ -0,0 +1,23 @@
+-- Геометрия участка, посчитанная при записи границы (backend/properties/geometry.py):
+-- все части мультиполигона, центроид с весом по площади, геодезическая площадь
+-- в м², bbox и найденные при проверке проблемы контура
+ALTER TABLE landplots
+    ADD COLUMN IF NOT EXISTS boundary_parts JSONB,
+    ADD COLUMN IF NOT EXISTS centroid_lat DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS centroid_lng DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS geo_area_m2 DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS bbox_south DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS bbox_west DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS bbox_north DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS bbox_east DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS geometry_issues TEXT[];
+
+-- Запросы по пересечению с прямоугольником карты: встроенный тип box, без PostGIS
+CREATE INDEX IF NOT EXISTS idx_landplots_bbox ON landplots
+    USING GIST (box(point(bbox_west, bbox_south), point(bbox_east, bbox_north)))
+    WHERE bbox_south IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_landplots_centroid ON landplots (centroid_lat, centroid_lng)
+    WHERE centroid_lat IS NOT NULL;
+
+-- Существующие участки заполняет POST ?action=backfill-geometry (geometry_batch.py)
@@ -0,0 +1,18 @@
+-- Отчёт поиска дублей и наложений участков (backend/properties/duplicates.py).
+-- Пара хранится как plot_a < plot_b; повторный прогон обновляет метрики, но
+-- сохраняет решение администратора в status, а исчезнувшие пары удаляет.
+CREATE TABLE IF NOT EXISTS landplot_duplicates (
+    plot_a INTEGER NOT NULL REFERENCES landplots(id) ON DELETE CASCADE,
+    plot_b INTEGER NOT NULL REFERENCES landplots(id) ON DELETE CASCADE,
+    overlap_ratio DOUBLE PRECISION NOT NULL,
+    title_similarity DOUBLE PRECISION NOT NULL,
+    location_similarity DOUBLE PRECISION NOT NULL,
+    score DOUBLE PRECISION NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'open',
+    detected_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (plot_a, plot_b),
+    CHECK (plot_a < plot_b)
+);
+
+CREATE INDEX IF NOT EXISTS idx_landplot_duplicates_score ON landplot_duplicates (status, score DESC);
+CREATE INDEX IF NOT EXISTS idx_landplot_duplicates_plot_b ON landplot_duplicates (plot_b);
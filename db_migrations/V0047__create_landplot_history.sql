@@ -0,0 +1,110 @@
+-- История изменений участков: JSON Patch (RFC 6902) вместо полных снимков.
+-- Для каждого изменённого поля и атрибута пишется пара операций test (старое
+-- значение) и replace/add/remove (новое), поэтому изменение можно и показать,
+-- и откатить. Производные колонки (геометрия V0045, поиск V0043, updated_at)
+-- в историю не попадают — они пересчитываются из исходных.
+
+CREATE TABLE IF NOT EXISTS landplot_history (
+    id BIGSERIAL,
+    plot_id INTEGER NOT NULL,
+    op CHAR(1) NOT NULL,  -- I, U, D
+    patch JSONB NOT NULL,
+    changed_by INTEGER,
+    changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, changed_at)
+) PARTITION BY RANGE (changed_at);
+
+CREATE INDEX IF NOT EXISTS idx_landplot_history_plot ON landplot_history (plot_id, id);
+
+-- Партиции по месяцам; функцию периодически вызывает backend/properties, чтобы
+-- впереди всегда были готовые партиции, а DEFAULT оставалась пустой
+CREATE OR REPLACE FUNCTION ensure_landplot_history_partitions(months_ahead INT) RETURNS void AS $$
+DECLARE
+    month_start DATE;
+BEGIN
+    FOR i IN 0..months_ahead LOOP
+        month_start := (date_trunc('month', CURRENT_DATE) + make_interval(months => i))::date;
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF landplot_history FOR VALUES FROM (%L) TO (%L)',
+            'landplot_history_' || to_char(month_start, 'YYYY_MM'),
+            month_start,
+            (month_start + interval '1 month')::date
+        );
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT ensure_landplot_history_partitions(3);
+CREATE TABLE IF NOT EXISTS landplot_history_default PARTITION OF landplot_history DEFAULT;
+
+-- Операции JSON Patch для ключей верхнего уровня двух объектов
+CREATE OR REPLACE FUNCTION jsonb_patch_ops(prefix TEXT, old_doc JSONB, new_doc JSONB) RETURNS JSONB AS $$
+    SELECT COALESCE(jsonb_agg(op ORDER BY path, step), '[]'::jsonb)
+    FROM (
+        SELECT prefix || replace(replace(COALESCE(o.key, n.key), '~', '~0'), '/', '~1') AS path,
+               o.value AS old_value, n.value AS new_value
+        FROM jsonb_each(old_doc) o
+        FULL JOIN jsonb_each(new_doc) n ON n.key = o.key
+    ) fields, LATERAL (
+        SELECT 1 AS step, jsonb_build_object('op', 'test', 'path', path, 'value', old_value) AS op
+        WHERE old_value IS NOT NULL
+        UNION ALL
+        SELECT 2, CASE
+            WHEN new_value IS NULL THEN jsonb_build_object('op', 'remove', 'path', path)
+            WHEN old_value IS NULL THEN jsonb_build_object('op', 'add', 'path', path, 'value', new_value)
+            ELSE jsonb_build_object('op', 'replace', 'path', path, 'value', new_value)
+        END
+    ) ops
+    WHERE old_value IS DISTINCT FROM new_value
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Разница двух строк landplots (to_jsonb): колонки, а атрибуты — по ключам
+CREATE OR REPLACE FUNCTION landplot_patch(old_row JSONB, new_row JSONB) RETURNS JSONB AS $$
+    SELECT jsonb_patch_ops('/', COALESCE(old_row, '{}'::jsonb) - skipped, COALESCE(new_row, '{}'::jsonb) - skipped)
+        || jsonb_patch_ops(
+            '/attributes/',
+            CASE WHEN jsonb_typeof(old_row->'attributes') = 'object' THEN old_row->'attributes' ELSE '{}'::jsonb END,
+            CASE WHEN jsonb_typeof(new_row->'attributes') = 'object' THEN new_row->'attributes' ELSE '{}'::jsonb END
+        )
+    FROM (SELECT ARRAY[
+        'id', 'attributes', 'created_at', 'updated_at', 'search_document', 'search_vector',
+        'centroid_lat', 'centroid_lng', 'geo_area_m2',
+        'bbox_south', 'bbox_west', 'bbox_north', 'bbox_east', 'geometry_issues'
+    ] AS skipped) s
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Триггеры на оператор с таблицами переходов: массовое изменение атрибутов
+-- пишет историю одним INSERT ... SELECT. Автор — из set_config('landgis.company_id')
+CREATE OR REPLACE FUNCTION record_landplot_history() RETURNS trigger AS $$
+DECLARE
+    actor INTEGER := NULLIF(current_setting('landgis.company_id', true), '')::int;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        -- Вставка — база истории: полный снимок не нужен, откат вставки — удаление
+        INSERT INTO landplot_history (plot_id, op, patch, changed_by)
+        SELECT n.id, 'I', '[]'::jsonb, actor FROM new_rows n;
+    ELSIF TG_OP = 'UPDATE' THEN
+        INSERT INTO landplot_history (plot_id, op, patch, changed_by)
+        SELECT n.id, 'U', p.patch, actor
+        FROM new_rows n
+        JOIN old_rows o ON o.id = n.id,
+        LATERAL (SELECT landplot_patch(to_jsonb(o), to_jsonb(n)) AS patch) p
+        WHERE p.patch <> '[]'::jsonb;
+    ELSE
+        -- Удаление хранит старые значения в операциях test — по ним участок восстанавливается
+        INSERT INTO landplot_history (plot_id, op, patch, changed_by)
+        SELECT o.id, 'D', landplot_patch(to_jsonb(o), NULL), actor FROM old_rows o;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_landplots_history_insert AFTER INSERT ON landplots
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_landplot_history();
+CREATE TRIGGER trg_landplots_history_update AFTER UPDATE ON landplots
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_landplot_history();
+CREATE TRIGGER trg_landplots_history_delete AFTER DELETE ON landplots
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_landplot_history();
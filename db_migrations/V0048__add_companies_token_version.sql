@@ -0,0 +1,27 @@
+-- Версия токенов сессии компании (backend/*/session_tokens.py). Токен хранит
+-- версию на момент выдачи; изменение роли, пароля, логина, названия или
+-- активности поднимает версию и тем самым отзывает все выданные токены.
+ALTER TABLE companies ADD COLUMN IF NOT EXISTS token_version INTEGER NOT NULL DEFAULT 1;
+
+CREATE OR REPLACE FUNCTION bump_company_token_version() RETURNS trigger AS $$
+BEGIN
+    IF NEW.role IS DISTINCT FROM OLD.role
+       OR NEW.password_hash IS DISTINCT FROM OLD.password_hash
+       OR NEW.login IS DISTINCT FROM OLD.login
+       OR NEW.name IS DISTINCT FROM OLD.name
+       OR NEW.is_active IS DISTINCT FROM OLD.is_active THEN
+        NEW.token_version := GREATEST(NEW.token_version, OLD.token_version + 1);
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_companies_token_version BEFORE UPDATE ON companies
+    FOR EACH ROW EXECUTE FUNCTION bump_company_token_version();
+
+-- Список отозванных кэшируется в функциях и перечитывается по версии таблицы (V0041)
+CREATE TRIGGER trg_companies_version AFTER INSERT OR UPDATE OR DELETE ON companies
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_config_version();
+
+INSERT INTO config_versions (table_name) VALUES ('companies')
+ON CONFLICT (table_name) DO NOTHING;
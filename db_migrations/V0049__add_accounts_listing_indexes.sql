@@ -0,0 +1,12 @@
+-- Индексы постраничных списков companies и users (backend/*/listing.py).
+-- Выражения поиска должны совпадать с SEARCH_EXPRESSION в функциях.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_companies_search_trgm ON companies USING GIN (
+    (lower(coalesce(name, '') || ' ' || coalesce(login, '') || ' ' || coalesce(contact_email, '') || ' ' || coalesce(inn, ''))) gin_trgm_ops
+);
+CREATE INDEX IF NOT EXISTS idx_companies_active_role ON companies (is_active, role, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_users_search_trgm ON users USING GIN ((lower(full_name || ' ' || email)) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_users_name_id ON users (full_name, id);
+CREATE INDEX IF NOT EXISTS idx_users_active_name ON users (is_active, full_name, id);
@@ -0,0 +1,11 @@
+-- Счётчики неудачных входов по логину и IP в фиксированных окнах
+-- (backend/auth/login_throttle.py). Две соседние строки ключа дают оценку
+-- скользящего окна; строки старше предыдущего окна удаляет сама функция.
+CREATE TABLE IF NOT EXISTS login_attempts (
+    key VARCHAR(320) NOT NULL,
+    window_start TIMESTAMPTZ NOT NULL,
+    failures INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (key, window_start)
+);
+
+CREATE INDEX IF NOT EXISTS idx_login_attempts_window ON login_attempts (window_start);
@@ -0,0 +1,40 @@
+-- Партиции истории создаются и тогда, когда в DEFAULT уже есть строки за их
+-- месяц: такие строки переносятся в новую партицию. Иначе CREATE TABLE ...
+-- PARTITION OF падает из-за конфликтующих строк DEFAULT, и не создаются уже
+-- никакие следующие месяцы. Кроме месяцев вперёд обрабатываются и все
+-- месяцы, строки которых застряли в DEFAULT.
+CREATE OR REPLACE FUNCTION ensure_landplot_history_partitions(months_ahead INT) RETURNS void AS $$
+DECLARE
+    month_start DATE;
+    partition_name TEXT;
+BEGIN
+    FOR month_start IN
+        SELECT (date_trunc('month', CURRENT_DATE) + make_interval(months => i))::date
+        FROM generate_series(0, months_ahead) AS i
+        UNION
+        SELECT DISTINCT date_trunc('month', changed_at)::date FROM landplot_history_default
+        ORDER BY 1
+    LOOP
+        partition_name := 'landplot_history_' || to_char(month_start, 'YYYY_MM');
+        CONTINUE WHEN to_regclass(partition_name) IS NOT NULL;
+
+        DROP TABLE IF EXISTS landplot_history_moving;
+        CREATE TEMP TABLE landplot_history_moving (LIKE landplot_history) ON COMMIT DROP;
+        WITH moved AS (
+            DELETE FROM landplot_history_default
+            WHERE changed_at >= month_start AND changed_at < month_start + interval '1 month'
+            RETURNING *
+        )
+        INSERT INTO landplot_history_moving SELECT * FROM moved;
+
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF landplot_history FOR VALUES FROM (%L) TO (%L)',
+            partition_name, month_start, (month_start + interval '1 month')::date
+        );
+        INSERT INTO landplot_history SELECT * FROM landplot_history_moving;
+        DROP TABLE landplot_history_moving;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT ensure_landplot_history_partitions(3);
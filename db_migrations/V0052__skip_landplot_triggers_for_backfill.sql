@@ -0,0 +1,57 @@
+-- Пакетный пересчёт (geometry_batch.backfill) ставит в своей транзакции
+-- set_config('landgis.backfill', 'on', true): строковый триггер ленты и
+-- триггер истории тогда ничего не пишут. Пересчёт сам добавляет в ленту
+-- участки, у которых изменился контур, — одним INSERT на пачку.
+CREATE OR REPLACE FUNCTION notify_landplot_change() RETURNS trigger AS $$
+DECLARE
+    changed_id INTEGER;
+    seq BIGINT;
+BEGIN
+    IF current_setting('landgis.backfill', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP = 'DELETE' THEN
+        changed_id := OLD.id;
+    ELSE
+        changed_id := NEW.id;
+    END IF;
+
+    INSERT INTO change_feed (table_name, row_id, op)
+    VALUES (TG_TABLE_NAME, changed_id, left(TG_OP, 1))
+    RETURNING id INTO seq;
+
+    PERFORM pg_notify('landgis_changes', json_build_object(
+        's', seq, 't', TG_TABLE_NAME, 'i', changed_id, 'o', left(TG_OP, 1)
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION record_landplot_history() RETURNS trigger AS $$
+DECLARE
+    actor INTEGER := NULLIF(current_setting('landgis.company_id', true), '')::int;
+BEGIN
+    IF current_setting('landgis.backfill', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP = 'INSERT' THEN
+        -- Вставка — база истории: полный снимок не нужен, откат вставки — удаление
+        INSERT INTO landplot_history (plot_id, op, patch, changed_by)
+        SELECT n.id, 'I', '[]'::jsonb, actor FROM new_rows n;
+    ELSIF TG_OP = 'UPDATE' THEN
+        INSERT INTO landplot_history (plot_id, op, patch, changed_by)
+        SELECT n.id, 'U', p.patch, actor
+        FROM new_rows n
+        JOIN old_rows o ON o.id = n.id,
+        LATERAL (SELECT landplot_patch(to_jsonb(o), to_jsonb(n)) AS patch) p
+        WHERE p.patch <> '[]'::jsonb;
+    ELSE
+        -- Удаление хранит старые значения в операциях test — по ним участок восстанавливается
+        INSERT INTO landplot_history (plot_id, op, patch, changed_by)
+        SELECT o.id, 'D', landplot_patch(to_jsonb(o), NULL), actor FROM old_rows o;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
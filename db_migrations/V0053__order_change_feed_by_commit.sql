@@ -0,0 +1,16 @@
+-- Курсор ленты изменений по фиксации транзакций. id выдаётся при вставке,
+-- а транзакции фиксируются в другом порядке: запись с меньшим id может
+-- появиться уже после того, как клиент сдвинул курсор за больший. Поэтому
+-- каждая запись хранит номер своей транзакции, а выдаются только записи
+-- транзакций младше xmin текущего снимка — все они уже завершены.
+ALTER TABLE change_feed ADD COLUMN IF NOT EXISTS xact BIGINT;
+UPDATE change_feed SET xact = 0 WHERE xact IS NULL;
+ALTER TABLE change_feed ALTER COLUMN xact SET DEFAULT pg_current_xact_id()::text::bigint;
+ALTER TABLE change_feed ALTER COLUMN xact SET NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_change_feed_xact ON change_feed(xact, id);
+
+-- Граница очистки ленты: записи транзакций до purged_through могли быть удалены
+CREATE TABLE IF NOT EXISTS change_feed_purge (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    purged_through BIGINT NOT NULL
+);
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""Проверка чтения с реплики на паре основная БД + потоковая реплика
+
+    docker compose -f dev/replica/docker-compose.yml up -d
+    python dev/replica/smoke.py
+
+Миграции применяются на основную БД (run_migrations.py) и доходят до
+реплики потоком WAL. Дальше через настоящий handler функции settings:
+
+1. GET без метки читает с реплики;
+2. при остановленном применении WAL реплика отстаёт: GET без метки видит
+   старое значение, пока отставание в пределах DB_REPLICA_MAX_LAG, а GET
+   с X-DB-Version из ответа на запись — новое (read-your-writes);
+3. метка старше окна read-your-writes снова отправляет GET на реплику;
+4. когда отставание больше DB_REPLICA_MAX_LAG, GET без метки уходит на
+   основную БД;
+5. недоступная реплика заменяется основной БД.
+
+Строки подключения — PRIMARY_DSN и REPLICA_DSN (по умолчанию порты из
+docker-compose.yml). Код возврата 0, если все проверки прошли.
+"""
+import os
+import sys
+import time
+from contextlib import closing
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SCHEMA = 't_p78972315_landgis_creator'
+# Функции работают в схеме приложения через search_path роли
+OPTIONS = f" options='-c search_path={SCHEMA},public'"
+PRIMARY_DSN = os.environ.get(
+    'PRIMARY_DSN', 'host=localhost port=54321 dbname=landgis user=postgres password=postgres') + OPTIONS
+REPLICA_DSN = os.environ.get(
+    'REPLICA_DSN', 'host=localhost port=54322 dbname=landgis user=postgres password=postgres') + OPTIONS
+UNREACHABLE_DSN = 'host=localhost port=1 dbname=landgis user=postgres connect_timeout=1'
+WAIT_SECONDS = 30
+
+os.environ.update({
+    'DATABASE_URL': PRIMARY_DSN,
+    'DATABASE_URL_READ': REPLICA_DSN,
+    'DB_REPLICA_MAX_LAG': '30',
+    'DB_REPLICA_CHECK_TTL': '0',
+    'CONFIG_CACHE_TTL': '0',
+})
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'backend', 'settings')]
+
+import json
+
+import psycopg2
+
+import config_cache
+import index as settings
+import run_migrations
+
+failures = []
+
+
+def check(name, ok, detail=''):
+    print(f"{'✅' if ok else '❌'} {name}{f': {detail}' if detail else ''}")
+    if not ok:
+        failures.append(name)
+
+
+def replica_marked(dsn):
+    '''Последняя оценка реплики в config_cache: True, False или None'''
+    return config_cache._replica.get(dsn, (None, None))[1]
+
+
+def get_title(headers=None):
+    response = settings.handler({'httpMethod': 'GET', 'headers': headers or {}}, None)
+    return json.loads(response['body']).get('title')
+
+
+def put_title(value):
+    response = settings.handler({'httpMethod': 'PUT', 'body': json.dumps({'title': value})}, None)
+    return response['headers'][config_cache.VERSION_HEADER]
+
+
+def primary_lsn():
+    with closing(psycopg2.connect(PRIMARY_DSN)) as conn, conn.cursor() as cur:
+        cur.execute('SELECT pg_current_wal_lsn()')
+        return cur.fetchone()[0]
+
+
+def wait_replica(column, lsn):
+    '''Дождаться, пока реплика получит (receive) или применит (replay) WAL до lsn'''
+    deadline = time.monotonic() + WAIT_SECONDS
+    with closing(psycopg2.connect(REPLICA_DSN)) as conn:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            while time.monotonic() < deadline:
+                cur.execute(f'SELECT pg_wal_lsn_diff(pg_last_wal_{column}_lsn(), %s) >= 0', (lsn,))
+                if cur.fetchone()[0]:
+                    return
+                time.sleep(0.1)
+    raise RuntimeError(f'replica did not {column} WAL up to {lsn} in {WAIT_SECONDS}s')
+
+
+def replay(action):
+    '''Остановить (pause) или продолжить (resume) применение WAL на реплике'''
+    with closing(psycopg2.connect(REPLICA_DSN)) as conn:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(f'SELECT pg_wal_replay_{action}()')
+            # Пауза наступает не сразу: до неё реплика может применить ещё часть WAL
+            deadline = time.monotonic() + WAIT_SECONDS
+            while action == 'pause' and time.monotonic() < deadline:
+                cur.execute('SELECT pg_get_wal_replay_pause_state()')
+                if cur.fetchone()[0] == 'paused':
+                    break
+                time.sleep(0.1)
+
+
+def main():
+    with closing(psycopg2.connect(REPLICA_DSN)) as conn, conn.cursor() as cur:
+        cur.execute('SELECT pg_is_in_recovery()')
+        if not cur.fetchone()[0]:
+            print('❌ REPLICA_DSN is not a standby')
+            return 1
+
+    run_migrations.run(PRIMARY_DSN, SCHEMA, reset=True, progress=lambda message: None)
+    put_title('v1')
+    wait_replica('replay', primary_lsn())
+    check('GET reads the replica', get_title() == 'v1')
+    check('replica is marked healthy', replica_marked(REPLICA_DSN) is True)
+
+    replay('pause')
+    try:
+        version = put_title('v2')
+        wait_replica('receive', primary_lsn())
+        stale = get_title()
+        check('lagging replica within DB_REPLICA_MAX_LAG still serves GET', stale == 'v1', f'title={stale}')
+        fresh = get_title({config_cache.VERSION_HEADER: version})
+        check('X-DB-Version routes GET to primary', fresh == 'v2', f'title={fresh}')
+        expired = str(int((time.time() - config_cache.READ_YOUR_WRITES_WINDOW - 1) * 1000))
+        old = get_title({config_cache.VERSION_HEADER: expired})
+        check('expired X-DB-Version reads the replica again', old == 'v1', f'title={old}')
+
+        config_cache.REPLICA_MAX_LAG = 1
+        time.sleep(config_cache.REPLICA_MAX_LAG + 0.5)
+        fallback = get_title()
+        check('replica lagging over DB_REPLICA_MAX_LAG falls back to primary', fallback == 'v2',
+              f'title={fallback}')
+        check('replica is marked unhealthy', replica_marked(REPLICA_DSN) is False)
+    finally:
+        replay('resume')
+
+    wait_replica('replay', primary_lsn())
+    caught_up = get_title()
+    check('caught-up replica serves GET again', caught_up == 'v2'
+          and replica_marked(REPLICA_DSN) is True, f'title={caught_up}')
+
+    config_cache.READ_DSN = UNREACHABLE_DSN
+    down = get_title()
+    check('unreachable replica falls back to primary', down == 'v2'
+          and replica_marked(UNREACHABLE_DSN) is False, f'title={down}')
+
+    print(f'{len(failures)} failed' if failures else 'all checks passed')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
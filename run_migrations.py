@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""Локальный прогон миграций db_migrations на пустой (scratch) Postgres
+
+    python run_migrations.py --dsn postgresql://localhost/landgis_scratch [--reset]
+        [--to V0047] [--report migrations.json]
+    python run_migrations.py --dsn "$DATABASE_URL" --backfills-only
+
+Миграции применяются по порядку версий, каждая в своей транзакции. Для
+каждой записываются длительность, число затронутых строк и разбивка по
+операторам — в таблицу migration_runs и в JSON-отчёт. UPDATE/DELETE без
+ограничения по id на больших таблицах помечаются предупреждением: на
+десятках тысяч участков такой оператор держит блокировку всей таблицы. Так же
+помечается DDL, который переписывает или сканирует большую таблицу целиком
+под ACCESS EXCLUSIVE: вычисляемая STORED-колонка, смена типа колонки и т. п.
+
+Для переписывания данных есть отдельный тип — пакетный backfill, файл
+V<номер>__<имя>.backfill с заголовком и одним оператором:
+
+    -- table: landplots
+    -- batch: 1000
+    -- pause: 0.05
+    UPDATE landplots SET attributes = attributes - '_id'
+    WHERE id >= %(start)s AND id < %(end)s AND attributes ? '_id';
+
+Оператор выполняется для последовательных диапазонов id, каждый диапазон —
+отдельная транзакция, прогресс сохраняется в migration_runs, поэтому
+прерванный backfill продолжается с места остановки.
+
+На развёрнутой БД .sql-миграции применяет платформа при деплое, а .backfill
+она пропускает. Их применяет --backfills-only: только недостающие .backfill
+по журналу migration_runs в схеме приложения, без изменения схемы. Запускать
+после деплоя, в котором вышли предшествующие им .sql-миграции.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+import psycopg2
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'db_migrations')
+DEFAULT_SCHEMA = 't_p78972315_landgis_creator'
+FILE_PATTERN = re.compile(r'^V(\d+)__(.+)\.(sql|backfill)$')
+# Таблицы, где переписывание целиком уже заметно блокирует работу
+LARGE_TABLES = ('landplots', 'properties', 'landplot_history')
+DEFAULT_BATCH = 1000
+# DDL, после которого таблица переписывается или проверяется целиком
+FULL_TABLE_DDL = (
+    (r'\badd\b.*\bgenerated always as\b.*\bstored\b', 'ADD COLUMN ... GENERATED ... STORED'),
+    (r'\badd\b.*\bdefault\b.*\b(?:random|clock_timestamp|timeofday|gen_random_uuid|uuid_generate_v\d|nextval)\s*\(',
+     'ADD COLUMN with a volatile DEFAULT'),
+    (r'\badd\b(?:\s+column)?(?:\s+if not exists)?\s+\w+\s+(?:small|big)?serial\b', 'ADD COLUMN ... SERIAL'),
+    (r'\balter\b(?:\s+column)?\s+\w+\s+(?:set data\s+)?type\b', 'ALTER COLUMN ... TYPE'),
+    (r'\bset\s+(?:logged|unlogged|tablespace|access method)\b', 'SET LOGGED/UNLOGGED/TABLESPACE/ACCESS METHOD'),
+    (r'\balter\b(?:\s+column)?\s+\w+\s+set not null\b', 'SET NOT NULL (full scan)'),
+    (r'\badd\b(?:\s+constraint\s+\w+)?\s+(?:check|foreign key)\b(?!.*\bnot valid\b)', 'ADD CONSTRAINT without NOT VALID (full scan)'),
+)
+
+LEDGER_SQL = '''
+    CREATE TABLE IF NOT EXISTS migration_runs (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        status TEXT NOT NULL,
+        duration_ms DOUBLE PRECISION,
+        rows_affected BIGINT,
+        last_id BIGINT,
+        details JSONB,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+
+def list_migrations(directory=MIGRATIONS_DIR):
+    '''(версия, имя, тип, путь) по возрастанию версии'''
+    found = []
+    for filename in os.listdir(directory):
+        match = FILE_PATTERN.match(filename)
+        if match:
+            found.append((int(match.group(1)), match.group(2), match.group(3), os.path.join(directory, filename)))
+    return sorted(found)
+
+
+def split_statements(sql):
+    '''Операторы SQL-файла: точка с запятой внутри строк, $$-тел и комментариев не делит'''
+    statements, start, i, n = [], 0, 0, len(sql)
+    while i < n:
+        ch = sql[i]
+        if sql.startswith('--', i):
+            i = sql.find('\n', i)
+            i = n if i < 0 else i + 1
+        elif sql.startswith('/*', i):
+            i = sql.find('*/', i + 2)
+            i = n if i < 0 else i + 2
+        elif ch == "'":
+            # E'...' допускает \' внутри строки
+            escaped = i > 0 and sql[i - 1] in 'eE' and (i < 2 or not (sql[i - 2].isalnum() or sql[i - 2] == '_'))
+            i += 1
+            while i < n:
+                if escaped and sql[i] == '\\':
+                    i += 2
+                    continue
+                if sql[i] == "'":
+                    if sql.startswith("''", i):
+                        i += 2
+                        continue
+                    break
+                i += 1
+            i += 1
+        elif ch == '"':
+            i = sql.find('"', i + 1)
+            i = n if i < 0 else i + 1
+        elif ch == '$':
+            tag = re.match(r'\$[A-Za-z_]*\$', sql[i:])
+            if tag and not (i > 0 and (sql[i - 1].isalnum() or sql[i - 1] == '_')):
+                end = sql.find(tag.group(0), i + len(tag.group(0)))
+                i = n if end < 0 else end + len(tag.group(0))
+            else:
+                i += 1
+        elif ch == ';':
+            statements.append(sql[start:i])
+            start = i = i + 1
+        else:
+            i += 1
+    statements.append(sql[start:])
+    return [s.strip() for s in statements if strip_comments(s).strip()]
+
+
+def strip_comments(sql):
+    return re.sub(r'--[^\n]*', '', sql)
+
+
+def statement_label(statement):
+    code = ' '.join(strip_comments(statement).split())
+    return code[:100]
+
+
+def full_table_rewrite(statement):
+    '''Таблица, которую оператор переписывает без ограничения по id, или None'''
+    code = ' '.join(strip_comments(statement).split()).lower()
+    match = re.match(r'(update|delete from)\s+(?:[\w]+\.)?(\w+)', code)
+    if not match or match.group(2) not in LARGE_TABLES:
+        return None
+    if re.search(r'\bwhere\b.*\bid\s*(=|<|>|between|in\b|= any)', code):
+        return None
+    return match.group(2)
+
+
+def full_table_ddl(statement):
+    '''(таблица, операция) для ALTER TABLE, переписывающего большую таблицу целиком, или None'''
+    code = ' '.join(strip_comments(statement).split()).lower()
+    match = re.match(r'alter table\s+(?:if exists\s+)?(?:only\s+)?(?:[\w]+\.)?(\w+)', code)
+    if not match or match.group(1) not in LARGE_TABLES:
+        return None
+    for pattern, operation in FULL_TABLE_DDL:
+        if re.search(pattern, code):
+            return match.group(1), operation
+    return None
+
+
+def parse_backfill(text):
+    '''Заголовок (table, batch, pause) и оператор файла .backfill'''
+    options = dict(re.findall(r'^--\s*(\w+)\s*:\s*(.+?)\s*$', text, re.MULTILINE))
+    statement = strip_comments(text).strip().rstrip(';')
+    if 'table' not in options or '%(start)s' not in statement or '%(end)s' not in statement:
+        raise ValueError('backfill needs "-- table:" and a statement with %(start)s and %(end)s')
+    return options['table'], int(options.get('batch', DEFAULT_BATCH)), float(options.get('pause', 0)), statement
+
+
+def connect(dsn, schema):
+    conn = psycopg2.connect(dsn)
+    with conn.cursor() as cur:
+        cur.execute(f'CREATE SCHEMA IF NOT EXISTS {schema}')
+        # Старые миграции пишут имя схемы явно, новые — без него: обе попадают в одну схему
+        cur.execute(f'SET search_path TO {schema}, public')
+        cur.execute(LEDGER_SQL)
+    conn.commit()
+    return conn
+
+
+def ledger(conn):
+    with conn.cursor() as cur:
+        cur.execute('SELECT version, status, last_id FROM migration_runs')
+        rows = {version: (status, last_id) for version, status, last_id in cur.fetchall()}
+    conn.commit()
+    return rows
+
+
+def record(conn, version, name, kind, status, duration_ms, rows_affected, last_id=None, details=None):
+    with conn.cursor() as cur:
+        cur.execute('''
+            INSERT INTO migration_runs (version, name, kind, status, duration_ms, rows_affected, last_id, details)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT (version) DO UPDATE SET
+                status = EXCLUDED.status, duration_ms = EXCLUDED.duration_ms,
+                rows_affected = EXCLUDED.rows_affected, last_id = EXCLUDED.last_id,
+                details = EXCLUDED.details, applied_at = CURRENT_TIMESTAMP
+        ''', (version, name, kind, status, duration_ms, rows_affected, last_id, json.dumps(details or {})))
+    conn.commit()
+
+
+def apply_sql(conn, version, name, path):
+    with open(path, encoding='utf-8') as f:
+        statements = split_statements(f.read())
+    steps, warnings, total = [], [], 0
+    started = time.perf_counter()
+    try:
+        with conn.cursor() as cur:
+            for statement in statements:
+                step_started = time.perf_counter()
+                cur.execute(statement)
+                rows = cur.rowcount if cur.rowcount and cur.rowcount > 0 else 0
+                total += rows
+                steps.append({
+                    'statement': statement_label(statement), 'rows': rows,
+                    'ms': round((time.perf_counter() - step_started) * 1000, 2),
+                })
+                table = full_table_rewrite(statement)
+                if table:
+                    warnings.append(f'{table}: rewrite without id range ({rows} rows) — use a .backfill migration')
+                ddl = full_table_ddl(statement)
+                if ddl:
+                    warnings.append(f'{ddl[0]}: {ddl[1]} reads or rewrites every row under ACCESS EXCLUSIVE')
+        conn.commit()
+    except psycopg2.Error:
+        conn.rollback()
+        raise
+    duration = (time.perf_counter() - started) * 1000
+    details = {'statements': steps, 'warnings': warnings}
+    record(conn, version, name, 'sql', 'done', duration, total, details=details)
+    return duration, total, details
+
+
+def apply_backfill(conn, version, name, path, resume_from=None, progress=print):
+    with open(path, encoding='utf-8') as f:
+        table, batch, pause, statement = parse_backfill(f.read())
+    with conn.cursor() as cur:
+        cur.execute(f'SELECT min(id), max(id) FROM {table}')
+        low, high = cur.fetchone()
+    conn.commit()
+    details = {'table': table, 'batch': batch, 'batches': 0}
+    if low is None:
+        record(conn, version, name, 'backfill', 'done', 0, 0, details=details)
+        return 0, 0, details
+
+    start = resume_from + 1 if resume_from is not None else low
+    total, started = 0, time.perf_counter()
+    while start <= high:
+        end = start + batch
+        with conn.cursor() as cur:
+            cur.execute(statement, {'start': start, 'end': end})
+            total += max(cur.rowcount, 0)
+        conn.commit()
+        details['batches'] += 1
+        # Прогресс в журнале: после сбоя прогон продолжится со следующего диапазона
+        record(conn, version, name, 'backfill', 'running',
+               (time.perf_counter() - started) * 1000, total, last_id=end - 1, details=details)
+        done = min(1.0, (end - low) / (high - low + 1))
+        progress(f'  V{version:04d} {table}: id < {end} ({done:.0%}), {total} rows')
+        start = end
+        if pause:
+            time.sleep(pause)
+    duration = (time.perf_counter() - started) * 1000
+    record(conn, version, name, 'backfill', 'done', duration, total, last_id=high, details=details)
+    return duration, total, details
+
+
+def run(dsn, schema=DEFAULT_SCHEMA, to_version=None, reset=False, directory=MIGRATIONS_DIR, progress=print,
+        backfills_only=False):
+    '''Применить недостающие миграции; возвращает отчёт по каждой
+
+    backfills_only — только .backfill: .sql на развёрнутой БД уже применила платформа.
+    '''
+    if reset:
+        admin = psycopg2.connect(dsn)
+        admin.autocommit = True
+        with admin.cursor() as cur:
+            cur.execute(f'DROP SCHEMA IF EXISTS {schema} CASCADE')
+        admin.close()
+
+    conn = connect(dsn, schema)
+    applied = ledger(conn)
+    report = []
+    try:
+        for version, name, kind, path in list_migrations(directory):
+            if to_version is not None and version > to_version:
+                break
+            status, last_id = applied.get(version, (None, None))
+            if status == 'done' or (backfills_only and kind != 'backfill'):
+                continue
+            if kind == 'backfill':
+                duration, rows, details = apply_backfill(conn, version, name, path, last_id, progress)
+            else:
+                duration, rows, details = apply_sql(conn, version, name, path)
+            progress(f'V{version:04d} {name} [{kind}]: {duration:.1f} ms, {rows} rows')
+            for warning in details.get('warnings', []):
+                progress(f'  ⚠️ {warning}')
+            report.append({'version': version, 'name': name, 'kind': kind,
+                           'duration_ms': round(duration, 2), 'rows': rows, 'details': details})
+    finally:
+        conn.close()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Прогон db_migrations на scratch Postgres или backfill на развёрнутой БД')
+    parser.add_argument('--dsn', default=os.environ.get('SCRATCH_DATABASE_URL'), help='строка подключения')
+    parser.add_argument('--schema', default=DEFAULT_SCHEMA)
+    parser.add_argument('--to', help='последняя применяемая версия, например V0047')
+    parser.add_argument('--reset', action='store_true', help='удалить схему и журнал перед прогоном')
+    parser.add_argument('--report', help='записать отчёт в JSON-файл')
+    parser.add_argument('--backfills-only', action='store_true',
+                        help='только .backfill — для развёрнутой БД, где .sql применяет платформа')
+    args = parser.parse_args(argv)
+    if not args.dsn:
+        parser.error('--dsn or SCRATCH_DATABASE_URL is required')
+    if args.reset and args.backfills_only:
+        parser.error('--reset cannot be combined with --backfills-only')
+
+    to_version = int(args.to.lstrip('Vv')) if args.to else None
+    report = run(args.dsn, args.schema, to_version, args.reset, backfills_only=args.backfills_only)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    total = sum(r['duration_ms'] for r in report)
+    print(f'{len(report)} migrations, {total:.0f} ms')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
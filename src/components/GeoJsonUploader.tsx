@@ -10,6 +10,7 @@ import { GeoJsonData, GeoJsonFeature, FieldMapping } from './geojson/GeoJsonType
 import { 
   extractCoordinates, 
   extractBoundary, 
+  extractBoundaryParts,
   getPropertyValue,
   normalizePropertyType,
   normalizeSegment,
@@ -139,6 +140,7 @@ const GeoJsonUploader = () => {
           const props = feature.properties || {};
           const coordinates = extractCoordinates(feature);
           const boundary = extractBoundary(feature);
+          const parts = extractBoundaryParts(feature);
 
           const filteredAttributes = { ...props };
           delete filteredAttributes.geometry_name;
@@ -155,6 +157,7 @@ const GeoJsonUploader = () => {
             segment: normalizeSegment(getPropertyValue(props, mapping.segment, 'standard')),
             status: normalizeStatus(getPropertyValue(props, mapping.status, 'available')),
             boundary,
+            boundary_parts: parts.length > 1 ? parts : undefined,
             attributes: filteredAttributes
           };
 
@@ -11,7 +11,7 @@ import Icon from '@/components/ui/icon';
 import { Property } from '@/services/propertyService';
 import { propertyService } from '@/services/propertyService';
 import { toast } from 'sonner';
-import { useState } from 'react';
+import { useState, useEffect } from 'react';
 import AttributesDisplay from '@/components/AttributesDisplay';
 
 interface AdminPropertyDetailProps {
@@ -21,8 +21,21 @@ interface AdminPropertyDetailProps {
   onDelete?: () => void;
 }
 
-const AdminPropertyDetail = ({ property, isOpen, onClose, onDelete }: AdminPropertyDetailProps) => {
+const AdminPropertyDetail = ({ property: listProperty, isOpen, onClose, onDelete }: AdminPropertyDetailProps) => {
   const [isDeleting, setIsDeleting] = useState(false);
+  const [detail, setDetail] = useState<Property | null>(null);
+
+  // Полную запись (границы, атрибуты) берём по id при открытии, а не из общего списка
+  useEffect(() => {
+    if (!isOpen || !listProperty) return;
+    let cancelled = false;
+    propertyService.getProperty(listProperty.id)
+      .then(fresh => { if (!cancelled) setDetail(fresh); })
+      .catch(error => console.error('Error loading property detail:', error));
+    return () => { cancelled = true; };
+  }, [isOpen, listProperty?.id]);
+
+  const property = detail && detail.id === listProperty?.id ? detail : listProperty;
 
   const handleDelete = async () => {
     if (!property) return;
@@ -1,11 +1,21 @@
+import { useEffect, useState } from 'react';
 import { Card, CardDescription, CardHeader, CardTitle } from '@/components/ui/card';
-import { Property } from '@/services/propertyService';
+import { Property, PropertyStats, propertyService } from '@/services/propertyService';
 
 interface AdminStatsProps {
   properties: Property[];
 }
 
 const AdminStats = ({ properties }: AdminStatsProps) => {
+  const [serverStats, setServerStats] = useState<PropertyStats | null>(null);
+
+  // Агрегаты считает сервер; список участков нужен только как сигнал к обновлению
+  useEffect(() => {
+    propertyService.getStats()
+      .then(setServerStats)
+      .catch(error => console.error('Error loading stats:', error));
+  }, [properties]);
+
   const formatPrice = (price: number) => {
     return new Intl.NumberFormat('ru-RU', {
       style: 'currency',
@@ -15,12 +25,12 @@ const AdminStats = ({ properties }: AdminStatsProps) => {
   };
 
   const stats = {
-    total: properties.length,
-    available: properties.filter(p => p.status === 'available').length,
-    reserved: properties.filter(p => p.status === 'reserved').length,
-    sold: properties.filter(p => p.status === 'sold').length,
-    totalValue: properties.reduce((sum, p) => sum + p.price, 0),
-    withBoundary: properties.filter(p => p.boundary && p.boundary.length > 0).length
+    total: serverStats?.total ?? 0,
+    available: serverStats?.by_status?.available?.count ?? 0,
+    reserved: serverStats?.by_status?.reserved?.count ?? 0,
+    sold: serverStats?.by_status?.sold?.count ?? 0,
+    totalValue: serverStats?.total_price ?? 0,
+    withBoundary: serverStats?.with_boundary ?? 0
   };
 
   return (
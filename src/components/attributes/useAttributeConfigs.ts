@@ -2,6 +2,7 @@ import { useState, useEffect } from 'react';
 import { DisplayConfig } from '@/services/displayConfigService';
 import { toast } from 'sonner';
 import func2url from '../../../backend/func2url.json';
+import { rememberDbVersion } from '@/services/dbVersion';
 
 // Возвращаемся к локальному ключу - у админа там правильный порядок
 const GLOBAL_STORAGE_KEY = 'attributeConfigs';
@@ -352,6 +353,7 @@ export const useAttributeConfigs = (attributes?: Record<string, any>) => {
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ configs })
       });
+      rememberDbVersion(response);
       
       if (response.ok) {
         const result = await response.json();
@@ -390,6 +392,7 @@ export const useAttributeConfigs = (attributes?: Record<string, any>) => {
           headers: { 'Content-Type': 'application/json' },
           body: JSON.stringify({ key })
         });
+        rememberDbVersion(response);
         
         if (response.ok) {
           const result = await response.json();
@@ -414,6 +417,7 @@ export const useAttributeConfigs = (attributes?: Record<string, any>) => {
             formatType: config.formatType || 'text'
           })
         });
+        rememberDbVersion(response);
         
         if (response.ok) {
           const result = await response.json();
@@ -465,6 +469,7 @@ export const useAttributeConfigs = (attributes?: Record<string, any>) => {
               newKey: config.configKey
             })
           });
+          rememberDbVersion(response);
           
           if (!response.ok) {
             throw new Error(`Failed to rename ${config.originalKey} to ${config.configKey}`);
@@ -3,6 +3,7 @@ import { DisplayConfig } from '@/services/displayConfigService';
 import { toast } from 'sonner';
 import func2url from '../../../backend/func2url.json';
 import { propertyService } from '@/services/propertyService';
+import { rememberDbVersion } from '@/services/dbVersion';
 
 export const useAttributeEditing = (
   attributes?: Record<string, any>,
@@ -32,9 +33,14 @@ export const useAttributeEditing = (
       
       console.log('Sending PUT request:', { url, payload });
       
+      const token = localStorage.getItem('auth_token');
       const response = await fetch(url, {
         method: 'PUT',
-        headers: { 'Content-Type': 'application/json' },
+        headers: {
+          'Content-Type': 'application/json',
+          // По токену функция запишет автора изменения в историю участка
+          ...(token ? { 'X-Authorization': `Bearer ${token}` } : {})
+        },
         body: JSON.stringify(payload),
       });
 
@@ -45,6 +51,8 @@ export const useAttributeEditing = (
         console.error('Response error:', errorText);
         throw new Error('Failed to update attributes');
       }
+      // Следующее чтение участков пойдёт на основную БД и увидит сохранённое
+      rememberDbVersion(response);
 
       const result = await response.json();
       console.log('Save result:', result);
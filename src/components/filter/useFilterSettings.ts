@@ -2,6 +2,7 @@ import { useState, useEffect } from 'react';
 import { filterVisibilityService, FilterVisibilityConfig } from '@/services/filterVisibilityService';
 import { FilterColumnSettings } from './types';
 import { UserRole } from '@/types/userRoles';
+import { dbVersionHeaders, rememberDbVersion } from '@/services/dbVersion';
 
 const FILTER_CONFIG_URL = 'https://functions.poehali.dev/d55d58af-9be6-493a-a89d-45634d648637';
 
@@ -38,7 +39,10 @@ export const useFilterSettings = (
       };
 
       try {
-        const response = await fetch(FILTER_CONFIG_URL);
+        const token = localStorage.getItem('auth_token');
+        const response = await fetch(FILTER_CONFIG_URL, {
+          headers: { ...dbVersionHeaders(), ...(token ? { 'X-Authorization': `Bearer ${token}` } : {}) }
+        });
         
         if (response.ok) {
           const data = await response.json();
@@ -22,12 +22,64 @@ export const normalizeCoordinates = (coords: number[]): [number, number] => {
   return [coords[1], coords[0]];
 };
 
+const DEFAULT_COORDINATES: [number, number] = [55.751244, 37.618423];
+
+// Внешние кольца всех частей полигона в [lat, lng]
+export const extractBoundaryParts = (feature: GeoJsonFeature): Array<Array<[number, number]>> => {
+  const { geometry } = feature;
+  if (!geometry || !geometry.coordinates) return [];
+
+  const rings = geometry.type === 'Polygon'
+    ? [(geometry.coordinates as number[][][])[0]]
+    : geometry.type === 'MultiPolygon'
+      ? (geometry.coordinates as number[][][][]).map(polygon => polygon[0])
+      : [];
+
+  return rings
+    .filter(ring => ring && ring.length >= 3)
+    .map(ring => ring.map(c => normalizeCoordinates(c)));
+};
+
+// Центроид с весом по площади в локальной проекции (как в backend/properties/geometry.py)
+export const ringsCentroid = (rings: Array<Array<[number, number]>>): [number, number] | undefined => {
+  let weight = 0;
+  let sumLat = 0;
+  let sumLng = 0;
+
+  rings.forEach(ring => {
+    const lats = ring.map(p => p[0]);
+    const scale = Math.cos(((Math.min(...lats) + Math.max(...lats)) / 2) * Math.PI / 180);
+    const [lat0, lng0] = ring[0];
+    let area = 0;
+    let cx = 0;
+    let cy = 0;
+    ring.forEach((p, i) => {
+      const q = ring[(i + 1) % ring.length];
+      const x1 = (p[1] - lng0) * scale;
+      const y1 = p[0] - lat0;
+      const x2 = (q[1] - lng0) * scale;
+      const y2 = q[0] - lat0;
+      const cross = x1 * y2 - x2 * y1;
+      area += cross;
+      cx += (x1 + x2) * cross;
+      cy += (y1 + y2) * cross;
+    });
+    area /= 2;
+    if (area === 0) return;
+    weight += Math.abs(area);
+    sumLat += Math.abs(area) * (lat0 + cy / (6 * area));
+    sumLng += Math.abs(area) * (lng0 + cx / (6 * area) / scale);
+  });
+
+  return weight > 0 ? [sumLat / weight, sumLng / weight] : undefined;
+};
+
 export const extractCoordinates = (feature: GeoJsonFeature): [number, number] => {
   const { geometry } = feature;
   
   if (!geometry || !geometry.coordinates) {
     console.warn('Геометрия отсутствует, используются координаты по умолчанию');
-    return [55.751244, 37.618423];
+    return DEFAULT_COORDINATES;
   }
   
   if (geometry.type === 'Point') {
@@ -36,25 +88,21 @@ export const extractCoordinates = (feature: GeoJsonFeature): [number, number] =>
   }
   
   if (geometry.type === 'Polygon' || geometry.type === 'MultiPolygon') {
-    const coords = geometry.type === 'Polygon' 
-      ? (geometry.coordinates as number[][][])[0]
-      : (geometry.coordinates as number[][][][])[0][0];
-    
-    if (!coords || coords.length === 0) {
+    const parts = extractBoundaryParts(feature);
+    if (parts.length === 0) {
       console.warn('Пустые координаты полигона');
-      return [55.751244, 37.618423];
+      return DEFAULT_COORDINATES;
     }
     
-    const sumX = coords.reduce((sum, c) => sum + c[0], 0);
-    const sumY = coords.reduce((sum, c) => sum + c[1], 0);
-    const centerX = sumX / coords.length;
-    const centerY = sumY / coords.length;
-    
-    return normalizeCoordinates([centerX, centerY]);
+    // Вырожденный контур без площади — среднее вершин первого кольца
+    return ringsCentroid(parts) ?? [
+      parts[0].reduce((sum, c) => sum + c[0], 0) / parts[0].length,
+      parts[0].reduce((sum, c) => sum + c[1], 0) / parts[0].length
+    ];
   }
   
   console.warn('Неизвестный тип геометрии:', geometry.type);
-  return [55.751244, 37.618423];
+  return DEFAULT_COORDINATES;
 };
 
 export const extractBoundary = (feature: GeoJsonFeature): Array<[number, number]> | undefined => {
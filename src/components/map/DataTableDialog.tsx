@@ -1,7 +1,7 @@
 import { Dialog, DialogContent, DialogHeader, DialogTitle } from '@/components/ui/dialog';
 import { useState, useEffect, useRef } from 'react';
 import { Input } from '@/components/ui/input';
-import { Property } from '@/services/propertyService';
+import { Property, PropertyQuery } from '@/services/propertyService';
 import Icon from '@/components/ui/icon';
 import { useAttributeConfigs } from '@/components/attributes/useAttributeConfigs';
 import TableHeader from '@/components/map/datatable/TableHeader';
@@ -13,10 +13,11 @@ interface DataTableDialogProps {
   onOpenChange: (open: boolean) => void;
   properties: Property[];
   allProperties?: Property[];
+  exportQuery?: PropertyQuery;
   onShowOnMap?: (property: Property) => void;
 }
 
-const DataTableDialog = ({ open, onOpenChange, properties, allProperties, onShowOnMap }: DataTableDialogProps) => {
+const DataTableDialog = ({ open, onOpenChange, properties, allProperties, exportQuery, onShowOnMap }: DataTableDialogProps) => {
   const inputRef = useRef<HTMLInputElement>(null);
   const [isSearchActive, setIsSearchActive] = useState(false);
   const displayPropertiesForConfig = properties.length > 0 ? properties : (allProperties || []);
@@ -60,6 +61,7 @@ const DataTableDialog = ({ open, onOpenChange, properties, allProperties, onShow
     showFiltered,
     searchQuery,
     hiddenColumns,
+    isExporting,
     displayProperties,
     sortedProperties,
     setShowFiltered,
@@ -67,8 +69,8 @@ const DataTableDialog = ({ open, onOpenChange, properties, allProperties, onShow
     toggleColumn,
     getCellValue,
     handleSort,
-    handleExportToExcel
-  } = useTableLogic(properties, allProperties, allHeaders);
+    handleExport
+  } = useTableLogic(properties, allProperties, allHeaders, exportQuery);
 
   const headers = allHeaders.filter(h => !hiddenColumns.has(h.key));
 
@@ -88,7 +90,8 @@ const DataTableDialog = ({ open, onOpenChange, properties, allProperties, onShow
             allHeaders={allHeaders}
             hiddenColumns={hiddenColumns}
             onToggleColumn={toggleColumn}
-            onExport={handleExportToExcel}
+            onExport={handleExport}
+            isExporting={isExporting}
           />
         </DialogHeader>
 
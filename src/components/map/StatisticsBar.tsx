@@ -1,25 +1,37 @@
+import { useEffect, useState } from 'react';
 import Icon from '@/components/ui/icon';
-import { Property } from '@/services/propertyService';
+import { Property, PropertyStats, propertyService } from '@/services/propertyService';
 
 interface StatisticsBarProps {
   properties: Property[];
 }
 
 const StatisticsBar = ({ properties }: StatisticsBarProps) => {
+  const [serverStats, setServerStats] = useState<PropertyStats | null>(null);
+
+  // Счётчики считает сервер; список участков нужен только как сигнал к обновлению
+  useEffect(() => {
+    propertyService.getStats()
+      .then(setServerStats)
+      .catch(error => console.error('Error loading stats:', error));
+  }, [properties]);
+
+  const countByStatus = (status: string) => serverStats?.by_status?.[status]?.count ?? 0;
+
   return (
     <div className="hidden sm:flex h-14 border-t border-border bg-card/30 backdrop-blur px-3 lg:px-4 items-center justify-between">
       <div className="flex gap-2 lg:gap-4 text-[11px]">
         <div className="flex items-center gap-1.5">
           <div className="w-2.5 h-2.5 rounded-full bg-green-500"></div>
-          <span className="text-muted-foreground"><span className="hidden md:inline">Доступно: </span><span className="font-semibold text-foreground">{properties.filter(p => p.status === 'available').length}</span></span>
+          <span className="text-muted-foreground"><span className="hidden md:inline">Доступно: </span><span className="font-semibold text-foreground">{countByStatus('available')}</span></span>
         </div>
         <div className="flex items-center gap-1.5">
           <div className="w-2.5 h-2.5 rounded-full bg-yellow-500"></div>
-          <span className="text-muted-foreground"><span className="hidden md:inline">Резерв: </span><span className="font-semibold text-foreground">{properties.filter(p => p.status === 'reserved').length}</span></span>
+          <span className="text-muted-foreground"><span className="hidden md:inline">Резерв: </span><span className="font-semibold text-foreground">{countByStatus('reserved')}</span></span>
         </div>
         <div className="flex items-center gap-1.5">
           <div className="w-2.5 h-2.5 rounded-full bg-gray-500"></div>
-          <span className="text-muted-foreground"><span className="hidden md:inline">Продано: </span><span className="font-semibold text-foreground">{properties.filter(p => p.status === 'sold').length}</span></span>
+          <span className="text-muted-foreground"><span className="hidden md:inline">Продано: </span><span className="font-semibold text-foreground">{countByStatus('sold')}</span></span>
         </div>
       </div>
 
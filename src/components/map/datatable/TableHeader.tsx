@@ -21,7 +21,8 @@ interface TableHeaderProps {
   allHeaders: TableHeader[];
   hiddenColumns: Set<string>;
   onToggleColumn: (key: string) => void;
-  onExport: () => void;
+  onExport: (format: 'xlsx' | 'csv') => void;
+  isExporting?: boolean;
 }
 
 const TableHeader = ({
@@ -36,7 +37,8 @@ const TableHeader = ({
   allHeaders,
   hiddenColumns,
   onToggleColumn,
-  onExport
+  onExport,
+  isExporting = false
 }: TableHeaderProps) => {
   return (
     <div className="flex items-center justify-between pr-8">
@@ -99,14 +101,25 @@ const TableHeader = ({
         </Popover>
 
         <Button 
-          onClick={onExport}
+          onClick={() => onExport('xlsx')}
           variant="outline" 
           size="sm"
           className="gap-2"
+          disabled={isExporting}
         >
-          <Icon name="Download" size={16} />
+          <Icon name={isExporting ? 'Loader2' : 'Download'} size={16} className={isExporting ? 'animate-spin' : ''} />
           Excel
         </Button>
+        <Button 
+          onClick={() => onExport('csv')}
+          variant="outline" 
+          size="sm"
+          className="gap-2"
+          disabled={isExporting}
+        >
+          <Icon name="FileText" size={16} />
+          CSV
+        </Button>
       </div>
     </div>
   );
@@ -1,9 +1,12 @@
-import { useState, useMemo } from 'react';
-import { Property } from '@/services/propertyService';
-import * as XLSX from 'xlsx';
+import { useState, useMemo, useEffect } from 'react';
+import { Property, PropertyQuery, propertyService } from '@/services/propertyService';
+import { toast } from 'sonner';
 
 type SortDirection = 'asc' | 'desc' | null;
 
+const SEARCH_DEBOUNCE_MS = 300;
+const SEARCH_MAX_RESULTS = 1000;
+
 interface TableHeader {
   key: string;
   label: string;
@@ -12,13 +15,15 @@ interface TableHeader {
 export const useTableLogic = (
   properties: Property[],
   allProperties: Property[] | undefined,
-  headers: TableHeader[]
+  headers: TableHeader[],
+  exportQuery?: PropertyQuery
 ) => {
   const [sortColumn, setSortColumn] = useState<string | null>(null);
   const [sortDirection, setSortDirection] = useState<SortDirection>(null);
   const [showFiltered, setShowFiltered] = useState(true);
   const [searchQuery, setSearchQuery] = useState('');
   const [hiddenColumns, setHiddenColumns] = useState<Set<string>>(new Set());
+  const [isExporting, setIsExporting] = useState(false);
 
   const displayProperties = showFiltered ? properties : (allProperties || properties);
 
@@ -63,11 +68,45 @@ export const useTableLogic = (
     }
   };
 
+  // Ранжированные совпадения с сервера: id -> позиция в выдаче
+  const [serverMatches, setServerMatches] = useState<{ query: string; ranks: Map<number, number> } | null>(null);
+
+  useEffect(() => {
+    const text = searchQuery.trim();
+    if (!text) {
+      setServerMatches(null);
+      return;
+    }
+
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const ranks = new Map<number, number>();
+        let cursor: string | null = null;
+        do {
+          const page = await propertyService.search(text, showFiltered ? exportQuery : undefined, cursor);
+          if (cancelled) return;
+          page.items.forEach(item => ranks.set(item.id, ranks.size));
+          cursor = page.next_cursor;
+        } while (cursor && ranks.size < SEARCH_MAX_RESULTS);
+        setServerMatches({ query: text, ranks });
+      } catch (error) {
+        // Без ответа сервера остаётся локальный поиск по подстроке
+        console.error('Error searching properties:', error);
+      }
+    }, SEARCH_DEBOUNCE_MS);
+
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [searchQuery, showFiltered, exportQuery]);
+
   const filteredBySearch = useMemo(() => {
     if (!searchQuery.trim()) return displayProperties;
 
     const query = searchQuery.toLowerCase();
-    return displayProperties.filter(property => {
+    const matchesLocally = (property: Property) => {
       if (property.title?.toLowerCase().includes(query)) return true;
       
       if (property.attributes) {
@@ -82,12 +121,50 @@ export const useTableLogic = (
         });
       }
       return false;
-    });
-  }, [displayProperties, searchQuery]);
+    };
+
+    if (serverMatches && serverMatches.query === searchQuery.trim()) {
+      // search_document покрывает не все колонки: к ранжированным совпадениям
+      // сервера (первыми) добавляем локальные совпадения по подстроке
+      const ranks = serverMatches.ranks;
+      const unranked = Number.MAX_SAFE_INTEGER;
+      return displayProperties
+        .filter(property => ranks.has(property.id) || matchesLocally(property))
+        .sort((a, b) => (ranks.get(a.id) ?? unranked) - (ranks.get(b.id) ?? unranked));
+    }
+
+    return displayProperties.filter(matchesLocally);
+  }, [displayProperties, searchQuery, serverMatches]);
+
+  // Порядок строк от сервера (типизированная сортировка по format_type): id -> позиция
+  const [serverOrder, setServerOrder] = useState<{ sort: string; positions: Map<number, number> } | null>(null);
+  const sortParam = sortColumn && sortDirection ? `${sortDirection === 'desc' ? '-' : ''}${sortColumn}` : null;
+
+  useEffect(() => {
+    if (!sortParam) return;
+    let cancelled = false;
+    propertyService.getIndex(sortParam)
+      .then(index => {
+        if (cancelled) return;
+        setServerOrder({ sort: sortParam, positions: new Map(index.map((entry, i) => [entry.id, i])) });
+      })
+      .catch(error => console.error('Error loading sorted index:', error));
+    return () => { cancelled = true; };
+  }, [sortParam]);
 
   const sortedProperties = useMemo(() => {
     if (!sortColumn || !sortDirection) return filteredBySearch;
 
+    if (serverOrder && serverOrder.sort === sortParam) {
+      const positions = serverOrder.positions;
+      const missing = Number.MAX_SAFE_INTEGER;
+      return [...filteredBySearch].sort(
+        (a, b) => (positions.get(a.id) ?? missing) - (positions.get(b.id) ?? missing)
+      );
+    }
+
+    // Пока сервер не ответил — локальная сортировка по строковому значению
+
     return [...filteredBySearch].sort((a, b) => {
       const aValue = getCellValue(a, sortColumn);
       const bValue = getCellValue(b, sortColumn);
@@ -101,40 +178,34 @@ export const useTableLogic = (
         return bStr.localeCompare(aStr, 'ru', { numeric: true });
       }
     });
-  }, [filteredBySearch, sortColumn, sortDirection]);
-
-  const handleExportToExcel = () => {
-    if (properties.length === 0) return;
-
-    const exportData = displayProperties.map(property => {
-      const row: Record<string, any> = {};
-      
-      headers.forEach(header => {
-        const value = property.attributes?.[header.key];
-        if (Array.isArray(value)) {
-          row[header.label] = value.join(', ');
-        } else if (typeof value === 'boolean') {
-          row[header.label] = value ? 'Да' : 'Нет';
-        } else if (value !== undefined && value !== null) {
-          row[header.label] = value;
-        } else {
-          row[header.label] = '';
-        }
+  }, [filteredBySearch, sortColumn, sortDirection, serverOrder, sortParam]);
+
+  // Файл собирает сервер из курсора БД, поэтому вкладка не зависает на больших выгрузках
+  const handleExport = async (format: 'xlsx' | 'csv' = 'xlsx') => {
+    if (displayProperties.length === 0 || isExporting) return;
+
+    setIsExporting(true);
+    try {
+      const { blob, filename } = await propertyService.exportTable({
+        format,
+        columns: headers.filter(h => !hiddenColumns.has(h.key)).map(h => h.key),
+        query: showFiltered ? exportQuery : undefined,
+        searchText: searchQuery.trim() || undefined,
+        sort: sortColumn && sortDirection ? { column: sortColumn, direction: sortDirection } : null
       });
 
-      return row;
-    });
-
-    const ws = XLSX.utils.json_to_sheet(exportData);
-    const wb = XLSX.utils.book_new();
-    XLSX.utils.book_append_sheet(wb, ws, 'Объекты');
-
-    const colWidths = headers.map(header => ({
-      wch: Math.max(header.label.length, 15)
-    }));
-    ws['!cols'] = colWidths;
-
-    XLSX.writeFile(wb, `Объекты_${new Date().toLocaleDateString('ru-RU')}.xlsx`);
+      const url = URL.createObjectURL(blob);
+      const link = document.createElement('a');
+      link.href = url;
+      link.download = filename;
+      link.click();
+      URL.revokeObjectURL(url);
+    } catch (error) {
+      console.error('Error exporting table:', error);
+      toast.error('Не удалось выгрузить таблицу');
+    } finally {
+      setIsExporting(false);
+    }
   };
 
   return {
@@ -143,6 +214,7 @@ export const useTableLogic = (
     showFiltered,
     searchQuery,
     hiddenColumns,
+    isExporting,
     displayProperties,
     sortedProperties,
     setShowFiltered,
@@ -150,6 +222,6 @@ export const useTableLogic = (
     toggleColumn,
     getCellValue,
     handleSort,
-    handleExportToExcel
+    handleExport
   };
 };
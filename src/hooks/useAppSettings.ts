@@ -1,5 +1,6 @@
 import { useState, useEffect } from 'react';
 import func2url from '../../backend/func2url.json';
+import { dbVersionHeaders, rememberDbVersion } from '@/services/dbVersion';
 
 export interface AppSettings {
   logo: string;
@@ -31,7 +32,7 @@ export const useAppSettings = () => {
   const loadSettings = async () => {
     try {
       // Загружаем из API
-      const response = await fetch(SETTINGS_API);
+      const response = await fetch(SETTINGS_API, { headers: dbVersionHeaders() });
       if (response.ok) {
         const apiSettings = await response.json();
         const merged = { ...defaultSettings, ...apiSettings };
@@ -71,11 +72,12 @@ export const useAppSettings = () => {
     
     // Сохраняем в БД через API
     try {
-      await fetch(SETTINGS_API, {
+      const response = await fetch(SETTINGS_API, {
         method: 'PUT',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify(updated)
       });
+      rememberDbVersion(response);
     } catch (error) {
       console.error('Error saving settings to API:', error);
     }
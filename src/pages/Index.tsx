@@ -4,7 +4,7 @@ import { toast } from 'sonner';
 import { useNavigate } from 'react-router-dom';
 import YandexMap from '@/components/YandexMap';
 import AddPropertyDialog, { PropertyFormData } from '@/components/AddPropertyDialog';
-import { propertyService, Property } from '@/services/propertyService';
+import { propertyService, Property, PropertyQuery } from '@/services/propertyService';
 import { visibilityService } from '@/services/visibilityService';
 import { UserRole, USER_ROLES, mapDbRole } from '@/types/userRoles';
 import AdvancedFilterPanel from '@/components/AdvancedFilterPanel';
@@ -242,6 +242,16 @@ const Index = () => {
     return baseFilteredProperties;
   }, [baseFilteredProperties]);
 
+  // Фильтры карты для серверной выгрузки таблицы
+  const exportQuery = useMemo<PropertyQuery>(() => ({
+    filters: advancedFilters,
+    search: searchQuery || undefined,
+    type: filterType,
+    segment: filterSegment,
+    created: createdAtFilter || undefined,
+    date: dateFilter || undefined
+  }), [advancedFilters, searchQuery, filterType, filterSegment, createdAtFilter, dateFilter]);
+
   const formatPrice = (price: number) => {
     return new Intl.NumberFormat('ru-RU', {
       style: 'currency',
@@ -380,6 +390,7 @@ const Index = () => {
         onOpenChange={setIsDataTableOpen}
         properties={filteredProperties}
         allProperties={properties}
+        exportQuery={exportQuery}
         onShowOnMap={(property) => {
           setSelectedProperty(property);
           setShowAttributesPanel(true);
@@ -9,6 +9,7 @@ import { Slider } from '@/components/ui/slider';
 import Icon from '@/components/ui/icon';
 import AdminNavigation from '@/components/admin/AdminNavigation';
 import { propertyService } from '@/services/propertyService';
+import { dbVersionHeaders, rememberDbVersion } from '@/services/dbVersion';
 
 interface PolygonStyle {
   attribute_key: string;
@@ -119,7 +120,9 @@ const PolygonStyleSettings = () => {
 
   const loadStyles = async () => {
     try {
-      const response = await fetch(`https://functions.poehali.dev/de96a125-7f5a-4aa7-b466-17e6e98c55c7?attribute_key=${activeAttribute}`);
+      const response = await fetch(`https://functions.poehali.dev/de96a125-7f5a-4aa7-b466-17e6e98c55c7?attribute_key=${activeAttribute}`, {
+        headers: dbVersionHeaders()
+      });
       if (response.ok) {
         const data = await response.json();
         setStyles(data);
@@ -159,7 +162,7 @@ const PolygonStyleSettings = () => {
   const handleSave = async () => {
     setIsSaving(true);
     try {
-      await fetch('https://functions.poehali.dev/de96a125-7f5a-4aa7-b466-17e6e98c55c7', {
+      const response = await fetch('https://functions.poehali.dev/de96a125-7f5a-4aa7-b466-17e6e98c55c7', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
@@ -167,6 +170,7 @@ const PolygonStyleSettings = () => {
           styles: styles
         })
       });
+      rememberDbVersion(response);
       
       toast.success('Настройки стилей сохранены');
       window.dispatchEvent(new Event('polygon-styles-updated'));
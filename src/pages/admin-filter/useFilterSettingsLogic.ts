@@ -1,6 +1,7 @@
 import { useState, useEffect } from 'react';
 import { toast } from 'sonner';
 import { propertyService } from '@/services/propertyService';
+import { dbVersionHeaders, rememberDbVersion } from '@/services/dbVersion';
 
 export interface FilterColumn {
   id: string;
@@ -148,7 +149,9 @@ export const useFilterSettingsLogic = () => {
       let savedSettings: FilterColumn[] | null = null;
 
       try {
-        const resp = await fetch('https://functions.poehali.dev/d55d58af-9be6-493a-a89d-45634d648637');
+        const resp = await fetch('https://functions.poehali.dev/d55d58af-9be6-493a-a89d-45634d648637', {
+          headers: dbVersionHeaders()
+        });
         if (resp.ok) {
           const data = await resp.json();
           if (data.config && data.config.length > 0) {
@@ -286,6 +289,7 @@ export const useFilterSettingsLogic = () => {
       if (!response.ok) {
         throw new Error('Ошибка сохранения на сервер');
       }
+      rememberDbVersion(response);
       
       toast.success('Настройки фильтров сохранены и синхронизированы');
     } catch (error) {
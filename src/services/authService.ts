@@ -24,6 +24,30 @@ export interface Company {
   updated_at: string;
 }
 
+export interface CompanyListParams {
+  limit?: number;
+  cursor?: string | null;
+  q?: string;
+  role?: string;
+  active?: boolean;
+  fields?: (keyof Company)[];
+}
+
+export interface CompanyBatchRow {
+  index: number;
+  login: string | null;
+  id?: number;
+  status: 'created' | 'updated' | 'valid' | 'error';
+  error?: string | null;
+}
+
+export interface CompanyBatchResult {
+  created?: number;
+  updated?: number;
+  error?: string;
+  results: CompanyBatchRow[];
+}
+
 export const authService = {
   async login(login: string, password: string): Promise<{ token: string; user: User }> {
     const response = await fetch(`${AUTH_API_URL}?action=login`, {
@@ -78,17 +102,22 @@ export const authService = {
     const token = this.getToken();
     if (!token) throw new Error('Не авторизован');
 
-    const response = await fetch(`${AUTH_API_URL}?action=me`, {
-      headers: { 'X-Authorization': `Bearer ${companyId}` }
+    const response = await fetch(`${AUTH_API_URL}?action=switch`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        'X-Authorization': `Bearer ${token}`
+      },
+      body: JSON.stringify({ company_id: companyId })
     });
 
     if (!response.ok) {
       throw new Error('Ошибка переключения компании');
     }
 
-    const user = await response.json();
-    localStorage.setItem('auth_token', String(companyId));
-    localStorage.setItem('user', JSON.stringify(user));
+    const data = await response.json();
+    localStorage.setItem('auth_token', data.token);
+    localStorage.setItem('user', JSON.stringify(data.user));
   },
 
   logout() {
@@ -129,6 +158,26 @@ export const companiesService = {
     return await response.json();
   },
 
+  async getPage(params: CompanyListParams = {}): Promise<{ items: Partial<Company>[]; next_cursor: string | null }> {
+    const token = authService.getToken();
+    const query = new URLSearchParams({ limit: String(params.limit ?? 50) });
+    if (params.cursor) query.set('cursor', params.cursor);
+    if (params.q) query.set('q', params.q);
+    if (params.role) query.set('role', params.role);
+    if (params.active !== undefined) query.set('active', String(params.active));
+    if (params.fields?.length) query.set('fields', params.fields.join(','));
+
+    const response = await fetch(`${COMPANIES_API_URL}?${query}`, {
+      headers: { 'X-Authorization': `Bearer ${token}` }
+    });
+
+    if (!response.ok) {
+      throw new Error('Ошибка загрузки компаний');
+    }
+
+    return await response.json();
+  },
+
   async create(data: Partial<Company> & { password: string }): Promise<Company> {
     const token = authService.getToken();
     const response = await fetch(COMPANIES_API_URL, {
@@ -148,6 +197,25 @@ export const companiesService = {
     return await response.json();
   },
 
+  async batchUpsert(companies: Array<Partial<Company> & { login: string; password?: string }>): Promise<CompanyBatchResult> {
+    const token = authService.getToken();
+    const response = await fetch(`${COMPANIES_API_URL}?action=batch`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        'X-Authorization': `Bearer ${token}`
+      },
+      body: JSON.stringify({ companies })
+    });
+
+    const data = await response.json();
+    if (!response.ok && !data.results) {
+      throw new Error(data.error || 'Ошибка пакетной загрузки компаний');
+    }
+
+    return data;
+  },
+
   async update(data: Partial<Company>): Promise<Company> {
     const token = authService.getToken();
     const response = await fetch(COMPANIES_API_URL, {
@@ -0,0 +1,13 @@
+// Метка последней записи (X-DB-Version). Пока она свежая, сервер читает
+// с основной БД, а не с реплики, — клиент сразу видит свои изменения
+const STORAGE_KEY = 'db_version';
+
+export const rememberDbVersion = (response: Response): void => {
+  const version = response.headers.get('X-DB-Version');
+  if (version) sessionStorage.setItem(STORAGE_KEY, version);
+};
+
+export const dbVersionHeaders = (): Record<string, string> => {
+  const version = sessionStorage.getItem(STORAGE_KEY);
+  return version ? { 'X-DB-Version': version } : {};
+};
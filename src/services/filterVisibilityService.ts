@@ -1,5 +1,6 @@
 import { UserRole } from '@/types/userRoles';
 import func2url from '../../backend/func2url.json';
+import { dbVersionHeaders, rememberDbVersion } from './dbVersion';
 
 export interface FilterVisibilityRule {
   filterId: string;
@@ -21,7 +22,7 @@ class FilterVisibilityService {
     try {
       const apiUrl = (func2url as Record<string, string>)['filter-config'];
       if (apiUrl) {
-        const response = await fetch(`${apiUrl}?type=filter_visibility`);
+        const response = await fetch(`${apiUrl}?type=filter_visibility`, { headers: dbVersionHeaders() });
         if (response.ok) {
           const data = await response.json();
           if (data.rules) {
@@ -55,11 +56,12 @@ class FilterVisibilityService {
     try {
       const apiUrl = (func2url as Record<string, string>)['filter-config'];
       if (apiUrl) {
-        await fetch(`${apiUrl}?type=filter_visibility`, {
+        const response = await fetch(`${apiUrl}?type=filter_visibility`, {
           method: 'POST',
           headers: { 'Content-Type': 'application/json' },
           body: JSON.stringify(config)
         });
+        if (response.ok) rememberDbVersion(response);
       }
     } catch (e) {
       console.error('Error saving filter visibility to API:', e);
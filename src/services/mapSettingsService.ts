@@ -1,4 +1,5 @@
 import urls from '../../backend/func2url.json';
+import { dbVersionHeaders, rememberDbVersion } from './dbVersion';
 
 export interface MapSetting {
   id: number;
@@ -18,7 +19,7 @@ class MapSettingsService {
       return this.cache;
     }
 
-    const response = await fetch(this.apiUrl);
+    const response = await fetch(this.apiUrl, { headers: dbVersionHeaders() });
     if (!response.ok) {
       throw new Error('Failed to fetch map settings');
     }
@@ -50,6 +51,7 @@ class MapSettingsService {
     if (!response.ok) {
       throw new Error('Failed to upsert map setting');
     }
+    rememberDbVersion(response);
 
     this.cache = null;
     return response.json();
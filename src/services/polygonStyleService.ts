@@ -1,3 +1,5 @@
+import { dbVersionHeaders } from './dbVersion';
+
 interface PolygonStyle {
   attribute_key: string;
   attribute_value: string;
@@ -22,7 +24,9 @@ class PolygonStyleService {
       const settingsData = await settingsResponse.json();
       const activeAttribute = settingsData.active_attribute || 'segment';
 
-      const stylesResponse = await fetch(`https://functions.poehali.dev/de96a125-7f5a-4aa7-b466-17e6e98c55c7?attribute_key=${activeAttribute}`);
+      const stylesResponse = await fetch(`https://functions.poehali.dev/de96a125-7f5a-4aa7-b466-17e6e98c55c7?attribute_key=${activeAttribute}`, {
+        headers: dbVersionHeaders()
+      });
       const stylesData = await stylesResponse.json();
 
       const stylesMap = new Map<string, PolygonStyle>();
@@ -1,3 +1,5 @@
+import { dbVersionHeaders, rememberDbVersion } from './dbVersion';
+
 interface Property {
   id: number;
   title: string;
@@ -9,31 +11,156 @@ interface Property {
   segment: 'premium' | 'standard' | 'economy';
   status: 'available' | 'reserved' | 'sold';
   boundary?: Array<[number, number]>;
+  // Все части мультиполигона; boundary — самая большая из них
+  boundary_parts?: Array<Array<[number, number]>> | null;
+  geometry?: PropertyGeometry | null;
   attributes?: Record<string, any>;
   created_at?: string;
   updated_at?: string;
+  hash?: string;
+}
+
+// Геометрия, посчитанная на сервере при записи границы
+interface PropertyGeometry {
+  centroid: [number, number];
+  area: number;
+  bbox: [number, number, number, number];
+  issues: string[];
 }
 
+// Строка лёгкого индекса: без boundary и attributes, с хэшем содержимого
+type PropertyIndexEntry = Omit<Property, 'boundary' | 'boundary_parts' | 'attributes'> & { hash: string };
+
 const API_URL = 'https://functions.poehali.dev/ac71b9f6-6521-4747-af29-18fd8700222c';
 const CACHE_KEY = 'landgis_properties_cache_v2';
 const CACHE_DURATION = 5 * 60 * 1000;
+const IDS_BATCH_SIZE = 200;
 
 interface CacheData {
   properties: Property[];
   timestamp: number;
+  token?: string | null;
+}
+
+interface PropertyChange {
+  seq: number;
+  op: 'insert' | 'update' | 'delete';
+  id: number;
+  property: Property | null;
+}
+
+interface ChangesResponse {
+  // Позиция в ленте в порядке фиксации транзакций: "xact.id"
+  cursor: string;
+  reset: boolean;
+  changes: PropertyChange[];
+}
+
+interface StatsBucket {
+  count: number;
+  total_price: number;
+  total_area: number;
+}
+
+interface HistogramBin {
+  from: number | null;
+  to: number | null;
+  count: number;
+}
+
+interface PropertyStats {
+  total: number;
+  total_price: number;
+  total_area: number;
+  with_boundary: number;
+  price_range: { min: number | null; max: number | null };
+  area_range: { min: number | null; max: number | null };
+  // Разрез отсутствует, если проекция роли скрывает его атрибут
+  by_status?: Record<string, StatsBucket>;
+  by_type?: Record<string, StatsBucket>;
+  by_region?: Record<string, StatsBucket>;
+  by_segment: Record<string, number>;
+  histograms: { price: HistogramBin[]; area: HistogramBin[] };
+}
+
+// Те же фильтры, что и на карте, в виде query-параметров для сервера
+interface PropertyQuery {
+  filters?: Record<string, string[]>;
+  search?: string;
+  type?: string;
+  segment?: string;
+  created?: string;
+  date?: string;
+}
+
+interface StatsQuery extends PropertyQuery {
+  priceBins?: number[];
+  areaBins?: number[];
+}
+
+// Клетка сетки плотности; bbox — [south, west, north, east]
+interface DensityCell {
+  geohash: string;
+  bbox: [number, number, number, number];
+  center: [number, number];
+  count: number;
+  area_sum: number;
+  price_sum: number;
 }
 
+interface DensityGrid {
+  precision: number;
+  cell: [number, number];
+  cells: DensityCell[];
+}
+
+interface SearchResponse {
+  items: Array<Property & { rank: number }>;
+  next_cursor: string | null;
+}
+
+interface ExportOptions {
+  format: 'xlsx' | 'csv';
+  columns: string[];
+  query?: PropertyQuery;
+  searchText?: string;
+  sort?: { column: string; direction: 'asc' | 'desc' } | null;
+}
+
+const queryParams = (action: string, query: PropertyQuery = {}): URLSearchParams => {
+  const params = new URLSearchParams({ action });
+  if (query.filters && Object.keys(query.filters).length > 0) params.set('filters', JSON.stringify(query.filters));
+  if (query.search) params.set('search', query.search);
+  if (query.type) params.set('type', query.type);
+  if (query.segment) params.set('segment', query.segment);
+  if (query.created) params.set('created', query.created);
+  if (query.date) params.set('date', query.date);
+  return params;
+};
+
+// Токен нужен серверу, чтобы отдать только видимые роли атрибуты
+const authHeaders = (): Record<string, string> => {
+  const token = localStorage.getItem('auth_token');
+  return { ...dbVersionHeaders(), ...(token ? { 'X-Authorization': `Bearer ${token}` } : {}) };
+};
+
 class PropertyService {
   private subscribers: Set<(properties: Property[]) => void> = new Set();
   private cache: Property[] | null = null;
   private lastFetch: number = 0;
+  private changesCursor: string | null = null;
+  private watching = false;
+  private pendingDetails = new Map<number, Array<{ resolve: (p: Property | null) => void; reject: (e: unknown) => void }>>();
+  private detailTimer: ReturnType<typeof setTimeout> | null = null;
 
   private loadFromLocalStorage(): CacheData | null {
     try {
       const cached = localStorage.getItem(CACHE_KEY);
       if (!cached) return null;
       const data: CacheData = JSON.parse(cached);
-      if (Date.now() - data.timestamp > CACHE_DURATION) {
+      // Ответ сервера зависит от роли, поэтому кэш другого пользователя не подходит.
+      // Устаревший кэш своего пользователя не удаляем — его сверяют с индексом по хэшам
+      if (data.token !== localStorage.getItem('auth_token')) {
         localStorage.removeItem(CACHE_KEY);
         return null;
       }
@@ -47,7 +174,8 @@ class PropertyService {
     try {
       const data: CacheData = {
         properties,
-        timestamp: Date.now()
+        timestamp: Date.now(),
+        token: localStorage.getItem('auth_token')
       };
       localStorage.setItem(CACHE_KEY, JSON.stringify(data));
     } catch (error) {
@@ -66,26 +194,71 @@ class PropertyService {
     if (this.cache) {
       callback([...this.cache]);
     }
+    this.watchChanges();
     return () => this.subscribers.delete(callback);
   }
 
+  private applyChanges(changes: PropertyChange[]) {
+    if (!this.cache || changes.length === 0) return;
+    const byId = new Map(this.cache.map(p => [p.id, p]));
+    changes.forEach(change => {
+      if (change.op === 'delete' || !change.property) {
+        byId.delete(change.id);
+      } else if (byId.has(change.id)) {
+        byId.set(change.id, change.property);
+      } else {
+        byId.set(change.id, change.property);
+        this.cache!.unshift(change.property);
+      }
+    });
+    this.cache = this.cache.filter(p => byId.has(p.id)).map(p => byId.get(p.id)!);
+    this.saveToLocalStorage(this.cache);
+    this.notifySubscribers();
+  }
+
+  // Long-poll ленты изменений: пока есть подписчики, применяем дельты к кэшу
+  private async watchChanges() {
+    if (this.watching) return;
+    this.watching = true;
+    try {
+      while (this.subscribers.size > 0) {
+        const query = this.changesCursor === null ? '' : `&since=${encodeURIComponent(this.changesCursor)}&timeout=20`;
+        try {
+          const response = await fetch(`${API_URL}?action=changes${query}`, { headers: authHeaders() });
+          if (!response.ok) throw new Error('Failed to load changes');
+          const data: ChangesResponse = await response.json();
+          if (data.reset) {
+            this.changesCursor = null;
+            await this.getProperties(true);
+            continue;
+          }
+          this.applyChanges(data.changes);
+          this.changesCursor = data.cursor;
+        } catch (error) {
+          console.error('Error watching property changes:', error);
+          await new Promise(resolve => setTimeout(resolve, 5000));
+        }
+      }
+    } finally {
+      this.watching = false;
+    }
+  }
+
   async getProperties(forceRefresh = false): Promise<Property[]> {
     if (!forceRefresh && this.cache && Date.now() - this.lastFetch < CACHE_DURATION) {
       return [...this.cache];
     }
 
     const cachedData = this.loadFromLocalStorage();
-    if (!forceRefresh && cachedData) {
+    if (!forceRefresh && cachedData && Date.now() - cachedData.timestamp < CACHE_DURATION) {
       this.cache = cachedData.properties;
       this.lastFetch = cachedData.timestamp;
       return [...this.cache];
     }
 
     try {
-      const response = await fetch(API_URL);
-      if (!response.ok) throw new Error('Failed to load properties');
-      
-      const properties: Property[] = await response.json();
+      const known = this.cache || cachedData?.properties;
+      const properties = known ? await this.revalidate(known) : await this.fetchAll();
       // Очищаем пробелы в названиях на всякий случай
       properties.forEach(p => {
         if (p.title) p.title = p.title.trim();
@@ -103,14 +276,77 @@ class PropertyService {
     }
   }
 
+  private async fetchAll(): Promise<Property[]> {
+    const response = await fetch(API_URL, { headers: authHeaders() });
+    if (!response.ok) throw new Error('Failed to load properties');
+    return response.json();
+  }
+
+  // Вместо полной перезагрузки: лёгкий индекс и догрузка только изменившихся строк
+  private async revalidate(known: Property[]): Promise<Property[]> {
+    const index = await this.getIndex();
+    const byId = new Map(known.map(p => [p.id, p]));
+    const stale = index.filter(entry => byId.get(entry.id)?.hash !== entry.hash).map(entry => entry.id);
+    const fresh = await this.getPropertiesByIds(stale);
+    fresh.forEach(p => byId.set(p.id, p));
+    return index
+      .map(entry => byId.get(entry.id))
+      .filter((p): p is Property => p !== undefined);
+  }
+
+  async getIndex(sort?: string): Promise<PropertyIndexEntry[]> {
+    const params = new URLSearchParams({ mode: 'light' });
+    if (sort) params.set('sort', sort);
+    const response = await fetch(`${API_URL}?${params.toString()}`, { headers: authHeaders() });
+    if (!response.ok) throw new Error('Failed to load property index');
+    return response.json();
+  }
+
+  async getPropertiesByIds(ids: number[]): Promise<Property[]> {
+    const result: Property[] = [];
+    for (let i = 0; i < ids.length; i += IDS_BATCH_SIZE) {
+      const chunk = ids.slice(i, i + IDS_BATCH_SIZE);
+      const response = await fetch(`${API_URL}?ids=${chunk.join(',')}`, { headers: authHeaders() });
+      if (!response.ok) throw new Error('Failed to load properties by ids');
+      result.push(...await response.json());
+    }
+    return result;
+  }
+
+  // Запросы одного тика объединяются в один ?ids=
+  getProperty(id: number): Promise<Property | null> {
+    return new Promise((resolve, reject) => {
+      const waiters = this.pendingDetails.get(id) || [];
+      waiters.push({ resolve, reject });
+      this.pendingDetails.set(id, waiters);
+      if (this.detailTimer === null) {
+        this.detailTimer = setTimeout(() => this.flushDetails(), 0);
+      }
+    });
+  }
+
+  private async flushDetails() {
+    const pending = this.pendingDetails;
+    this.pendingDetails = new Map();
+    this.detailTimer = null;
+    try {
+      const properties = await this.getPropertiesByIds([...pending.keys()]);
+      const byId = new Map(properties.map(p => [p.id, p]));
+      pending.forEach((waiters, id) => waiters.forEach(w => w.resolve(byId.get(id) || null)));
+    } catch (error) {
+      pending.forEach(waiters => waiters.forEach(w => w.reject(error)));
+    }
+  }
+
   async createProperty(data: Omit<Property, 'id' | 'created_at' | 'updated_at'>): Promise<Property> {
     const response = await fetch(API_URL, {
       method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
+      headers: { 'Content-Type': 'application/json', ...authHeaders() },
       body: JSON.stringify(data)
     });
 
     if (!response.ok) throw new Error('Failed to create property');
+    rememberDbVersion(response);
     
     const newProperty: Property = await response.json();
     
@@ -126,11 +362,12 @@ class PropertyService {
   async updateProperty(id: number, data: Partial<Omit<Property, 'id' | 'created_at' | 'updated_at'>>): Promise<Property> {
     const response = await fetch(`${API_URL}?id=${id}`, {
       method: 'PUT',
-      headers: { 'Content-Type': 'application/json' },
+      headers: { 'Content-Type': 'application/json', ...authHeaders() },
       body: JSON.stringify(data)
     });
 
     if (!response.ok) throw new Error('Failed to update property');
+    rememberDbVersion(response);
     
     const updatedProperty: Property = await response.json();
     
@@ -145,10 +382,12 @@ class PropertyService {
 
   async deleteProperty(id: number): Promise<void> {
     const response = await fetch(`${API_URL}?id=${id}`, {
-      method: 'DELETE'
+      method: 'DELETE',
+      headers: authHeaders()
     });
 
     if (!response.ok) throw new Error('Failed to delete property');
+    rememberDbVersion(response);
     
     if (this.cache) {
       this.cache = this.cache.filter(p => p.id !== id);
@@ -157,6 +396,121 @@ class PropertyService {
     }
   }
 
+  async getStats(query: StatsQuery = {}): Promise<PropertyStats> {
+    const params = queryParams('stats', query);
+    if (query.priceBins?.length) params.set('price_bins', query.priceBins.join(','));
+    if (query.areaBins?.length) params.set('area_bins', query.areaBins.join(','));
+
+    const response = await fetch(`${API_URL}?${params.toString()}`, { headers: authHeaders() });
+    if (!response.ok) throw new Error('Failed to load stats');
+    return response.json();
+  }
+
+  // Плотность участков на сетке geohash: precision 1..8, bbox — окно карты
+  async getDensity(precision: number, query?: PropertyQuery, bbox?: [number, number, number, number]): Promise<DensityGrid> {
+    const params = queryParams('density', query);
+    params.set('precision', String(precision));
+    if (bbox) params.set('bbox', bbox.join(','));
+
+    const response = await fetch(`${API_URL}?${params.toString()}`, { headers: authHeaders() });
+    if (!response.ok) throw new Error('Failed to load density grid');
+    return response.json();
+  }
+
+  async search(text: string, query?: PropertyQuery, cursor?: string | null, limit = 200): Promise<SearchResponse> {
+    const params = queryParams('search', query);
+    params.set('q', text);
+    params.set('limit', String(limit));
+    if (cursor) params.set('cursor', cursor);
+
+    const response = await fetch(`${API_URL}?${params.toString()}`, { headers: authHeaders() });
+    if (!response.ok) throw new Error('Failed to search properties');
+    return response.json();
+  }
+
+  // Похожие участки рядом: k ближайших к точке или к участку, distance — в метрах
+  async findNearest(
+    origin: { id: number } | { lat: number; lng: number },
+    options: { k?: number; status?: string; areaMin?: number; areaMax?: number } = {},
+    query?: PropertyQuery
+  ): Promise<Array<Property & { distance: number }>> {
+    const params = queryParams('nearest', query);
+    if ('id' in origin) {
+      params.set('id', String(origin.id));
+    } else {
+      params.set('lat', String(origin.lat));
+      params.set('lng', String(origin.lng));
+    }
+    if (options.k) params.set('k', String(options.k));
+    if (options.status) params.set('status', options.status);
+    if (options.areaMin !== undefined) params.set('area_min', String(options.areaMin));
+    if (options.areaMax !== undefined) params.set('area_max', String(options.areaMax));
+
+    const response = await fetch(`${API_URL}?${params.toString()}`, { headers: authHeaders() });
+    if (!response.ok) throw new Error('Failed to find nearest properties');
+    return response.json();
+  }
+
+  // Участки под точкой клика — без загрузки всех границ на клиент
+  async findContaining(lat: number, lng: number, query?: PropertyQuery): Promise<Property[]> {
+    const params = queryParams('contains', query);
+    params.set('lat', String(lat));
+    params.set('lng', String(lng));
+
+    const response = await fetch(`${API_URL}?${params.toString()}`, { headers: authHeaders() });
+    if (!response.ok) throw new Error('Failed to find properties at point');
+    return response.json();
+  }
+
+  // Участки внутри нарисованного полигона (intersects — задевающие его)
+  async findWithin(polygon: Array<[number, number]>, intersects = false, query?: PropertyQuery): Promise<Property[]> {
+    const params = queryParams('within', query);
+    params.set('polygon', polygon.map(([lat, lng]) => `${lat},${lng}`).join(';'));
+    if (intersects) params.set('predicate', 'intersects');
+
+    const response = await fetch(`${API_URL}?${params.toString()}`, { headers: authHeaders() });
+    if (!response.ok) throw new Error('Failed to find properties in polygon');
+    return response.json();
+  }
+
+  async exportTable(options: ExportOptions): Promise<{ blob: Blob; filename: string }> {
+    const params = queryParams('export', options.query);
+    params.set('format', options.format);
+    params.set('columns', options.columns.join(','));
+    if (options.searchText) params.set('q', options.searchText);
+    if (options.sort) {
+      params.set('sort', `${options.sort.direction === 'desc' ? '-' : ''}${options.sort.column}`);
+    }
+
+    const response = await fetch(`${API_URL}?${params.toString()}`, { headers: authHeaders() });
+    if (!response.ok) throw new Error('Failed to export table');
+
+    const disposition = response.headers.get('Content-Disposition') || '';
+    const match = disposition.match(/filename\*=UTF-8''([^;]+)/);
+    const filename = match
+      ? decodeURIComponent(match[1])
+      : `Объекты_${new Date().toLocaleDateString('ru-RU')}.${options.format}`;
+    return { blob: await response.blob(), filename };
+  }
+
+  // PDF собирается на сервере: карточки участков или каталог выборки
+  async downloadReport(
+    options: { ids?: number[]; layout?: 'card' | 'catalog'; title?: string; query?: PropertyQuery }
+  ): Promise<{ blob: Blob; filename: string }> {
+    const params = queryParams('report', options.query);
+    params.set('layout', options.layout || 'card');
+    if (options.ids?.length) params.set('ids', options.ids.join(','));
+    if (options.title) params.set('title', options.title);
+
+    const response = await fetch(`${API_URL}?${params.toString()}`, { headers: authHeaders() });
+    if (!response.ok) throw new Error('Failed to build report');
+
+    const disposition = response.headers.get('Content-Disposition') || '';
+    const match = disposition.match(/filename\*=UTF-8''([^;]+)/);
+    const filename = match ? decodeURIComponent(match[1]) : 'report.pdf';
+    return { blob: await response.blob(), filename };
+  }
+
   invalidateCache() {
     this.cache = null;
     this.lastFetch = 0;
@@ -165,4 +519,4 @@ class PropertyService {
 }
 
 export const propertyService = new PropertyService();
-export type { Property };
\ No newline at end of file
+export type { Property, PropertyGeometry, PropertyIndexEntry, PropertyStats, PropertyQuery, StatsQuery, HistogramBin, ExportOptions, SearchResponse, DensityCell, DensityGrid };
\ No newline at end of file
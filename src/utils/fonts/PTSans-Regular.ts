@@ -1,11 +1,20 @@
-export async function getPTSansFont(): Promise<string> {
-  const response = await fetch('https://functions.poehali.dev/cefc89ce-9c6a-4a3a-81a1-25e6d62ca32d');
-  const text = await response.text();
-  
-  try {
-    const data = JSON.parse(text);
-    return data.base64 || text;
-  } catch {
-    return text;
+const FONT_URL = 'https://functions.poehali.dev/cefc89ce-9c6a-4a3a-81a1-25e6d62ca32d?subset=cyrillic-latin';
+
+let fontPromise: Promise<string> | null = null;
+
+// Подмножество PT Sans (латиница и кириллица) кэшируется браузером по ETag;
+// в пределах вкладки шрифт загружается один раз
+export function getPTSansFont(): Promise<string> {
+  if (!fontPromise) {
+    fontPromise = fetch(FONT_URL)
+      .then(response => {
+        if (!response.ok) throw new Error('Не удалось загрузить шрифт');
+        return response.text();
+      })
+      .catch(error => {
+        fontPromise = null;
+        throw error;
+      });
   }
-}
\ No newline at end of file
+  return fontPromise;
+}
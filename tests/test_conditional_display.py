@@ -0,0 +1,78 @@
+"""Паритет conditional_display.py с shouldShowField (AttributeViewMode.tsx)
+
+Ожидаемые значения — результат клиентской функции на тех же правилах и
+атрибутах. Запуск: python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend', 'properties'))
+
+import conditional_display  # noqa: E402
+
+CASES = [
+    # (conditionalDisplay, attributes, ожидаемый shouldShowField)
+    (None, {'a': 1}, True),
+    ({}, {'a': 1}, True),
+    ({'showWhen': 'x'}, {'a': 1}, True),
+    ({'dependsOn': '', 'showWhen': 'x'}, {'a': 1}, True),
+    ({'dependsOn': 'a'}, {}, True),
+    ({'dependsOn': 'a'}, {'a': None}, False),
+    ({'dependsOn': 'a', 'showWhen': None}, {'a': None}, True),
+    ({'dependsOn': 'a', 'showWhen': None}, {}, False),
+    ({'dependsOn': 'a', 'showWhen': 'Да'}, {'a': True}, True),
+    ({'dependsOn': 'a', 'showWhen': 'yes'}, {'a': 'да'}, True),
+    ({'dependsOn': 'a', 'showWhen': 'нет'}, {'a': False}, True),
+    ({'dependsOn': 'a', 'showWhen': True}, {'a': 'YES '}, True),
+    ({'dependsOn': 'a', 'showWhen': False}, {'a': 'true'}, False),
+    ({'dependsOn': 'a', 'showWhen': ' Продажа '}, {'a': 'продажа'}, True),
+    ({'dependsOn': 'a', 'showWhen': 'Продажа'}, {'a': 'Аренда'}, False),
+    ({'dependsOn': 'a', 'showWhen': ['Аренда', 'Продажа']}, {'a': 'продажа'}, True),
+    ({'dependsOn': 'a', 'showWhen': ['Аренда', 'Продажа']}, {'a': ['Обмен', 'Аренда']}, True),
+    ({'dependsOn': 'a', 'showWhen': ['Аренда']}, {'a': ['Обмен']}, False),
+    ({'dependsOn': 'a', 'showWhen': []}, {'a': 'x'}, False),
+    ({'dependsOn': 'a', 'showWhen': 'аренда'}, {'a': ['Аренда']}, True),
+    ({'dependsOn': 'a', 'showWhen': 'x'}, {'a': []}, False),
+    ({'dependsOn': 'a', 'showWhen': 5}, {'a': 5.0}, True),
+    ({'dependsOn': 'a', 'showWhen': '5'}, {'a': 5}, True),
+    ({'dependsOn': 'a', 'showWhen': '0.1'}, {'a': 0.1}, True),
+    ({'dependsOn': 'a', 'showWhen': '1e-7'}, {'a': 1e-07}, True),
+    ({'dependsOn': 'a', 'showWhen': '1e+21'}, {'a': 1e21}, True),
+    ({'dependsOn': 'a', 'showWhen': '100000000000000000000'}, {'a': 1e20}, True),
+    ({'dependsOn': 'a', 'showWhen': '0.000001'}, {'a': 1e-06}, True),
+    ({'dependsOn': 'a', 'showWhen': '-0'}, {'a': -0.0}, False),
+    ({'dependsOn': 'a', 'showWhen': '0'}, {'a': -0.0}, True),
+    ({'dependsOn': 'a', 'showWhen': '[object object]'}, {'a': {'k': 1}}, True),
+    ({'dependsOn': 'a', 'showWhen': '1,2'}, {'a': [[1, 2]]}, True),
+    ({'dependsOn': 'a', 'showWhen': ',x'}, {'a': [[None, 'x']]}, True),
+    ({'dependsOn': 'a', 'showWhen': 'null'}, {'a': None}, True),
+    ({'dependsOn': 'a', 'showWhen': 'undefined'}, {'b': 1}, True),
+    ({'dependsOn': 'a', 'showWhen': ['true', 'нет']}, {'a': [True]}, True),
+]
+
+# String(number) в JavaScript
+NUMBERS = [
+    (0, '0'), (-0.0, '0'), (5.0, '5'), (-12, '-12'), (0.1, '0.1'), (123.456, '123.456'),
+    (1e-6, '0.000001'), (1e-7, '1e-7'), (1.5e-10, '1.5e-10'), (1e20, '100000000000000000000'),
+    (1e21, '1e+21'), (1.2345e25, '1.2345e+25'), (12345678901234567890, '12345678901234567000'),
+    (5e-324, '5e-324'), (1.7976931348623157e308, '1.7976931348623157e+308'),
+]
+
+
+class ShouldShowFieldParityTest(unittest.TestCase):
+
+    def test_cases(self):
+        for rule, attrs, expected in CASES:
+            with self.subTest(rule=rule, attrs=attrs):
+                predicate = conditional_display.compile_rule(rule)
+                self.assertEqual(True if predicate is None else predicate(attrs), expected)
+
+    def test_js_number(self):
+        for value, expected in NUMBERS:
+            with self.subTest(value=value):
+                self.assertEqual(conditional_display.js_string(value), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()